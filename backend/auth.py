@@ -1,56 +1,101 @@
 from fastapi import Request, HTTPException
-from datetime import datetime, timezone
-import json
+from typing import Optional
+import math
 
-from backend.config import GatewayKeyModel
+from backend.config import AuthIndex, GatewayKeyModel
+from backend.keystore import KEY_STORE
+from backend.ratelimit import RATE_LIMITER, key_id_for
+from backend.request_body import (
+    RequestBody,
+    StreamedBody,
+    check_declared_length,
+    read_body,
+    should_stream_body,
+)
+from backend.request_json import ParsedBody
+from backend.usage import request_prompt_tokens
+
+
+def enforce_rate_limit(request: Request, key_cfg: GatewayKeyModel):
+    """🚦 Per-key RPM/TPM limits, shared by all workers."""
+    if not (key_cfg.rpm or key_cfg.tpm):
+        return
+    wait = RATE_LIMITER.check(
+        request.state.key_id,
+        key_cfg.rpm,
+        key_cfg.tpm,
+        # Estimated only when a TPM limit needs it
+        tokens=(request_prompt_tokens(request) or 0) if key_cfg.tpm else 0,
+    )
+    if wait is not None:
+        raise HTTPException(
+            429,
+            "Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
 
 
 async def authenticate_and_authorize(
     request: Request,
-    provider: str,
-    provider_allowed_models: list[str],
-    gateway_keys: dict[str, GatewayKeyModel],
-) -> bytes:
+    provider: Optional[str],
+    auth_index: AuthIndex,
+    max_body_bytes: Optional[int] = None,
+) -> RequestBody:
     auth = request.headers.get("authorization")
     if not auth or not auth.startswith("Bearer "):
         raise HTTPException(401, "Missing API key")
 
     api_key = auth.split(" ", 1)[1]
-    key_cfg = gateway_keys.get(api_key)
+    policy = auth_index.get(api_key)
+    if policy is None:
+        # 🗄 Keys kept in the SQLite key store (read through its LRU)
+        policy = await KEY_STORE.get(api_key)
 
-    if not key_cfg:
+    if not policy:
         raise HTTPException(403, "Invalid API key")
+    key_cfg = policy.key
 
     # ⏰ Expiration check
-    if key_cfg.expires_at:
-        if datetime.now(timezone.utc) >= key_cfg.expires_at:
-            raise HTTPException(403, "API key expired")
+    if policy.expired:
+        raise HTTPException(403, "API key expired")
 
     # 🔒 Provider allowlist
-    if provider not in key_cfg.providers:
+    # (None on /route/...: each alias target is checked before it is used)
+    if provider is not None and provider not in policy.providers:
         raise HTTPException(403, "Provider not allowed")
 
-    body = await request.body()
-
-    # 🧠 Best-effort model extraction
-    model = None
-    stream = False
-    try:
-        payload = json.loads(body)
-        model = payload.get("model")
-        stream = bool(payload.get("stream", False))
-
-        if model:
-            if "*" not in key_cfg.models and model not in key_cfg.models:
-                raise HTTPException(403, "Model not allowed")
-
-            if (
-                "*" not in provider_allowed_models
-                and model not in provider_allowed_models
-            ):
-                raise HTTPException(403, "Model not supported by provider")
-    except json.JSONDecodeError:
-        pass  # opaque forward
+    request.state.key_id = key_id_for(api_key)
+    request.state.priority = key_cfg.priority
+    request.state.share = key_cfg.share
+    request.state.allowed_providers = policy.providers
+    request.state.policy = policy
+    request.state.parsed_body = None
+
+    check_declared_length(request, max_body_bytes)
+
+    # 📦 Multipart / binary uploads: stream through, never assembled in memory
+    if should_stream_body(request.headers.get("content-type")):
+        enforce_rate_limit(request, key_cfg)
+        request.state.owner = key_cfg.owner
+        request.state.model = None
+        request.state.stream = False
+        return StreamedBody(request, max_body_bytes)
+
+    body = await read_body(request, max_body_bytes)
+
+    # 🧠 Best-effort model extraction: top-level keys only, the messages are
+    # not decoded; later stages reuse request.state.parsed_body
+    parsed = ParsedBody.scan(body)
+    request.state.parsed_body = parsed
+    model = parsed.model if parsed is not None else None
+    stream = parsed.stream if parsed is not None else False
+
+    if model:
+        denied = auth_index.model_denied(policy, provider, model)
+        if denied:
+            raise HTTPException(403, denied)
+
+    enforce_rate_limit(request, key_cfg)
 
     # 📎 Attach identity for usage metering / logging
     request.state.owner = key_cfg.owner
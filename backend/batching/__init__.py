@@ -0,0 +1,20 @@
+from .embeddings import (
+    BatchMember,
+    BatchPart,
+    EmbeddingBatch,
+    EmbeddingBatcher,
+    batch_inputs,
+    proportional_split,
+)
+
+EMBEDDING_BATCHER = EmbeddingBatcher()
+
+__all__ = [
+    "BatchMember",
+    "BatchPart",
+    "EmbeddingBatch",
+    "EmbeddingBatcher",
+    "EMBEDDING_BATCHER",
+    "batch_inputs",
+    "proportional_split",
+]
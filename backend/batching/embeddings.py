@@ -0,0 +1,281 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from backend.config import EmbeddingBatchConfigModel
+
+# Upstream headers that describe the combined body, not a caller's slice
+SPLIT_DROPPED_HEADERS = {"content-length", "content-encoding", "transfer-encoding"}
+
+
+def batch_inputs(payload: Any) -> Optional[list]:
+    """The request's ``input`` as a list of items, or None if it cannot batch.
+
+    OpenAI accepts a string, a list of strings, one token array or a list
+    of token arrays.
+    """
+    if not isinstance(payload, dict):
+        return None
+    value = payload.get("input")
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list) or not value:
+        return None
+    if all(isinstance(v, int) for v in value):
+        return [value]
+    if all(isinstance(v, (str, list)) for v in value):
+        return value
+    return None
+
+
+def input_kind(inputs: list) -> str:
+    """Strings or token arrays: OpenAI rejects an input list mixing both."""
+    if all(isinstance(i, str) for i in inputs):
+        return "text"
+    if all(isinstance(i, list) for i in inputs):
+        return "tokens"
+    return "mixed"
+
+
+def input_weight(item) -> int:
+    # Characters or token ids: only the ratio between callers matters.
+    return max(1, len(item))
+
+
+def proportional_split(total: Optional[int], weights: list[int]) -> list[Optional[int]]:
+    """Split ``total`` by ``weights`` (largest remainder, so shares add up)."""
+    if total is None:
+        return [None] * len(weights)
+    scale = sum(weights)
+    exact = [total * w / scale for w in weights]
+    shares = [int(x) for x in exact]
+    leftover = total - sum(shares)
+    by_remainder = sorted(
+        range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True
+    )
+    for i in by_remainder[:leftover]:
+        shares[i] += 1
+    return shares
+
+
+@dataclass
+class BatchPart:
+    """One caller's slice of the batched upstream response."""
+
+    status_code: int
+    headers: dict[str, str]
+    body: bytes
+    prompt_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+    batch_size: int = 1
+
+
+@dataclass
+class BatchMember:
+    inputs: list
+    weight: int
+    # The caller's BatchPart, or None when it has to send its request alone
+    result: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+
+class EmbeddingBatch:
+    """Embeddings requests that go upstream as one call.
+
+    The first request starts a task that waits out the window (or until the
+    batch is full), sends the combined input array and hands every member,
+    the first one included, its own vectors and token share.
+    """
+
+    def __init__(self, key: str, payload: dict, max_inputs: int):
+        self.key = key
+        self.payload = payload
+        self.max_inputs = max_inputs
+        self.members: list[BatchMember] = []
+        self.size = 0
+        self.closed = False
+        self.full = asyncio.Event()
+
+    def add(self, inputs: list) -> BatchMember:
+        member = BatchMember(inputs, sum(input_weight(i) for i in inputs))
+        self.members.append(member)
+        self.size += len(inputs)
+        if self.size >= self.max_inputs:
+            self.full.set()
+        return member
+
+    def fits(self, inputs: list) -> bool:
+        return not self.closed and self.size + len(inputs) <= self.max_inputs
+
+    def body(self) -> bytes:
+        inputs = [item for m in self.members for item in m.inputs]
+        return json.dumps({**self.payload, "input": inputs}).encode()
+
+    def resolve(self, status_code: int, headers, raw: bytes):
+        """Split the upstream response across members and wake them."""
+        if 400 <= status_code < 500 and status_code != 429 and len(self.members) > 1:
+            # Likely one caller's input (too long, ...): each member is sent
+            # on its own rather than failing the others with it
+            self.release()
+            return
+        headers = {
+            k: v for k, v in headers.items() if k.lower() not in SPLIT_DROPPED_HEADERS
+        }
+        parts = self._split(status_code, headers, raw)
+        for member, part in zip(self.members, parts):
+            if not member.result.done():
+                member.result.set_result(part)
+
+    def release(self):
+        """Let the members still waiting send their own requests."""
+        for member in self.members:
+            if not member.result.done():
+                member.result.set_result(None)
+
+    def fail(self, exc: BaseException):
+        if not isinstance(exc, Exception):
+            # e.g. the leader was cancelled: members see a failed upstream
+            # call, not a CancelledError of their own
+            error = RuntimeError(f"Batch leader failed: {exc!r}")
+            error.__cause__ = exc
+            exc = error
+        for member in self.members:
+            if not member.result.done():
+                member.result.set_exception(exc)
+                # Members that already left never await it.
+                member.result.exception()
+
+    def _split(self, status_code: int, headers, raw: bytes) -> list[BatchPart]:
+        n = len(self.members)
+        if status_code >= 400:
+            # 5xx and 429 apply to the whole batch: everyone sees the same answer.
+            return [BatchPart(status_code, headers, raw, batch_size=n)] * n
+
+        try:
+            data = json.loads(raw)
+            items = sorted(data["data"], key=lambda d: d["index"])
+            usage = data.get("usage") or {}
+        except Exception:
+            items, data, usage = None, None, {}
+        if items is None or len(items) != self.size:
+            error = json.dumps(
+                {"error": {"message": "Upstream returned an unexpected batch"}}
+            ).encode()
+            return [BatchPart(502, {"content-type": "application/json"}, error)] * n
+
+        weights = [m.weight for m in self.members]
+        prompt = proportional_split(usage.get("prompt_tokens"), weights)
+        total = proportional_split(usage.get("total_tokens"), weights)
+
+        parts = []
+        offset = 0
+        for i, member in enumerate(self.members):
+            count = len(member.inputs)
+            own = [
+                {**item, "index": j}
+                for j, item in enumerate(items[offset : offset + count])
+            ]
+            offset += count
+            body = {**data, "data": own}
+            if usage:
+                body["usage"] = {
+                    **usage,
+                    "prompt_tokens": prompt[i],
+                    "total_tokens": total[i],
+                }
+            parts.append(
+                BatchPart(
+                    status_code,
+                    headers,
+                    json.dumps(body).encode(),
+                    prompt_tokens=prompt[i],
+                    total_tokens=total[i],
+                    batch_size=n,
+                )
+            )
+        return parts
+
+
+class EmbeddingBatcher:
+    def __init__(self):
+        self._open: dict[str, EmbeddingBatch] = {}
+        # Batches being collected and sent; referenced so they are not
+        # garbage-collected mid-flight
+        self._running: set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_requests = 0
+
+    def join(
+        self,
+        provider: str,
+        payload: dict,
+        inputs: list,
+        cfg: EmbeddingBatchConfigModel,
+    ) -> tuple[EmbeddingBatch, BatchMember, bool]:
+        """Add a request to the open batch for its parameters.
+
+        Returns the batch, the caller's member entry and whether the caller
+        leads (sends) the batch.
+        """
+        params = {k: v for k, v in payload.items() if k != "input"}
+        key = "\0".join(
+            (provider, input_kind(inputs), json.dumps(params, sort_keys=True))
+        )
+        batch = self._open.get(key)
+        if batch is not None and batch.fits(inputs):
+            self.batched_requests += 1
+            return batch, batch.add(inputs), False
+
+        batch = self._open[key] = EmbeddingBatch(key, params, cfg.max_inputs)
+        return batch, batch.add(inputs), True
+
+    async def collect(self, batch: EmbeddingBatch, cfg: EmbeddingBatchConfigModel):
+        """Leader: wait for the window to pass or the batch to fill, then seal it."""
+        try:
+            await asyncio.wait_for(batch.full.wait(), cfg.window_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            batch.closed = True
+            if self._open.get(batch.key) is batch:
+                del self._open[batch.key]
+        self.batches += 1
+
+    def launch(
+        self,
+        batch: EmbeddingBatch,
+        cfg: EmbeddingBatchConfigModel,
+        send: Callable[[bytes], Awaitable[Any]],
+    ):
+        """Leader: collect and send the batch in a task no caller owns.
+
+        ``send`` makes the upstream call for the combined body and resolves
+        the batch. A caller that disconnects only stops waiting for its own
+        result; a batch left with one member is released, so that member
+        sends its request as usual.
+        """
+        task = asyncio.get_running_loop().create_task(self._run(batch, cfg, send))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: EmbeddingBatch, cfg, send):
+        try:
+            await self.collect(batch, cfg)
+            if len(batch.members) == 1:
+                batch.release()
+                return
+            await send(batch.body())
+            batch.fail(RuntimeError("Batch was not answered"))  # if unresolved
+        except BaseException as e:
+            batch.fail(e)
+            if not isinstance(e, Exception):
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "open": len(self._open),
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+        }
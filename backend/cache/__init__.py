@@ -0,0 +1,22 @@
+from .embedding_cache import EmbeddingCache, EmbeddingFill, VectorStore
+from .response_cache import CacheCollector, CachedResponse, ResponseCache
+from .singleflight import Flight, FlightAborted, Singleflight
+
+RESPONSE_CACHE = ResponseCache()
+EMBEDDING_CACHE = EmbeddingCache()
+SINGLEFLIGHT = Singleflight()
+
+__all__ = [
+    "EmbeddingCache",
+    "EmbeddingFill",
+    "VectorStore",
+    "EMBEDDING_CACHE",
+    "CacheCollector",
+    "CachedResponse",
+    "ResponseCache",
+    "RESPONSE_CACHE",
+    "Flight",
+    "FlightAborted",
+    "Singleflight",
+    "SINGLEFLIGHT",
+]
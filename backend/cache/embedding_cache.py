@@ -0,0 +1,221 @@
+import base64
+import hashlib
+import json
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from backend.config import EmbeddingCacheConfigModel
+
+
+def input_key(provider: str, model: str, dimensions, item) -> str:
+    """Cache key for one embeddings input: (provider, model, dimensions, sha256)."""
+    raw = item.encode() if isinstance(item, str) else json.dumps(item).encode()
+    digest = hashlib.sha256(raw).hexdigest()
+    return f"{provider}\0{model}\0{dimensions}\0{digest}"
+
+
+def encode_vector(vector: np.ndarray, encoding_format: str):
+    if encoding_format == "base64":
+        return base64.b64encode(vector.astype("<f4").tobytes()).decode()
+    return vector.astype(np.float32).tolist()
+
+
+def decode_vector(embedding) -> np.ndarray:
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+    return np.asarray(embedding, dtype=np.float32)
+
+
+class VectorStore:
+    """Fixed-width rows of one vector size in a memory-mapped array.
+
+    Rows are handed out from a free list; the file is sparse, so only rows
+    that were written take space.
+    """
+
+    def __init__(self, dim: int, capacity: int, dtype: str, directory: Path):
+        self.dim = dim
+        self.capacity = capacity
+        # Unlinked on close: the index lives in memory, so rows do not outlive it.
+        self._file = tempfile.NamedTemporaryFile(
+            dir=directory, prefix=f"embeddings-{dim}-", suffix=f".{dtype}"
+        )
+        self.rows = np.memmap(self._file, dtype=dtype, mode="w+", shape=(capacity, dim))
+        self._free = list(range(capacity - 1, -1, -1))
+
+    @property
+    def full(self) -> bool:
+        return not self._free
+
+    @property
+    def nbytes(self) -> int:
+        return (self.capacity - len(self._free)) * self.rows.strides[0]
+
+    def put(self, vector: np.ndarray) -> int:
+        row = self._free.pop()
+        self.rows[row] = vector
+        return row
+
+    def get(self, row: int) -> np.ndarray:
+        return self.rows[row]
+
+    def free(self, row: int):
+        self._free.append(row)
+
+    def close(self):
+        del self.rows
+        self._file.close()
+
+
+@dataclass
+class EmbeddingFill:
+    """Cached vectors for part of one request, merged into the upstream answer."""
+
+    cache: "EmbeddingCache"
+    keys: list[str]
+    encoding_format: str
+    hits: dict[int, np.ndarray] = field(default_factory=dict)
+    # Positions (in the original input) that go upstream, in order
+    misses: list[int] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.misses
+
+    def item(self, index: int, vector: np.ndarray) -> dict:
+        return {
+            "object": "embedding",
+            "index": index,
+            "embedding": encode_vector(vector, self.encoding_format),
+        }
+
+    def response(self, model: str) -> bytes:
+        """Full answer when every input was cached (no upstream tokens used)."""
+        data = [self.item(i, self.hits[i]) for i in range(len(self.keys))]
+        return json.dumps(
+            {
+                "object": "list",
+                "data": data,
+                "model": model,
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        ).encode()
+
+    def merge(self, status_code: int, raw: bytes) -> bytes:
+        """Store the upstream vectors and put the response back in input order."""
+        if status_code != 200:
+            return raw
+        try:
+            data = json.loads(raw)
+            fetched = sorted(data["data"], key=lambda d: d["index"])
+        except Exception:
+            return raw
+        if len(fetched) != len(self.misses):
+            return raw
+
+        items: list[Optional[dict]] = [None] * len(self.keys)
+        for position, entry in zip(self.misses, fetched):
+            self.cache.put(self.keys[position], decode_vector(entry["embedding"]))
+            items[position] = {**entry, "index": position}
+        for position, vector in self.hits.items():
+            items[position] = self.item(position, vector)
+        return json.dumps({**data, "data": items}).encode()
+
+
+class EmbeddingCache:
+    """Per-input embedding cache.
+
+    Vectors live in memory-mapped float16/float32 arrays (one per vector
+    size); an LRU index maps each input key to its row, and the least
+    recently used rows are reused once ``max_entries`` is reached.
+    """
+
+    def __init__(self):
+        self.config = EmbeddingCacheConfigModel()
+        self._index: OrderedDict[str, tuple[int, int]] = OrderedDict()
+        self._stores: dict[int, VectorStore] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def configure(self, config: EmbeddingCacheConfigModel):
+        changed = (config.dtype, config.max_entries, config.path) != (
+            self.config.dtype,
+            self.config.max_entries,
+            self.config.path,
+        )
+        self.config = config
+        if changed or not config.enabled:
+            self.clear()
+
+    def lookup(self, provider: str, payload: dict, inputs: list) -> EmbeddingFill:
+        model = payload.get("model")
+        dimensions = payload.get("dimensions")
+        fill = EmbeddingFill(
+            self,
+            [input_key(provider, model, dimensions, item) for item in inputs],
+            payload.get("encoding_format") or "float",
+        )
+        for position, key in enumerate(fill.keys):
+            vector = self.get(key)
+            if vector is None:
+                fill.misses.append(position)
+            else:
+                fill.hits[position] = vector
+        self.hits += len(fill.hits)
+        self.misses += len(fill.misses)
+        return fill
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        location = self._index.get(key)
+        if location is None:
+            return None
+        self._index.move_to_end(key)
+        dim, row = location
+        # Copy: the row may be reused once the entry is evicted.
+        return np.array(self._stores[dim].get(row))
+
+    def put(self, key: str, vector: np.ndarray):
+        if key in self._index or vector.ndim != 1 or not len(vector):
+            return
+        store = self._store_for(len(vector))
+        while store.full or len(self._index) >= self.config.max_entries:
+            self._evict()
+        self._index[key] = (len(vector), store.put(vector))
+
+    def clear(self):
+        self._index.clear()
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.config.enabled,
+            "entries": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": sum(s.nbytes for s in self._stores.values()),
+        }
+
+    def _store_for(self, dim: int) -> VectorStore:
+        store = self._stores.get(dim)
+        if store is None:
+            directory = Path(self.config.path or tempfile.gettempdir())
+            directory.mkdir(parents=True, exist_ok=True)
+            store = self._stores[dim] = VectorStore(
+                dim, self.config.max_entries, self.config.dtype, directory
+            )
+        return store
+
+    def _evict(self):
+        _, (dim, row) = self._index.popitem(last=False)
+        self._stores[dim].free(row)
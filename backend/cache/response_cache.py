@@ -0,0 +1,245 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Mapping, Optional
+
+from backend.config import ResponseCacheConfigModel
+from backend.request_json import ParsedBody
+
+UNCACHED_HEADERS = {"content-length", "transfer-encoding", "connection", "date"}
+# Request headers that change the upstream response. Bodies are stored as
+# received, still content-encoded, so Accept-Encoding is part of the key.
+VARIANT_HEADERS = (
+    "accept-encoding",
+    "anthropic-version",
+    "anthropic-beta",
+    "openai-organization",
+    "openai-project",
+)
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: dict[str, str]
+    media_type: Optional[str] = None
+    body: bytes = b""
+    # SSE responses are kept as the chunks upstream sent and replayed chunk
+    # by chunk. They are stored as received, so they may be compressed or
+    # CRLF-delimited; they are never re-split.
+    events: Optional[list[bytes]] = None
+    expires_at: float = 0.0
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "status_code": self.status_code,
+                "headers": self.headers,
+                "media_type": self.media_type,
+                "body": base64.b64encode(self.body).decode(),
+                "events": (
+                    [base64.b64encode(e).decode() for e in self.events]
+                    if self.events is not None
+                    else None
+                ),
+                "expires_at": self.expires_at,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CachedResponse":
+        data = json.loads(raw)
+        events = data.get("events")
+        return cls(
+            status_code=data["status_code"],
+            headers=data["headers"],
+            media_type=data.get("media_type"),
+            body=base64.b64decode(data["body"]),
+            events=(
+                [base64.b64decode(e) for e in events] if events is not None else None
+            ),
+            expires_at=data["expires_at"],
+        )
+
+
+@dataclass
+class CacheCollector:
+    """Accumulates one upstream response until it can be stored."""
+
+    key: str
+    max_bytes: int
+    chunks: list[bytes] = field(default_factory=list)
+    size: int = 0
+    overflowed: bool = False
+
+    def feed(self, chunk: bytes):
+        if self.overflowed:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.overflowed = True
+            self.chunks = []
+            return
+        self.chunks.append(chunk)
+
+
+class ResponseCache:
+    """Exact-match cache for deterministic responses.
+
+    Memory tier is an LRU with per-entry TTL; the optional disk tier is read
+    on a memory miss and hits are promoted back into memory.
+    """
+
+    def __init__(self):
+        self.config = ResponseCacheConfigModel()
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, config: ResponseCacheConfigModel):
+        self.config = config
+        if not config.enabled:
+            self._entries.clear()
+        self._trim()
+
+    def key_for(
+        self,
+        provider: str,
+        method: str,
+        path: str,
+        body,
+        query: Iterable[tuple[str, str]] = (),
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> Optional[str]:
+        """Canonical hash of (provider, path, query, variant headers,
+        normalized JSON body), if cacheable.
+
+        ``body`` is the raw body or the request's ``ParsedBody`` (reused, so
+        the body is not parsed again).
+        """
+        if not (self.config.enabled or self.config.coalesce):
+            return None
+        if isinstance(body, bytes):
+            body = ParsedBody.scan(body)
+        if method != "POST" or not isinstance(body, ParsedBody):
+            return None
+        payload = body.payload
+        if payload is None or not payload.get("model"):
+            return None
+        if self.config.deterministic_only and payload.get("temperature") != 0:
+            return None
+
+        normalized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        variants = json.dumps(
+            [sorted(query), [headers.get(name, "") for name in VARIANT_HEADERS]],
+            separators=(",", ":"),
+        )
+        digest = hashlib.sha256()
+        for part in (provider, path.strip("/"), variants, normalized):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def collector(self, key: str) -> Optional[CacheCollector]:
+        if not self.config.enabled:
+            return None  # key only used for coalescing
+        return CacheCollector(key, self.config.max_entry_bytes)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if not self.config.enabled:
+            return None
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self.config.disk_path:
+            entry = await asyncio.to_thread(self._read_disk, key, now)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    async def store(
+        self,
+        collector: CacheCollector,
+        status_code: int,
+        headers,
+        is_stream: bool,
+    ):
+        if collector.overflowed or status_code != 200:
+            return
+
+        entry = CachedResponse(
+            status_code=status_code,
+            headers={
+                k: v for k, v in headers.items() if k.lower() not in UNCACHED_HEADERS
+            },
+            media_type=headers.get("content-type"),
+            body=b"" if is_stream else b"".join(collector.chunks),
+            events=list(collector.chunks) if is_stream else None,
+            expires_at=time.time() + self.config.ttl_seconds,
+        )
+        self._remember(collector.key, entry)
+
+        if self.config.disk_path:
+            await asyncio.to_thread(self._write_disk, collector.key, entry)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.config.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, key: str, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._trim()
+
+    def _trim(self):
+        while len(self._entries) > self.config.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_file(self, key: str) -> Path:
+        return Path(self.config.disk_path) / f"{key}.json"
+
+    def _read_disk(self, key: str, now: float) -> Optional[CachedResponse]:
+        path = self._disk_file(key)
+        try:
+            entry = CachedResponse.from_json(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("[cache] Dropping unreadable entry:", e)
+            path.unlink(missing_ok=True)
+            return None
+        if entry.expires_at <= now:
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def _write_disk(self, key: str, entry: CachedResponse):
+        path = self._disk_file(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(entry.to_json(), encoding="utf-8")
+            tmp.replace(path)
+        except Exception as e:
+            # The disk tier is best-effort; memory still holds the entry.
+            print("[cache] Disk write failed:", e)
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Optional
+
+
+class FlightAborted(Exception):
+    """The leader's upstream response ended before it was complete."""
+
+
+class Flight:
+    """One upstream call shared by every identical concurrent request.
+
+    The leader publishes the upstream status, headers and chunks; followers
+    either wait for the buffered result or replay the chunk history and then
+    follow live chunks as a fan-out subscriber.
+    """
+
+    def __init__(self):
+        self.response: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.buffered = False
+        self.chunks: list[bytes] = []
+        self.finished = False
+        # Ended early (client gone, upstream read error): followers must not
+        # take the chunks so far for the whole response
+        self.failed = False
+        self.usage: tuple[Optional[int], Optional[int], Optional[int]] = (
+            None,
+            None,
+            None,
+        )
+        self.followers = 0
+        self._changed = asyncio.Event()
+
+    def start(self, status_code: int, headers, buffered: bool):
+        self.buffered = buffered
+        if not self.response.done():
+            self.response.set_result(
+                (
+                    status_code,
+                    dict(headers),
+                    headers.get("content-type"),
+                )
+            )
+
+    def publish(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, usage, completed: bool = True):
+        self.usage = usage
+        self.finished = True
+        self.failed = not completed
+        self._wake()
+
+    def fail(self, exc: BaseException):
+        if not isinstance(exc, Exception):
+            # e.g. the leader was cancelled: followers see a failed upstream
+            # call, not a CancelledError of their own
+            error = RuntimeError(f"Flight leader failed: {exc!r}")
+            error.__cause__ = exc
+            exc = error
+        if not self.response.done():
+            self.response.set_exception(exc)
+            # Followers may never await it; avoid "exception never retrieved".
+            self.response.exception()
+        self.finished = True
+        self.failed = True
+        self._wake()
+
+    async def wait_finished(self):
+        while not self.finished:
+            changed = self._changed
+            await changed.wait()
+
+    async def iter_chunks(self):
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.finished:
+                if self.failed:
+                    raise FlightAborted("Upstream response ended early")
+                return
+            changed = self._changed
+            await changed.wait()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class Singleflight:
+    def __init__(self):
+        self._inflight: dict[str, Flight] = {}
+        self.coalesced = 0
+
+    def join(self, key: str) -> tuple[Flight, bool]:
+        """Return the flight for ``key`` and whether the caller leads it."""
+        flight = self._inflight.get(key)
+        if flight is not None:
+            flight.followers += 1
+            self.coalesced += 1
+            return flight, False
+        flight = self._inflight[key] = Flight()
+        return flight, True
+
+    def leave(self, key: str, flight: Flight):
+        # Later requests start a fresh flight (or hit the response cache).
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
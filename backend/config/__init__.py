@@ -1,11 +1,43 @@
-from .config_schema import ProviderConfigModel, GatewayKeyModel, GatewayConfigModel
+from .config_schema import (
+    EndpointConfigModel,
+    HedgeConfigModel,
+    CircuitBreakerConfigModel,
+    RetryConfigModel,
+    AdaptiveConcurrencyConfigModel,
+    EmbeddingBatchConfigModel,
+    ProviderConfigModel,
+    GatewayKeyModel,
+    GatewayConfigModel,
+    ResponseCacheConfigModel,
+    EmbeddingCacheConfigModel,
+    RateLimitConfigModel,
+    KeyStoreConfigModel,
+    ModelAliasConfigModel,
+)
+from .config_diff import ConfigDiff
+from .auth_index import AuthIndex, KeyPolicy, ModelMatcher
 from .config_store import ConfigSnapshot, ConfigStore
 from .config_watcher import watch_config_file
 
 __all__ = [
+    "EndpointConfigModel",
+    "HedgeConfigModel",
+    "CircuitBreakerConfigModel",
+    "RetryConfigModel",
+    "AdaptiveConcurrencyConfigModel",
+    "EmbeddingBatchConfigModel",
     "ProviderConfigModel",
     "GatewayKeyModel",
     "GatewayConfigModel",
+    "ResponseCacheConfigModel",
+    "EmbeddingCacheConfigModel",
+    "RateLimitConfigModel",
+    "KeyStoreConfigModel",
+    "ModelAliasConfigModel",
+    "ConfigDiff",
+    "AuthIndex",
+    "KeyPolicy",
+    "ModelMatcher",
     "ConfigSnapshot",
     "ConfigStore",
     "watch_config_file",
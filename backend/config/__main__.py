@@ -0,0 +1,15 @@
+import sys
+
+import yaml
+
+from backend.config.config_store import CONFIG_PATH
+from backend.config.key_hashing import hash_gateway_key, shared_salt
+
+# python -m backend.config <gateway key>...: the config.yaml entry name of
+# each key, with the salt the entries in config.yaml already use
+names = []
+if CONFIG_PATH.exists():
+    names = (yaml.safe_load(CONFIG_PATH.read_text()) or {}).get("gateway_keys") or {}
+salt = shared_salt(names)
+for key in sys.argv[1:]:
+    print(hash_gateway_key(key, salt))
@@ -0,0 +1,187 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from fnmatch import translate
+from typing import Mapping, Optional
+
+from backend.config.config_diff import ConfigDiff
+from backend.config.config_schema import (
+    GatewayConfigModel,
+    GatewayKeyModel,
+    is_model_pattern,
+)
+from backend.config.key_hashing import (
+    PLAINTEXT_SALT,
+    hash_gateway_key,
+    shared_salt,
+    stored_key_name,
+)
+
+# (key, provider, model) decisions kept per snapshot; models come from
+# clients, so the memo is bounded
+MAX_DECISIONS = 4096
+
+
+@dataclass(frozen=True)
+class ModelMatcher:
+    """A model allowlist: exact names, ``*`` and globs (``gpt-4.1*``)."""
+
+    allow_all: bool
+    exact: frozenset[str]
+    pattern: Optional[re.Pattern]
+
+    @classmethod
+    def compile(cls, models: list[str]) -> "ModelMatcher":
+        globs = [m for m in models if is_model_pattern(m) and m != "*"]
+        return cls(
+            allow_all="*" in models,
+            exact=frozenset(m for m in models if not is_model_pattern(m)),
+            pattern=re.compile("|".join(map(translate, globs))) if globs else None,
+        )
+
+    def __call__(self, model) -> bool:
+        if self.allow_all:
+            return True
+        if not isinstance(model, str):
+            return False
+        if model in self.exact:
+            return True
+        return self.pattern is not None and self.pattern.match(model) is not None
+
+
+@dataclass(frozen=True)
+class KeyPolicy:
+    # The config entry name: "sha256$<salt>$<digest>" of the gateway key
+    name: str
+    key: GatewayKeyModel
+    providers: frozenset[str]
+    models: ModelMatcher
+    # time.monotonic() deadline, so expiry needs no wall-clock read per request
+    deadline: Optional[float]
+    # Bumped when the key changes in place (key store), so memoized
+    # decisions for the old policy are not reused
+    revision: int = 0
+
+    @classmethod
+    def compile(cls, name: str, key: GatewayKeyModel, revision: int = 0) -> "KeyPolicy":
+        deadline = None
+        if key.expires_at:
+            remaining = key.expires_at - datetime.now(timezone.utc)
+            deadline = time.monotonic() + remaining.total_seconds()
+        return cls(
+            name,
+            key,
+            frozenset(key.providers),
+            ModelMatcher.compile(key.models),
+            deadline,
+            revision,
+        )
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+class AuthIndex:
+    """Gateway keys compiled for the auth hot path.
+
+    Only salted hashes of the keys are held, all with the config's one
+    salt: a bearer token is hashed once and looked up by its entry name.
+    Built once per config snapshot, so the memoized model decisions are
+    dropped whenever the config changes.
+    """
+
+    def __init__(
+        self,
+        gateway_keys: Mapping[str, GatewayKeyModel],
+        provider_models: Mapping[str, list[str]],
+        reuse: Optional[Mapping[str, KeyPolicy]] = None,
+    ):
+        reuse = reuse or {}
+        self._salt = shared_salt(gateway_keys, PLAINTEXT_SALT)
+        self.keys: dict[str, KeyPolicy] = {}
+        for name, key in gateway_keys.items():
+            name = stored_key_name(name, self._salt)
+            policy = reuse.get(name)
+            if policy is None or policy.key != key:
+                policy = KeyPolicy.compile(name, key)
+            self.keys[name] = policy
+        self._provider_lists = dict(provider_models)
+        self.provider_models = {
+            name: ModelMatcher.compile(models)
+            for name, models in provider_models.items()
+        }
+        self._decisions: dict[tuple, Optional[str]] = {}
+
+    @classmethod
+    def from_config(cls, config: GatewayConfigModel) -> "AuthIndex":
+        return cls(
+            config.gateway_keys,
+            {name: p.allowed_models for name, p in config.providers.items()},
+        )
+
+    def updated(self, config: GatewayConfigModel, changes: ConfigDiff) -> "AuthIndex":
+        """The index for a reloaded ``config`` (self if nothing it uses changed).
+
+        Policies of unchanged keys are reused instead of compiled again.
+        """
+        provider_models = {
+            name: p.allowed_models for name, p in config.providers.items()
+        }
+        if provider_models == self._provider_lists and not changes.touches(
+            "gateway_keys"
+        ):
+            return self
+        return AuthIndex(config.gateway_keys, provider_models, reuse=self.keys)
+
+    def adopt(self, previous: "AuthIndex"):
+        """Keep the model decisions of ``previous`` that still hold."""
+        if previous is not self and self._provider_lists == previous._provider_lists:
+            stale = {
+                name
+                for name, policy in previous.keys.items()
+                if self.keys.get(name) is not policy
+            }
+            self._decisions = {
+                memo: decision
+                for memo, decision in previous._decisions.items()
+                if memo[0] not in stale
+            }
+
+    def get(self, api_key: str) -> Optional[KeyPolicy]:
+        """The policy of a bearer token, None if it matches no key."""
+        # A dict lookup on a SHA-256 digest: its timing reveals nothing
+        # usable about the stored hashes
+        return self.keys.get(hash_gateway_key(api_key, self._salt))
+
+    def model_denied(
+        self, policy: KeyPolicy, provider: Optional[str], model
+    ) -> Optional[str]:
+        """Why ``model`` is refused for this key and provider (None if allowed).
+
+        ``provider`` is None on /route/..., whose handler checks each target
+        again with its provider.
+        """
+        if not isinstance(model, str):
+            return self._decide(policy, provider, model)
+        memo = (policy.name, policy.revision, provider, model)
+        try:
+            return self._decisions[memo]
+        except KeyError:
+            pass
+        if len(self._decisions) >= MAX_DECISIONS:
+            self._decisions.clear()
+        decision = self._decisions[memo] = self._decide(policy, provider, model)
+        return decision
+
+    def _decide(
+        self, policy: KeyPolicy, provider: Optional[str], model
+    ) -> Optional[str]:
+        if not policy.models(model):
+            return "Model not allowed"
+        if provider is not None:
+            allowed = self.provider_models.get(provider)
+            if allowed is None or not allowed(model):
+                return "Model not supported by provider"
+        return None
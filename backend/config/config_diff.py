@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+
+from backend.config.config_schema import GatewayConfigModel
+
+
+@dataclass(frozen=True)
+class ConfigDiff:
+    """What a reload changed, section by section.
+
+    Mapping sections (``providers``, ``gateway_keys``, ``model_aliases``)
+    are compared entry by entry; the other sections as a whole.
+    """
+
+    # section -> entry names
+    added: dict[str, tuple[str, ...]]
+    removed: dict[str, tuple[str, ...]]
+    changed: dict[str, tuple[str, ...]]
+    # single-model sections that changed (response_cache, rate_limit, ...)
+    sections: tuple[str, ...]
+
+    @classmethod
+    def between(cls, old: GatewayConfigModel, new: GatewayConfigModel) -> "ConfigDiff":
+        added, removed, changed, sections = {}, {}, {}, []
+        for section in GatewayConfigModel.model_fields:
+            before, after = getattr(old, section), getattr(new, section)
+            if not isinstance(after, dict):
+                if before != after:
+                    sections.append(section)
+                continue
+            for names, into in (
+                (after.keys() - before.keys(), added),
+                (before.keys() - after.keys(), removed),
+                (
+                    {n for n in after.keys() & before.keys() if after[n] != before[n]},
+                    changed,
+                ),
+            ):
+                if names:
+                    into[section] = tuple(sorted(names))
+        return cls(added, removed, changed, tuple(sections))
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed or self.sections)
+
+    def touches(self, section: str) -> bool:
+        return (
+            section in self.sections
+            or section in self.added
+            or section in self.removed
+            or section in self.changed
+        )
+
+    def entries(self, section: str) -> set[str]:
+        """Entries of a mapping section that were added, removed or changed."""
+        return {
+            *self.added.get(section, ()),
+            *self.removed.get(section, ()),
+            *self.changed.get(section, ()),
+        }
+
+    def summary(self) -> dict:
+        return {
+            "added": {k: list(v) for k, v in self.added.items()},
+            "removed": {k: list(v) for k, v in self.removed.items()},
+            "changed": {k: list(v) for k, v in self.changed.items()},
+            "sections": list(self.sections),
+        }
@@ -1,17 +1,164 @@
 from pydantic import BaseModel, Field, HttpUrl, field_validator, model_validator
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
+from fnmatch import fnmatchcase
+
+from backend.config.key_hashing import (
+    PLAINTEXT_SALT,
+    is_key_hash,
+    shared_salt,
+    stored_key_name,
+)
+
+GLOB_CHARS = frozenset("*?[")
+# Plaintext gateway keys already warned about (by stored hash)
+_WARNED_PLAINTEXT: set[str] = set()
+
+
+def is_model_pattern(model: str) -> bool:
+    return not GLOB_CHARS.isdisjoint(model)
+
+
+def patterns_overlap(a: str, b: str) -> bool:
+    """Whether two model names or globs (``gpt-4.1*``) can name the same model."""
+    return a == b or fnmatchcase(a, b) or fnmatchcase(b, a)
+
+
+class EndpointConfigModel(BaseModel):
+    url: HttpUrl
+    weight: float = Field(default=1.0, gt=0)
+
+    @field_validator("url", mode="before")
+    @classmethod
+    def strip_trailing_slash(cls, v: str):
+        return v.rstrip("/")
+
+
+class HedgeConfigModel(BaseModel):
+    enabled: bool = False
+    # Hedge once this percentile of recent time-to-answer has passed
+    percentile: float = Field(default=95, gt=0, lt=100)
+    min_delay_ms: float = Field(default=50, ge=0)
+    max_delay_ms: float = Field(default=10000, gt=0)
+    min_samples: int = Field(default=20, ge=1)
+    # Extra upstream requests allowed per request (token bucket)
+    budget_ratio: float = Field(default=0.05, gt=0, le=1)
+
+
+class CircuitBreakerConfigModel(BaseModel):
+    enabled: bool = False
+    # Rolling window the error/timeout rate is measured over
+    window_seconds: float = Field(default=30, gt=0)
+    min_requests: int = Field(default=20, ge=1)
+    failure_rate: float = Field(default=0.5, gt=0, le=1)
+    # How long an open circuit fails fast before a half-open trial request
+    open_seconds: float = Field(default=30, gt=0)
+
+
+class RetryConfigModel(BaseModel):
+    # Retries on connect errors for replayable, non-streaming requests
+    max_retries: int = Field(default=1, ge=0)
+    # Retries allowed per request (token bucket)
+    budget_ratio: float = Field(default=0.1, gt=0, le=1)
+    backoff_ms: float = Field(default=50, ge=0)
+
+
+class AdaptiveConcurrencyConfigModel(BaseModel):
+    enabled: bool = False
+    initial_limit: int = Field(default=16, ge=1)
+    min_limit: int = Field(default=1, ge=1)
+    # Also capped by the provider's max_concurrency
+    max_limit: int = Field(default=512, ge=1)
+    # Multiplicative cut on 429/503, timeouts or rising latency
+    backoff_ratio: float = Field(default=0.5, gt=0, lt=1)
+    # Cut when recent latency exceeds this multiple of the baseline
+    latency_tolerance: float = Field(default=2.0, gt=1)
+    # Longest pause honoured from an upstream Retry-After
+    max_hold_seconds: float = Field(default=5.0, ge=0)
+
+
+class EmbeddingBatchConfigModel(BaseModel):
+    enabled: bool = False
+    # Concurrent embeddings requests arriving within this window share a call
+    window_ms: float = Field(default=5.0, ge=0)
+    # Flush early once the batch holds this many inputs
+    max_inputs: int = Field(default=64, ge=2)
 
 
 class ProviderConfigModel(BaseModel):
-    base_url: HttpUrl
-    api_key: str
+    # Either a single base_url or a list of weighted endpoints
+    base_url: Optional[HttpUrl] = None
+    endpoints: List[EndpointConfigModel] = Field(default_factory=list)
+    # Either a single api_key or a pool of keys rotated per request
+    api_key: Optional[str] = None
+    api_keys: List[str] = Field(default_factory=list)
+    # Rest a key this long after a 429 that carries no Retry-After
+    credential_cooldown: float = Field(default=60.0, gt=0)
     allowed_models: List[str] = Field(min_length=1)
 
+    # Wire format, used to pick the usage parser for responses
+    api_format: Literal["openai", "anthropic"] = "openai"
+    # Add stream_options.include_usage to streamed OpenAI requests
+    inject_stream_usage: bool = False
+    # Stream non-streaming bodies straight to the client (usage read from tail)
+    response_passthrough: bool = False
+    # Reject request bodies larger than this (enforced while streaming)
+    max_body_bytes: Optional[int] = Field(default=None, gt=0)
+
+    # Upstream transport: aiohttp (HTTP/1.1) or http2 (multiplexed, needs httpx[http2])
+    transport: Literal["aiohttp", "http2"] = "aiohttp"
+    # Upstream connection pool (one session per provider)
+    max_connections: int = Field(default=100, ge=0)
+    max_connections_per_host: int = Field(default=0, ge=0)
+    keepalive_timeout: float = Field(default=30.0, gt=0)
+    dns_cache_ttl: int = Field(default=300, ge=0)
+    warm_connections: int = Field(default=0, ge=0)
+    # Upstream timeouts; read_timeout bounds each wait for data, not the stream
+    connect_timeout: float = Field(default=10.0, gt=0)
+    read_timeout: Optional[float] = Field(default=300.0, gt=0)
+
+    # Active health probes (disabled when no path is set)
+    health_check_path: Optional[str] = None
+    health_check_interval: float = Field(default=10.0, gt=0)
+    # Consecutive failures before an endpoint leaves rotation
+    unhealthy_threshold: int = Field(default=3, ge=1)
+    unhealthy_cooldown: float = Field(default=30.0, gt=0)
+
+    # Admission: requests beyond this many in flight wait in a fair queue
+    max_concurrency: Optional[int] = Field(default=None, gt=0)
+    max_queue_wait: float = Field(default=30.0, gt=0)
+    adaptive_concurrency: AdaptiveConcurrencyConfigModel = (
+        AdaptiveConcurrencyConfigModel()
+    )
+
+    # Coalesce concurrent /embeddings calls into one upstream input array
+    embedding_batch: EmbeddingBatchConfigModel = EmbeddingBatchConfigModel()
+    hedge: HedgeConfigModel = HedgeConfigModel()
+    circuit_breaker: CircuitBreakerConfigModel = CircuitBreakerConfigModel()
+    retry: RetryConfigModel = RetryConfigModel()
+
     @field_validator("base_url", mode="before")
     @classmethod
-    def strip_trailing_slash(cls, v: str):
-        return v.rstrip("/")
+    def strip_trailing_slash(cls, v: Optional[str]):
+        return v.rstrip("/") if v else v
+
+    @model_validator(mode="after")
+    def require_endpoint(self):
+        if self.base_url is None and not self.endpoints:
+            raise ValueError("provider needs a base_url or at least one endpoint")
+        if not self.api_key and not self.api_keys:
+            raise ValueError("provider needs an api_key or api_keys")
+        return self
+
+    @property
+    def credentials(self) -> List[str]:
+        return self.api_keys or [self.api_key]
+
+    @property
+    def upstream_endpoints(self) -> List[EndpointConfigModel]:
+        if self.endpoints:
+            return self.endpoints
+        return [EndpointConfigModel(url=str(self.base_url))]
 
 
 class GatewayKeyModel(BaseModel):
@@ -19,6 +166,13 @@ class GatewayKeyModel(BaseModel):
     providers: List[str] = Field(min_length=1)
     models: List[str] = Field(min_length=1)
     expires_at: Optional[datetime] = None
+    # Optional throughput limits (requests / tokens per minute)
+    rpm: Optional[int] = Field(default=None, gt=0)
+    tpm: Optional[int] = Field(default=None, gt=0)
+    # Queueing when a provider is saturated: interactive goes before batch,
+    # and owners share capacity in proportion to `share`
+    priority: Literal["interactive", "batch"] = "interactive"
+    share: float = Field(default=1.0, gt=0)
 
     @field_validator("expires_at")
     @classmethod
@@ -28,9 +182,96 @@ class GatewayKeyModel(BaseModel):
         return v
 
 
+class ResponseCacheConfigModel(BaseModel):
+    enabled: bool = False
+    ttl_seconds: float = Field(default=3600, gt=0)
+    max_entries: int = Field(default=1024, ge=1)
+    max_entry_bytes: int = Field(default=1024 * 1024, ge=1)
+    # Only cache requests sent with temperature 0
+    deterministic_only: bool = True
+    # Optional on-disk tier (one file per entry)
+    disk_path: Optional[str] = None
+    # Share one upstream call between identical concurrent requests
+    coalesce: bool = False
+
+
+class EmbeddingCacheConfigModel(BaseModel):
+    # Per-input cache for embeddings requests (only misses go upstream)
+    enabled: bool = False
+    max_entries: int = Field(default=100_000, ge=1)
+    # Vectors are returned exactly as received by default; float16 halves
+    # the memory but keeps only ~3 significant digits per component
+    dtype: Literal["float32", "float16"] = "float32"
+    # Directory for the memory-mapped vector files (temp dir by default)
+    path: Optional[str] = None
+
+
+class RateLimitConfigModel(BaseModel):
+    # Shared-memory counter file used by every worker on this host
+    # (defaults to /dev/shm, or the temp dir where that does not exist)
+    state_path: Optional[str] = None
+    # Minimum size; grown to twice the number of keys. Slots of keys whose
+    # limits have fully recovered are reused.
+    slots: int = Field(default=4096, ge=1)
+
+
+class KeyStoreConfigModel(BaseModel):
+    # SQLite file (WAL mode) holding gateway keys besides gateway_keys;
+    # written with `python -m backend.keystore`
+    path: str
+    # How often changed keys are picked up
+    poll_interval: float = Field(default=1.0, gt=0)
+    # Keys kept in memory (unknown tokens are remembered apart, at most 1024)
+    cache_size: int = Field(default=10_000, ge=1)
+
+
+class ModelAliasConfigModel(BaseModel):
+    # "provider:model" targets; the configured order breaks ties
+    targets: List[str] = Field(min_length=1)
+    # A target not tried for this long gets a request to refresh its stats
+    probe_interval: float = Field(default=30.0, gt=0)
+
+    @field_validator("targets")
+    @classmethod
+    def provider_and_model(cls, v: List[str]):
+        for target in v:
+            provider, _, model = target.partition(":")
+            if not provider or not model:
+                raise ValueError(f"alias target '{target}' must be 'provider:model'")
+        return v
+
+    @property
+    def parsed_targets(self) -> List[tuple[str, str]]:
+        return [tuple(t.split(":", 1)) for t in self.targets]
+
+
 class GatewayConfigModel(BaseModel):
     providers: Dict[str, ProviderConfigModel]
-    gateway_keys: Dict[str, GatewayKeyModel]
+    # May be empty when keys live in the key store
+    gateway_keys: Dict[str, GatewayKeyModel] = Field(default_factory=dict)
+    response_cache: ResponseCacheConfigModel = ResponseCacheConfigModel()
+    embedding_cache: EmbeddingCacheConfigModel = EmbeddingCacheConfigModel()
+    rate_limit: RateLimitConfigModel = RateLimitConfigModel()
+    key_store: Optional[KeyStoreConfigModel] = None
+    # Names clients can use as "model" on /route/...
+    model_aliases: Dict[str, ModelAliasConfigModel] = Field(default_factory=dict)
+
+    @field_validator("gateway_keys")
+    @classmethod
+    def keep_only_key_hashes(cls, keys):
+        salt = shared_salt(keys, PLAINTEXT_SALT)
+        stored = {}
+        for name, key in keys.items():
+            stored_name = stored_key_name(name, salt)
+            stored[stored_name] = key
+            # Once per key, not on every reload
+            if not is_key_hash(name) and stored_name not in _WARNED_PLAINTEXT:
+                _WARNED_PLAINTEXT.add(stored_name)
+                print(
+                    f"[config] Gateway key of '{key.owner}' is in plaintext; store "
+                    "`python -m backend.config <key>` instead"
+                )
+        return stored
 
     @model_validator(mode="after")
     def validate_references(self):
@@ -40,7 +281,10 @@ class GatewayConfigModel(BaseModel):
         for key_name, key in self.gateway_keys.items():
             # Allow models if they are valid for at least one listed provider.
             key_allows_all_models = "*" in key.models
-            model_allowed_by_any_provider = {m: False for m in key.models}
+            # Alias names are resolved to provider models on /route/...
+            model_allowed_by_any_provider = {
+                m: m in self.model_aliases for m in key.models
+            }
             # provider existence
             for provider in key.providers:
                 if provider not in self.providers:
@@ -53,12 +297,17 @@ class GatewayConfigModel(BaseModel):
                 provider_models = provider_cfg.allowed_models
 
                 # wildcard short-circuit
-                if key_allows_all_models or "*" in provider_models:
+                if key_allows_all_models:
+                    continue
+                if "*" in provider_models:
+                    model_allowed_by_any_provider = dict.fromkeys(
+                        model_allowed_by_any_provider, True
+                    )
                     continue
 
                 # model compatibility: mark models allowed by any provider
                 for model in key.models:
-                    if model in provider_models:
+                    if any(patterns_overlap(model, m) for m in provider_models):
                         model_allowed_by_any_provider[model] = True
 
             # after checking providers, fail only models unsupported by all providers
@@ -70,6 +319,31 @@ class GatewayConfigModel(BaseModel):
                             f"not allowed by any configured provider"
                         )
 
+        # ---- validate model aliases ----
+        for alias, alias_cfg in self.model_aliases.items():
+            # The request body is sent to any target as is
+            api_formats = set()
+            for provider, model in alias_cfg.parsed_targets:
+                provider_cfg = self.providers.get(provider)
+                if provider_cfg is None:
+                    errors.append(
+                        f"model_aliases.{alias}: unknown provider '{provider}'"
+                    )
+                    continue
+                api_formats.add(provider_cfg.api_format)
+                if not any(
+                    patterns_overlap(model, m) for m in provider_cfg.allowed_models
+                ):
+                    errors.append(
+                        f"model_aliases.{alias}: model '{model}' "
+                        f"not allowed by provider '{provider}'"
+                    )
+            if len(api_formats) > 1:
+                errors.append(
+                    f"model_aliases.{alias}: targets mix API formats "
+                    f"({', '.join(sorted(api_formats))})"
+                )
+
         if errors:
             raise ValueError("Invalid gateway configuration:\n" + "\n".join(errors))
 
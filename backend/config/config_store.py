@@ -1,51 +1,120 @@
+import asyncio
 import yaml
 import threading
 import time
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
+from backend.config.auth_index import AuthIndex
+from backend.config.config_diff import ConfigDiff
 from backend.config.config_schema import GatewayConfigModel
 
 CONFIG_PATH = Path("config.yaml")
 
 
 class ConfigSnapshot:
-    def __init__(self, config: GatewayConfigModel):
+    def __init__(
+        self,
+        config: GatewayConfigModel,
+        auth: Optional[AuthIndex] = None,
+        changes: Optional[ConfigDiff] = None,
+    ):
         self.config = config
+        # Keys compiled for auth; recompiled only when keys or provider
+        # models change
+        self.auth = auth if auth is not None else AuthIndex.from_config(config)
+        # What changed since the previous snapshot (None for the first one)
+        self.changes = changes
         self.version = int(time.time())
         self.loaded_at = time.time()
 
 
 class ConfigStore:
     _lock = threading.Lock()
+    # Serializes reloads, so each on_reload sees the changes of its own swap
+    _reload_lock = asyncio.Lock()
     _current: Optional[ConfigSnapshot] = None
     _last_error: Optional[str] = None
+    _last_reload: Optional[dict] = None
 
     @classmethod
-    def load(cls) -> bool:
-        try:
-            raw = yaml.safe_load(CONFIG_PATH.read_text())
+    def _prepare(cls, current: Optional[ConfigSnapshot]) -> Optional[ConfigSnapshot]:
+        """Parse, validate and diff config.yaml; None if nothing changed.
 
-            parsed = GatewayConfigModel.model_validate(raw)
+        Runs in a worker thread on reloads: ``current`` is only read.
+        """
+        raw = yaml.safe_load(CONFIG_PATH.read_text())
 
-            # for name, provider in parsed.providers.items():
-            #     if provider.env_api_key not in os.environ:
-            #         raise ValueError(
-            #             f"Provider '{name}': env var {provider.env_api_key} not set"
-            #         )
+        parsed = GatewayConfigModel.model_validate(raw)
 
-            snapshot = ConfigSnapshot(parsed)
+        # for name, provider in parsed.providers.items():
+        #     if provider.env_api_key not in os.environ:
+        #         raise ValueError(
+        #             f"Provider '{name}': env var {provider.env_api_key} not set"
+        #         )
 
-            with cls._lock:
-                cls._current = snapshot
-                cls._last_error = None
+        if current is None:
+            return ConfigSnapshot(parsed)
+        changes = ConfigDiff.between(current.config, parsed)
+        if not changes:
+            return None
+        return ConfigSnapshot(parsed, current.auth.updated(parsed, changes), changes)
 
-            return True
+    @classmethod
+    def _swap(
+        cls,
+        current: Optional[ConfigSnapshot],
+        snapshot: Optional[ConfigSnapshot],
+        started: float,
+    ):
+        if snapshot is not None and current is not None:
+            snapshot.auth.adopt(current.auth)
+        with cls._lock:
+            if snapshot is not None:
+                cls._current = snapshot
+            cls._last_error = None
+            cls._last_reload = {
+                "changed": snapshot is not None,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
 
+    @classmethod
+    def load(cls) -> bool:
+        """Load config.yaml in the calling thread (startup)."""
+        started = time.perf_counter()
+        current = cls._current
+        try:
+            snapshot = cls._prepare(current)
         except Exception as e:
             with cls._lock:
                 cls._last_error = str(e)
             return False
+        cls._swap(current, snapshot, started)
+        return True
+
+    @classmethod
+    async def reload(
+        cls, on_reload: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> bool:
+        """Reload config.yaml without blocking the event loop.
+
+        Parsing, validation and the diff against the current snapshot run in
+        a worker thread; the new snapshot is swapped in at once, and
+        ``on_reload`` awaited, only if something changed.
+        """
+        async with cls._reload_lock:
+            started = time.perf_counter()
+            current = cls._current
+            try:
+                snapshot = await asyncio.to_thread(cls._prepare, current)
+            except Exception as e:
+                with cls._lock:
+                    cls._last_error = str(e)
+                return False
+            cls._swap(current, snapshot, started)
+            if snapshot is not None and on_reload is not None:
+                await on_reload()
+            return True
 
     @classmethod
     def get(cls) -> ConfigSnapshot:
@@ -56,9 +125,13 @@ class ConfigStore:
 
     @classmethod
     def status(cls):
+        changes = cls._current.changes if cls._current else None
         return {
             "loaded": cls._current is not None,
             "version": cls._current.version if cls._current else None,
             "loaded_at": cls._current.loaded_at if cls._current else None,
             "last_error": cls._last_error,
+            "last_reload": cls._last_reload,
+            # What the current snapshot changed when it was swapped in
+            "changes": changes.summary() if changes is not None else None,
         }
@@ -1,40 +1,160 @@
 import asyncio
+import ctypes
+import hashlib
+import os
+import struct
 from pathlib import Path
+from typing import Optional
 
+from backend.config import config_store
 from backend.config.config_store import ConfigStore
 
-CONFIG_PATH = Path("config.yaml")
-POLL_INTERVAL = 1.0  # seconds
+POLL_INTERVAL = 1.0  # seconds, when inotify is unavailable
+# Quiet time after the last write before reloading, so a burst of writes
+# (an editor saving, a half-written file) causes one reload
+DEBOUNCE = 0.2
 
+# inotify(7): watch the directory, so a file renamed over config.yaml (an
+# atomic save) is seen as well as writes to it in place
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_MODIFY = 0x002
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (then the name)
 
-async def watch_config_file():
-    last_mtime = None
 
+class Inotify:
+    """A non-blocking inotify descriptor watching one directory (Linux)."""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"cannot watch {directory}")
+        self.fd = fd
+
+    def names(self) -> set[str]:
+        """Names of the entries changed since the last call."""
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                names.add(os.fsdecode(data[offset : offset + length].rstrip(b"\0")))
+                offset += length
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _fingerprint(path: Path) -> Optional[tuple[int, int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    # The inode changes when a new file is renamed over the old one
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+async def _poll(path: Path, changed: asyncio.Event):
+    last = _fingerprint(path)
     while True:
-        try:
-            mtime = CONFIG_PATH.stat().st_mtime
+        await asyncio.sleep(POLL_INTERVAL)
+        current = _fingerprint(path)
+        if current != last:
+            last = current
+            changed.set()
+
+
+def _digest(path: Path) -> bytes:
+    return hashlib.sha256(path.read_bytes()).digest()
 
-            if last_mtime is None:
-                last_mtime = mtime
 
-            elif mtime != last_mtime:
-                ok = ConfigStore.load()
+async def watch_config_file(on_reload=None, path: Optional[Path] = None):
+    """Reload the config whenever config.yaml's content changes.
+
+    Woken by inotify where available (stat polling otherwise); writes are
+    debounced, and a reload is skipped when the SHA-256 of the file is the
+    one last loaded.
+    """
+    path = Path(path or config_store.CONFIG_PATH)
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    inotify = poller = None
+    try:
+        inotify = Inotify(path.parent)
+    except (OSError, AttributeError) as e:
+        # AttributeError: no inotify in this libc (not Linux)
+        print("[config] inotify unavailable, polling config.yaml:", e)
+        poller = asyncio.create_task(_poll(path, changed))
+    else:
+
+        def on_events():
+            names = inotify.names()
+            # "": a queue overflow, where any file may have changed
+            if path.name in names or "" in names:
+                changed.set()
+
+        loop.add_reader(inotify.fd, on_events)
+
+    try:
+        last_digest = await asyncio.to_thread(_digest, path)
+    except FileNotFoundError:
+        last_digest = None
+
+    try:
+        while True:
+            await changed.wait()
+            # Wait until the writes stop
+            while True:
+                changed.clear()
+                try:
+                    await asyncio.wait_for(changed.wait(), DEBOUNCE)
+                except TimeoutError:
+                    break
+
+            try:
+                digest = await asyncio.to_thread(_digest, path)
+                if digest == last_digest:
+                    continue  # touched or rewritten with the same content
+                last_digest = digest
+
+                # Parsed and validated off the event loop
+                ok = await ConfigStore.reload(on_reload)
 
                 if ok:
-                    print("[config] Reloaded successfully")
+                    if ConfigStore.status()["last_reload"]["changed"]:
+                        print("[config] Reloaded successfully")
+                    else:
+                        print("[config] Unchanged, nothing reloaded")
                 else:
                     print(
                         "[config] Reload failed, rolled back:",
                         ConfigStore.status()["last_error"],
                     )
 
-                last_mtime = mtime
-
-        except FileNotFoundError:
-            print("[config] config.yaml not found (ignored)")
+            except FileNotFoundError:
+                print("[config] config.yaml not found (ignored)")
 
-        except Exception as e:
-            # Never crash the watcher
-            print("[config] Watcher error:", e)
-
-        await asyncio.sleep(POLL_INTERVAL)
+            except Exception as e:
+                # Never crash the watcher
+                print("[config] Watcher error:", e)
+    finally:
+        if inotify is not None:
+            loop.remove_reader(inotify.fd)
+            inotify.close()
+        if poller is not None:
+            poller.cancel()
@@ -0,0 +1,53 @@
+import hashlib
+import secrets
+from typing import Iterable, Optional
+
+# "sha256$<salt hex>$<sha256(salt + key) hex>". Gateway keys are long random
+# tokens, so a salted SHA-256 is enough; a slow KDF would only add latency.
+# All entries of a config share one salt, so checking a bearer token is one
+# hash and one dict lookup however many keys there are.
+HASH_SCHEME = "sha256"
+SALT_BYTES = 16
+# Salt for plaintext entries when no entry is hashed yet. One per process,
+# so reloading an unchanged config yields the same names.
+PLAINTEXT_SALT = secrets.token_bytes(SALT_BYTES)
+
+
+def is_key_hash(value: str) -> bool:
+    scheme, _, rest = value.partition("$")
+    salt, _, digest = rest.partition("$")
+    return (
+        scheme == HASH_SCHEME
+        and len(salt) == 2 * SALT_BYTES
+        and len(digest) == 64
+        and all(c in "0123456789abcdef" for c in salt + digest)
+    )
+
+
+def hash_gateway_key(api_key: str, salt: Optional[bytes] = None) -> str:
+    salt = salt if salt is not None else secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.sha256(salt + api_key.encode()).hexdigest()
+    return f"{HASH_SCHEME}${salt.hex()}${digest}"
+
+
+def shared_salt(names: Iterable[str], default: Optional[bytes] = None) -> bytes:
+    """The salt of the hashed entry names (``default``, or new, if none are)."""
+    salts = {name.split("$")[1] for name in names if is_key_hash(name)}
+    if len(salts) > 1:
+        raise ValueError(
+            "gateway_keys entries must share one salt; hash new keys with "
+            "`python -m backend.config <key>`"
+        )
+    if salts:
+        return bytes.fromhex(salts.pop())
+    return default if default is not None else secrets.token_bytes(SALT_BYTES)
+
+
+def key_id(api_key: str) -> str:
+    """Short, non-reversible id for a gateway or provider key (safe to log)."""
+    return hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+
+
+def stored_key_name(name: str, salt: bytes) -> str:
+    """A ``gateway_keys`` entry name as kept in memory: always a hash."""
+    return name if is_key_hash(name) else hash_gateway_key(name, salt)
@@ -0,0 +1,5 @@
+from .sqlite_store import KeyStore
+
+KEY_STORE = KeyStore()
+
+__all__ = ["KeyStore", "KEY_STORE"]
@@ -0,0 +1,32 @@
+import json
+import sys
+
+from backend.config import GatewayKeyModel, KeyStoreConfigModel
+from backend.keystore.sqlite_store import KeyStore
+
+USAGE = """\
+python -m backend.keystore <keys.db> put <gateway key> '<key JSON>'
+python -m backend.keystore <keys.db> delete <gateway key>
+python -m backend.keystore <keys.db> import <file.jsonl>
+    one {"key": "<gateway key>", "owner": ..., "providers": ...} per line"""
+
+if len(sys.argv) < 4:
+    sys.exit(USAGE)
+path, command, arg, *rest = sys.argv[1:]
+
+store = KeyStore()
+store.configure(KeyStoreConfigModel(path=path))
+if command == "put" and len(rest) == 1:
+    store.put(arg, GatewayKeyModel.model_validate_json(rest[0]))
+elif command == "delete":
+    store.delete(arg)
+elif command == "import":
+    with open(arg, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    store.put_many(
+        (entry.pop("key"), GatewayKeyModel.model_validate(entry)) for entry in entries
+    )
+    print(f"[keystore] Imported {len(entries)} keys")
+else:
+    sys.exit(USAGE)
+store.close()
@@ -0,0 +1,275 @@
+import asyncio
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from backend.config import GatewayKeyModel, KeyPolicy, KeyStoreConfigModel
+from backend.config.key_hashing import SALT_BYTES, hash_gateway_key
+
+# Changed rows read per query; a bulk import is applied in several batches
+MAX_CHANGES = 1000
+# Poll interval while no key store is configured
+IDLE_POLL_INTERVAL = 1.0
+# Unknown tokens remembered (apart from the keys, so that a flood of random
+# tokens cannot evict real keys)
+MAX_UNKNOWN = 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gateway_keys (
+    -- hash_gateway_key(key, store salt): one hash finds the row
+    name TEXT PRIMARY KEY,
+    -- GatewayKeyModel as JSON; NULL once deleted (the row stays so that
+    -- pollers see the change)
+    policy TEXT,
+    -- change sequence, bumped on every write
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS gateway_keys_seq ON gateway_keys (seq);
+"""
+
+UPSERT = """
+INSERT INTO gateway_keys (name, policy, seq)
+VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM gateway_keys))
+ON CONFLICT (name) DO UPDATE SET policy = excluded.policy, seq = excluded.seq
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    # Autocommit; writers take the lock explicitly with BEGIN IMMEDIATE
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")  # readers never wait for a writer
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+class KeyStore:
+    """Gateway keys kept in a SQLite file, read through an in-process LRU.
+
+    Rows are named by a salted hash of the key (one salt per store file), so
+    a bearer token costs one hash and, on a cache miss, one primary-key
+    lookup in a worker thread; nothing is loaded up front. Every write bumps
+    the row's change sequence, and ``watch()`` reads only the rows past the
+    last sequence it saw (in a worker thread) and refreshes those that are
+    cached. Unknown tokens are remembered in a small LRU of their own until
+    the poll sees the key written.
+    """
+
+    def __init__(self):
+        self.cfg: Optional[KeyStoreConfigModel] = None
+        self._db: Optional[sqlite3.Connection] = None
+        # Polls run in a worker thread, on their own connection
+        self._poll_db: Optional[sqlite3.Connection] = None
+        # Held while a poll reads, so its connection is not closed under it
+        self._poll_lock = threading.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self._salt = b""
+        # name -> (seq of the row as read, policy or None once deleted)
+        self._cache: OrderedDict[str, tuple[int, Optional[KeyPolicy]]] = OrderedDict()
+        # names of tokens not in the store
+        self._unknown: OrderedDict[str, None] = OrderedDict()
+        self._seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.applied = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def configure(self, cfg: Optional[KeyStoreConfigModel]):
+        if cfg == self.cfg:
+            return
+        previous, self.cfg = self.cfg, cfg
+        if cfg is not None and previous is not None and cfg.path == previous.path:
+            self._trim()
+            return
+        self.close()
+        if cfg is not None:
+            self._open(cfg.path)
+
+    def _open(self, path: str):
+        db = connect(path)
+        db.execute(
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('salt', ?)",
+            (secrets.token_bytes(SALT_BYTES).hex(),),
+        )
+        (salt,) = db.execute("SELECT value FROM meta WHERE name = 'salt'").fetchone()
+        (seq,) = db.execute("SELECT COALESCE(MAX(seq), 0) FROM gateway_keys").fetchone()
+        self._db, self._salt, self._seq = db, bytes.fromhex(salt), seq
+
+    def _name(self, api_key: str) -> str:
+        return hash_gateway_key(api_key, self._salt)
+
+    # ---- lookups ----
+
+    async def get(self, api_key: str) -> Optional[KeyPolicy]:
+        """The policy of a bearer token, None if it is not in the store."""
+        if self._db is None:
+            return None
+        name = self._name(api_key)
+        entry = self._cache.get(name)
+        if entry is not None:
+            self._cache.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+        if name in self._unknown:
+            self._unknown.move_to_end(name)
+            self.hits += 1
+            return None
+
+        self.misses += 1
+        db, seq = self._db, self._seq
+        row = await asyncio.to_thread(self._read, db, name)
+        policy = self._compile(name, *row) if row else None
+        # Not cached if the store was reconfigured or a poll applied changes
+        # meanwhile: the row read may be older than they are
+        if self._db is db and self._seq == seq:
+            if row:
+                self._cache[name] = (row[1], policy)
+            else:
+                self._unknown[name] = None
+            self._trim()
+        return policy
+
+    @staticmethod
+    def _read(db: sqlite3.Connection, name: str) -> Optional[tuple[str, int]]:
+        return db.execute(
+            "SELECT policy, seq FROM gateway_keys WHERE name = ?", (name,)
+        ).fetchone()
+
+    @staticmethod
+    def _compile(name: str, policy: Optional[str], seq: int) -> Optional[KeyPolicy]:
+        if policy is None:
+            return None
+        try:
+            key = GatewayKeyModel.model_validate_json(policy)
+        except ValueError as e:
+            print(f"[keystore] Ignoring invalid key row (seq {seq}):", e)
+            return None
+        return KeyPolicy.compile(name, key, revision=seq)
+
+    def _trim(self):
+        limit = self.cfg.cache_size if self.cfg else 0
+        while len(self._cache) > limit:
+            self._cache.popitem(last=False)
+        while len(self._unknown) > MAX_UNKNOWN:
+            self._unknown.popitem(last=False)
+
+    # ---- change polling ----
+
+    def _fetch_changes(self, since: int) -> list[tuple[str, Optional[str], int]]:
+        with self._poll_lock:
+            if self._db is None:
+                return []  # closed meanwhile
+            if self._poll_db is None:
+                self._poll_db = connect(self.cfg.path)
+            return self._poll_db.execute(
+                "SELECT name, policy, seq FROM gateway_keys WHERE seq > ? "
+                "ORDER BY seq LIMIT ?",
+                (since, MAX_CHANGES),
+            ).fetchall()
+
+    async def poll(self) -> int:
+        """Apply the keys changed since the last poll; returns how many were cached."""
+        applied = 0
+        while self._db is not None:
+            db = self._db
+            rows = await asyncio.to_thread(self._fetch_changes, self._seq)
+            if self._db is not db:
+                break  # reconfigured meanwhile
+            applied += self._apply(rows)
+            if len(rows) < MAX_CHANGES:
+                break
+        return applied
+
+    def _apply(self, rows: list[tuple[str, Optional[str], int]]) -> int:
+        applied = 0
+        for name, policy, seq in rows:
+            self._seq = max(self._seq, seq)
+            entry = self._cache.get(name)
+            # Keys that are not cached are read fresh on their next request
+            if name in self._unknown or (entry is not None and entry[0] < seq):
+                self._unknown.pop(name, None)
+                self._cache[name] = (seq, self._compile(name, policy, seq))
+                applied += 1
+        self._trim()
+        self.applied += applied
+        return applied
+
+    def start(self):
+        """Poll for changed keys in the background until ``stop()``."""
+        if self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self.watch())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        # A cancelled poll may still be reading in its worker thread; close()
+        # waits for it to let go of the connection
+        self.close()
+
+    async def watch(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                # Never crash the watcher
+                print("[keystore] Poll error:", e)
+            await asyncio.sleep(
+                self.cfg.poll_interval if self.cfg else IDLE_POLL_INTERVAL
+            )
+
+    # ---- writes (admin CLI) ----
+
+    def put_many(self, keys: Iterable[tuple[str, Optional[GatewayKeyModel]]]):
+        """Add, replace or (with None) delete keys in one transaction."""
+        rows = [
+            (self._name(api_key), key.model_dump_json() if key else None)
+            for api_key, key in keys
+        ]
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.executemany(UPSERT, rows)
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def put(self, api_key: str, key: GatewayKeyModel):
+        self.put_many([(api_key, key)])
+
+    def delete(self, api_key: str):
+        self.put_many([(api_key, None)])
+
+    def stats(self) -> dict:
+        return {
+            "path": self.cfg.path if self.cfg else None,
+            "cached": len(self._cache),
+            "unknown": len(self._unknown),
+            "hits": self.hits,
+            "misses": self.misses,
+            "seq": self._seq,
+            "applied": self.applied,
+        }
+
+    def close(self):
+        with self._poll_lock:
+            for db in (self._db, self._poll_db):
+                if db is not None:
+                    db.close()
+            self._db = self._poll_db = None
+        self._cache.clear()
+        self._unknown.clear()
+        self._seq = 0
@@ -1,16 +1,88 @@
 import asyncio
+import json
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from time import time
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from dotenv import load_dotenv
 
-from backend.config import ConfigStore, watch_config_file
+from backend.config import (
+    ConfigStore,
+    GatewayConfigModel,
+    ProviderConfigModel,
+    watch_config_file,
+)
 from backend.auth import authenticate_and_authorize
-from backend.proxy import forward_request
-from backend.usage import USAGE_SINK, JSONLUsageWriter
+from backend.batching import EMBEDDING_BATCHER, EmbeddingBatch, batch_inputs
+from backend.cache import (
+    EMBEDDING_CACHE,
+    RESPONSE_CACHE,
+    SINGLEFLIGHT,
+    CachedResponse,
+    EmbeddingFill,
+)
+from backend.keystore import KEY_STORE
+from backend.proxy import (
+    CONNECT_ERRORS,
+    forward_request,
+    replay_cached_response,
+    serve_batched_response,
+)
+from backend.ratelimit import RATE_LIMITER, RateLimitUsageWriter
+from backend.request_body import RequestBody
+from backend.request_json import ParsedBody
+from backend.routing import MODEL_ROUTER
+from backend.scheduler import SCHEDULER
+from backend.upstream import (
+    UPSTREAM_BALANCER,
+    UPSTREAM_CREDENTIALS,
+    UPSTREAM_HEDGER,
+    UPSTREAM_POOL,
+    UPSTREAM_RETRIES,
+)
+from backend.usage import (
+    USAGE_SINK,
+    JSONLUsageWriter,
+    UsageRecord,
+    add_stream_usage_option,
+    request_prompt_tokens,
+)
 
 load_dotenv()
 
 USAGE_SINK.add_writer(JSONLUsageWriter())
+# Reconciles per-key TPM limits from the tokens each response actually used
+USAGE_SINK.add_writer(RateLimitUsageWriter(RATE_LIMITER))
+
+
+async def on_config_reload():
+    snapshot = ConfigStore.get()
+    cfg = snapshot.config
+    # Only state derived from the sections that changed is rebuilt
+    # (everything on the first load).
+    changes = snapshot.changes
+    touched = changes.touches if changes is not None else lambda section: True
+    if touched("response_cache"):
+        RESPONSE_CACHE.configure(cfg.response_cache)
+    if touched("embedding_cache"):
+        EMBEDDING_CACHE.configure(cfg.embedding_cache)
+    if touched("rate_limit") or touched("gateway_keys") or touched("key_store"):
+        # Counter slots for every key that may be in use
+        keys = len(cfg.gateway_keys)
+        if cfg.key_store is not None:
+            keys += cfg.key_store.cache_size
+        RATE_LIMITER.configure(cfg.rate_limit, keys=keys)
+    if touched("key_store"):
+        KEY_STORE.configure(cfg.key_store)
+
+    if touched("providers"):
+        # Only pools whose connection settings changed are rebuilt.
+        rebuilt = await UPSTREAM_POOL.sync(cfg.providers)
+        if rebuilt:
+            print("[upstream] Rebuilt pools:", ", ".join(rebuilt))
+        UPSTREAM_BALANCER.sync(cfg.providers)
+        UPSTREAM_CREDENTIALS.sync(cfg.providers)
+        SCHEDULER.sync(cfg.providers)
 
 
 async def on_startup():
@@ -18,12 +90,18 @@ async def on_startup():
         raise RuntimeError(
             f"Initial config load failed: {ConfigStore.status()['last_error']}"
         )
-    asyncio.create_task(watch_config_file())
+    await on_config_reload()
+    asyncio.create_task(watch_config_file(on_reload=on_config_reload))
     asyncio.create_task(USAGE_SINK.worker())
+    # Picks up keys changed in the key store without a config reload
+    KEY_STORE.start()
 
 
 async def on_shutdown():
-    pass
+    await UPSTREAM_BALANCER.close()
+    await UPSTREAM_POOL.close()
+    RATE_LIMITER.close()
+    await KEY_STORE.stop()
 
 
 @asynccontextmanager
@@ -48,17 +126,273 @@ async def gateway(provider: str, path: str, request: Request):
     body = await authenticate_and_authorize(
         request,
         provider,
-        provider_cfg.allowed_models,
-        cfg.gateway_keys,
+        snapshot.auth,
+        max_body_bytes=provider_cfg.max_body_bytes,
+    )
+    return await dispatch(request, provider, path, provider_cfg, cfg, body)
+
+
+@app.api_route("/route/{path:path}", methods=["POST"])
+async def route(path: str, request: Request):
+    """Send a request for a model alias to the best target, falling back on failure."""
+    snapshot = ConfigStore.get()
+    cfg = snapshot.config
+    limits = [p.max_body_bytes for p in cfg.providers.values()]
+    body = await authenticate_and_authorize(
+        request,
+        None,
+        snapshot.auth,
+        max_body_bytes=max(limits) if None not in limits else None,
+    )
+
+    alias = request.state.model
+    alias_cfg = cfg.model_aliases.get(alias)
+    if alias_cfg is None or not isinstance(body, bytes):
+        raise HTTPException(404, "Unknown model alias")
+    payload = request.state.parsed_body.payload
+    if payload is None:
+        raise HTTPException(400, "Request body is not valid JSON")
+
+    # 🧭 Fastest healthy target first; others are fallbacks. The key needs
+    # the alias and each target's provider and model.
+    targets = [
+        (provider, model)
+        for provider, model in MODEL_ROUTER.rank(alias_cfg)
+        if provider in request.state.allowed_providers
+    ]
+    if not targets:
+        raise HTTPException(403, "Provider not allowed")
+    policy = request.state.policy
+    targets = [
+        (provider, model)
+        for provider, model in targets
+        if not snapshot.auth.model_denied(policy, provider, model)
+    ]
+    if not targets:
+        raise HTTPException(403, "Model not allowed")
+
+    request.state.route_alias = alias
+    for attempt, (provider, model) in enumerate(targets):
+        last = attempt == len(targets) - 1
+        request.state.model = model
+        request.state.route_attempt = attempt
+        target = ParsedBody.from_payload({**payload, "model": model})
+        request.state.parsed_body = target
+        target_body = target.raw
+        start = time()
+        try:
+            response = await dispatch(
+                request,
+                provider,
+                path,
+                cfg.providers[provider],
+                cfg,
+                target_body,
+                buffer_errors=not last,
+            )
+        except (*CONNECT_ERRORS, HTTPException) as e:
+            status_code = getattr(e, "status_code", 502)
+            if isinstance(e, HTTPException) and status_code < 500:
+                raise
+            MODEL_ROUTER.observe(provider, model, (time() - start) * 1000, ok=False)
+            await record_route_failure(
+                request, provider, status_code, start, len(target_body)
+            )
+            if last:
+                raise
+            continue
+
+        ok = response.status_code < 500
+        MODEL_ROUTER.observe(provider, model, (time() - start) * 1000, ok)
+        # 5xx on a non-final target was buffered: nothing has reached the client.
+        if ok or last:
+            return response
+
+
+async def record_route_failure(
+    request: Request, provider: str, status_code: int, start: float, bytes_in: int
+):
+    """Usage entry for a target that failed before answering."""
+    await USAGE_SINK.record(
+        UsageRecord(
+            timestamp=time(),
+            owner=request.state.owner,
+            key_id=request.state.key_id,
+            route_alias=request.state.route_alias,
+            route_attempt=request.state.route_attempt,
+            provider=provider,
+            model=request.state.model,
+            status_code=status_code,
+            duration_ms=int((time() - start) * 1000),
+            bytes_in=bytes_in,
+            bytes_out=0,
+        )
+    )
+
+
+async def dispatch(
+    request: Request,
+    provider: str,
+    path: str,
+    provider_cfg: ProviderConfigModel,
+    cfg: GatewayConfigModel,
+    body: RequestBody,
+    buffer_errors: bool = False,
+):
+    parsed = request.state.parsed_body
+    if (
+        provider_cfg.inject_stream_usage
+        and provider_cfg.api_format == "openai"
+        and parsed is not None
+        and parsed.stream
+    ):
+        parsed = request.state.parsed_body = add_stream_usage_option(parsed)
+        body = parsed.raw
+
+    cache_key = RESPONSE_CACHE.key_for(
+        provider,
+        request.method,
+        path,
+        parsed,
+        request.query_params.multi_items(),
+        request.headers,
+    )
+    if cache_key:
+        cached = await RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return await replay_cached_response(request, provider, cached, body)
+
+    payload = inputs = None
+    batch_cfg = provider_cfg.embedding_batch
+    if (
+        (EMBEDDING_CACHE.enabled or batch_cfg.enabled)
+        and request.method == "POST"
+        and path.rstrip("/").endswith("embeddings")
+        and parsed is not None
+    ):
+        payload = parsed.payload
+        inputs = batch_inputs(payload)
+
+    # 🧮 Per-input embedding cache: only the inputs it lacks go upstream
+    fill = None
+    if inputs and EMBEDDING_CACHE.enabled:
+        fill = EMBEDDING_CACHE.lookup(provider, payload, inputs)
+        if fill.complete:
+            entry = CachedResponse(
+                status_code=200,
+                headers={"content-type": "application/json"},
+                media_type="application/json",
+                body=fill.response(payload.get("model")),
+            )
+            return await replay_cached_response(request, provider, entry, body)
+        if fill.hits:
+            inputs = [inputs[i] for i in fill.misses]
+            payload = {**payload, "input": inputs}
+            body = json.dumps(payload).encode()
+
+    # 📦 Concurrent embeddings calls wait a few ms and go upstream as one
+    if (
+        inputs
+        and batch_cfg.enabled
+        and len(inputs) < batch_cfg.max_inputs
+        and not payload.get("stream")
+    ):
+        start = time()
+        batch, member, leads = EMBEDDING_BATCHER.join(
+            provider, payload, inputs, batch_cfg
+        )
+        if leads:
+            # Sent from a task of its own: the first caller disconnecting
+            # does not fail the rest of the batch
+            def send_batch(combined: bytes):
+                return send_upstream(
+                    request,
+                    provider,
+                    path,
+                    provider_cfg,
+                    cfg,
+                    combined,
+                    None,
+                    batch,
+                    None,
+                )
+
+            EMBEDDING_BATCHER.launch(batch, batch_cfg, send_batch)
+        response = await serve_batched_response(
+            request, provider, member, body, start, fill
+        )
+        if response is not None:
+            return response
+        # Alone in its batch, or the batch was refused: sent on its own
+
+    return await send_upstream(
+        request,
+        provider,
+        path,
+        provider_cfg,
+        cfg,
+        body,
+        cache_key,
+        None,
+        fill,
+        buffer_errors,
+    )
+
+
+async def send_upstream(
+    request: Request,
+    provider: str,
+    path: str,
+    provider_cfg: ProviderConfigModel,
+    cfg: GatewayConfigModel,
+    body: RequestBody,
+    cache_key: Optional[str],
+    batch: Optional[EmbeddingBatch],
+    fill: Optional[EmbeddingFill],
+    buffer_errors: bool = False,
+):
+    # 🚥 Fair admission once the provider is at its concurrency cap
+    admission = await SCHEDULER.acquire(
+        provider,
+        request.state.owner,
+        priority=request.state.priority,
+        share=request.state.share,
+        # Large prompts weigh more in the owner's share (per 1k tokens, min 1);
+        # only estimated if the request has to queue
+        cost=lambda: max(1.0, (request_prompt_tokens(request) or 0) / 1000),
     )
 
-    target_url = f"{provider_cfg.base_url}/{path}"
+    # ⚖️ Least-outstanding-requests endpoint choice (503 if every circuit is open)
+    try:
+        endpoint = UPSTREAM_BALANCER.acquire(provider)
+    except BaseException:
+        SCHEDULER.release(admission)
+        raise
+    if endpoint is not None:
+        base_url = endpoint.url
+    else:
+        base_url = str(provider_cfg.upstream_endpoints[0].url).rstrip("/")
+    target_url = f"{base_url}/{path}"
 
     return await forward_request(
         request,
         target_url,
-        provider_cfg.api_key,
+        provider_cfg.credentials[0],
         body,
+        api_format=provider_cfg.api_format,
+        response_passthrough=(
+            provider_cfg.response_passthrough and batch is None and fill is None
+        ),
+        cache_key=cache_key,
+        coalesce=cfg.response_cache.coalesce,
+        endpoint=endpoint,
+        hedge=provider_cfg.hedge,
+        retry=provider_cfg.retry,
+        admission=admission,
+        batch=batch,
+        embedding_fill=fill,
+        buffer_errors=buffer_errors,
+        provider=provider,
     )
 
 
@@ -69,12 +403,27 @@ async def health():
 
 @app.get("/internal/config/status")
 async def config_status():
-    return ConfigStore.status()
+    return {
+        **ConfigStore.status(),
+        "upstream_pools": UPSTREAM_POOL.stats(),
+        "endpoints": UPSTREAM_BALANCER.stats(),
+        "credentials": UPSTREAM_CREDENTIALS.stats(),
+        "hedging": UPSTREAM_HEDGER.stats(),
+        "retries": UPSTREAM_RETRIES.stats(),
+        "response_cache": RESPONSE_CACHE.stats(),
+        "embedding_cache": EMBEDDING_CACHE.stats(),
+        "coalescing": SINGLEFLIGHT.stats(),
+        "rate_limit": RATE_LIMITER.stats(),
+        "key_store": KEY_STORE.stats(),
+        "admission": SCHEDULER.stats(),
+        "embedding_batching": EMBEDDING_BATCHER.stats(),
+        "routing": MODEL_ROUTER.stats(),
+    }
 
 
 @app.post("/internal/reload-config")
 async def reload_config():
-    ok = ConfigStore.load()
+    ok = await ConfigStore.reload(on_reload=on_config_reload)
     status = ConfigStore.status()
 
     if not ok:
@@ -1,10 +1,47 @@
 from time import time
+from typing import Optional
+import asyncio
 import json
 import aiohttp
-from fastapi import Request
+from fastapi import HTTPException, Request
 from fastapi.responses import Response, StreamingResponse
 
-from backend.usage import UsageRecord, USAGE_SINK
+from backend.batching import BatchMember, EmbeddingBatch
+from backend.cache import (
+    RESPONSE_CACHE,
+    SINGLEFLIGHT,
+    CachedResponse,
+    EmbeddingFill,
+    Flight,
+)
+from backend.config import HedgeConfigModel, RetryConfigModel
+from backend.request_body import (
+    RequestBody,
+    StreamedBody,
+    body_size,
+    raise_if_body_too_large,
+)
+from backend.scheduler import SCHEDULER, AdmissionTicket
+from backend.upstream import (
+    UPSTREAM_BALANCER,
+    UPSTREAM_CREDENTIALS,
+    UPSTREAM_HEDGER,
+    UPSTREAM_POOL,
+    UPSTREAM_RETRIES,
+    EndpointState,
+    UpstreamConnectError,
+    UpstreamAttempt,
+    race_hedged,
+)
+from backend.usage import (
+    UsageRecord,
+    USAGE_SINK,
+    StreamTimer,
+    TailUsageScanner,
+    extract_usage,
+    make_stream_usage_parser,
+    request_prompt_tokens,
+)
 
 HOP_BY_HOP_HEADERS = {
     "host",
@@ -19,38 +56,226 @@ HOP_BY_HOP_HEADERS = {
     "upgrade",
 }
 
+# Failures where the request body never left the gateway
+CONNECT_ERRORS = (
+    aiohttp.ClientConnectorError,
+    aiohttp.ConnectionTimeoutError,
+    UpstreamConnectError,
+)
+
+
+def estimate_if_missing(request: Request, status_code: int, usage: tuple):
+    """Fall back to the pre-flight prompt estimate when upstream reported none.
+
+    Returns the (prompt, completion, total) tokens and whether they were
+    estimated.
+    """
+    prompt_tokens, completion_tokens, total_tokens = usage
+    if status_code >= 400 or prompt_tokens is not None or total_tokens is not None:
+        return usage, False
+    estimate = request_prompt_tokens(request)
+    if estimate is None:
+        return usage, False
+    return (estimate, completion_tokens, estimate + (completion_tokens or 0)), True
+
 
 async def forward_request(
     request: Request,
     target_url: str,
     provider_api_key: str,
-    body: bytes,
+    body: RequestBody,
+    api_format: str = "openai",
+    response_passthrough: bool = False,
+    cache_key: Optional[str] = None,
+    coalesce: bool = False,
+    endpoint: Optional[EndpointState] = None,
+    hedge: Optional[HedgeConfigModel] = None,
+    retry: Optional[RetryConfigModel] = None,
+    admission: Optional[AdmissionTicket] = None,
+    batch: Optional[EmbeddingBatch] = None,
+    embedding_fill: Optional[EmbeddingFill] = None,
+    buffer_errors: bool = False,
+    provider: Optional[str] = None,
 ):
     start = time()
-    bytes_in = len(body)
+    # /route/... passes the provider of the target it picked
+    provider = provider or request.path_params["provider"]
+
+    def release_admission():
+        if admission is not None:
+            SCHEDULER.release(admission)
+
+    # 🧲 Identical in-flight requests share the leader's upstream call
+    flight = None
+    if cache_key and coalesce:
+        flight, is_leader = SINGLEFLIGHT.join(cache_key)
+        if not is_leader:
+            if endpoint is not None:
+                UPSTREAM_BALANCER.release(endpoint)
+            release_admission()
+            return await serve_coalesced_response(
+                request, provider, flight, body, start
+            )
 
     headers = {
         k: v
         for k, v in request.headers.items()
         if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != "authorization"
     }
-    headers["Authorization"] = f"Bearer {provider_api_key}"
+    # The Authorization header is set per attempt from the credential pool.
+    if batch is not None or embedding_fill is not None:
+        # The response is re-split or merged, so it has to come back uncompressed.
+        headers = {k: v for k, v in headers.items() if k.lower() != "accept-encoding"}
+    if isinstance(body, StreamedBody) and "content-length" in request.headers:
+        # Keep the declared length so the upload is not re-chunked upstream.
+        headers["Content-Length"] = request.headers["content-length"]
+
+    # ♻️ Pooled keep-alive transport; released once the response is done
+    pool = UPSTREAM_POOL.acquire(provider)
+    transport = pool.transport
+
+    is_stream = getattr(request.state, "stream", False)
+    collector = RESPONSE_CACHE.collector(cache_key) if cache_key else None
 
-    session = aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(total=None),
-        auto_decompress=False,
+    # 🏁 Hedging: a late answer triggers a duplicate on another endpoint.
+    # Streams only count as answered once their first chunk has arrived.
+    hedging = hedge is not None and hedge.enabled and isinstance(body, bytes)
+    delay = UPSTREAM_HEDGER.delay_for(provider, is_stream, hedge) if hedging else None
+    wait_first_chunk = hedging and is_stream
+
+    # 🔁 Connect errors never reached upstream, so replayable non-streaming
+    # requests may retry them while the provider's retry budget allows.
+    can_retry = (
+        retry is not None
+        and retry.max_retries > 0
+        and isinstance(body, bytes)
+        and not is_stream
     )
+    if can_retry:
+        UPSTREAM_RETRIES.earn(provider, retry.budget_ratio)
 
-    # 🔀 NON-STREAMING: buffer once, parse usage
-    if not getattr(request.state, "stream", False):
-        async with session.request(
-            method=request.method,
-            url=target_url,
-            headers=headers,
-            params=request.query_params,
-            data=body,
-        ) as resp:
-            raw = await resp.read()
+    def reroute(failed: EndpointState):
+        ep = UPSTREAM_BALANCER.acquire(provider, exclude=failed)
+        return ep, ep.url + target_url[len(endpoint.url) :]
+
+    async def send(ep: Optional[EndpointState], url: str) -> UpstreamAttempt:
+        attempt_start = time()
+        # 🔑 Key with the most rate-limit headroom (or least recently used)
+        credential = UPSTREAM_CREDENTIALS.acquire(provider)
+        api_key = credential.api_key if credential else provider_api_key
+        resp = None
+        try:
+            resp = await transport.request(
+                method=request.method,
+                url=url,
+                headers={**headers, "Authorization": f"Bearer {api_key}"},
+                params=request.query_params,
+                data=body,
+            )
+            if credential is not None:
+                UPSTREAM_CREDENTIALS.observe(credential, resp.status, resp.headers)
+            upstream = UpstreamAttempt(resp, ep, credential, headers_at=time())
+            if wait_first_chunk:
+                upstream.chunks = resp.content.iter_any()
+                upstream.first_chunk = await anext(upstream.chunks, b"")
+                upstream.first_chunk_at = time()
+            if ep is not None:
+                latency_ms = (time() - attempt_start) * 1000
+                # Settled in release(): the body may still time out
+                UPSTREAM_BALANCER.observe(
+                    ep, latency_ms, resp.status < 500, settled=False
+                )
+            return upstream
+        except BaseException as e:
+            if resp is not None:
+                resp.close()
+            if ep is not None:
+                if isinstance(e, aiohttp.ClientError):
+                    UPSTREAM_BALANCER.observe(ep, 0, ok=False)
+                UPSTREAM_BALANCER.release(ep)
+            raise
+        finally:
+            if credential is not None:
+                UPSTREAM_CREDENTIALS.release(credential)
+
+    async def attempt(index: int) -> UpstreamAttempt:
+        ep, url = endpoint, target_url
+        if index > 0 and endpoint is not None:
+            ep, url = reroute(endpoint)
+
+        retries = 0
+        while True:
+            try:
+                return await send(ep, url)
+            except CONNECT_ERRORS:
+                if (
+                    not can_retry
+                    or retries >= retry.max_retries
+                    or not UPSTREAM_RETRIES.try_retry(provider)
+                ):
+                    raise
+            retries += 1
+            await asyncio.sleep(retry.backoff_ms / 1000)
+            if ep is not None:
+                ep, url = reroute(ep)
+
+    def discard(upstream: UpstreamAttempt):
+        upstream.resp.close()
+        if upstream.endpoint is not None:
+            UPSTREAM_BALANCER.release(upstream.endpoint)
+
+    try:
+        upstream, winner, hedged = await race_hedged(
+            attempt, discard, delay, lambda: UPSTREAM_HEDGER.try_hedge(provider)
+        )
+    except BaseException as e:
+        if isinstance(e, asyncio.TimeoutError):
+            SCHEDULER.observe(provider, None, (time() - start) * 1000)
+        UPSTREAM_POOL.release(pool)
+        release_admission()
+        if flight is not None:
+            flight.fail(e)
+            SINGLEFLIGHT.leave(cache_key, flight)
+        if isinstance(e, aiohttp.ClientError):
+            raise_if_body_too_large(body)
+        raise
+
+    resp = upstream.resp
+    # 📉 Upstream status and latency drive the adaptive concurrency limit
+    SCHEDULER.observe(provider, resp.status, (time() - start) * 1000, resp.headers)
+    if hedging:
+        UPSTREAM_HEDGER.record(provider, is_stream, (time() - start) * 1000)
+        UPSTREAM_HEDGER.record_winner(winner)
+    hedge_winner = winner if hedged else None
+    credential_id = upstream.credential.key_id if upstream.credential else None
+    ttfb_ms = int((upstream.headers_at - start) * 1000)
+
+    def release(timed_out: bool = False):
+        UPSTREAM_POOL.release(pool)
+        release_admission()
+        if upstream.endpoint is not None:
+            if resp.status < 500:
+                # 🔌 A body that stopped coming counts against the circuit
+                UPSTREAM_BALANCER.settle(upstream.endpoint, ok=not timed_out)
+            UPSTREAM_BALANCER.release(upstream.endpoint)
+
+    # 🔀 NON-STREAMING: buffer once, parse usage. 5xx answers are buffered
+    # too when the caller may still fall back to another target.
+    if (not is_stream and not response_passthrough) or (
+        buffer_errors and resp.status >= 500
+    ):
+        timed_out = False
+        try:
+            if upstream.chunks is not None:
+                rest = [chunk async for chunk in upstream.chunks]
+                raw = upstream.first_chunk + b"".join(rest)
+            else:
+                raw = await resp.read()
+            if batch is not None:
+                # 📦 Every batched caller takes its own slice (and records
+                # its own usage) in serve_batched_response
+                batch.resolve(resp.status, resp.headers, raw)
+                return None
             bytes_out = len(raw)
 
             prompt_tokens = None
@@ -60,84 +285,336 @@ async def forward_request(
                 data = json.loads(raw)
                 usage = data.get("usage")
                 if usage:
-                    prompt_tokens = usage.get("prompt_tokens")
-                    completion_tokens = usage.get("completion_tokens")
-                    total_tokens = usage.get("total_tokens")
+                    prompt_tokens, completion_tokens, total_tokens = extract_usage(
+                        usage
+                    )
             except Exception:
                 pass  # never break the response
 
+            response_headers = resp.headers
+            if embedding_fill is not None:
+                # 🧮 Cache the fetched vectors and slot the cached ones back in
+                raw = embedding_fill.merge(resp.status, raw)
+                bytes_out = len(raw)
+                response_headers = {
+                    k: v
+                    for k, v in resp.headers.items()
+                    if k.lower() != "content-length"
+                }
+
             duration_ms = int((time() - start) * 1000)
+            (prompt_tokens, completion_tokens, total_tokens), estimated = (
+                estimate_if_missing(
+                    request,
+                    resp.status,
+                    (prompt_tokens, completion_tokens, total_tokens),
+                )
+            )
 
             await USAGE_SINK.record(
                 UsageRecord(
                     timestamp=time(),
                     owner=request.state.owner,
-                    provider=request.path_params["provider"],
+                    key_id=getattr(request.state, "key_id", None),
+                    route_alias=getattr(request.state, "route_alias", None),
+                    route_attempt=getattr(request.state, "route_attempt", None),
+                    provider=provider,
                     model=request.state.model,
                     status_code=resp.status,
                     duration_ms=duration_ms,
-                    bytes_in=bytes_in,
+                    bytes_in=body_size(body),
                     bytes_out=bytes_out,
                     prompt_tokens=prompt_tokens,
                     completion_tokens=completion_tokens,
                     total_tokens=total_tokens,
+                    tokens_estimated=estimated,
+                    hedged=hedged,
+                    hedge_winner=hedge_winner,
+                    credential_id=credential_id,
+                    ttfb_ms=ttfb_ms,
                 )
             )
 
-            await session.close()
+            if collector is not None:
+                collector.feed(raw)
+                await RESPONSE_CACHE.store(
+                    collector, resp.status, resp.headers, is_stream=False
+                )
+            if flight is not None:
+                flight.start(resp.status, response_headers, buffered=True)
+                flight.publish(raw)
+                flight.finish((prompt_tokens, completion_tokens, total_tokens))
 
             return Response(
                 content=raw,
                 status_code=resp.status,
-                headers=dict(resp.headers),
+                headers=dict(response_headers),
                 media_type=resp.headers.get("content-type"),
             )
+        except BaseException as e:
+            timed_out = isinstance(e, aiohttp.ServerTimeoutError)
+            if flight is not None:
+                flight.fail(e)
+            raise
+        finally:
+            resp.release()
+            release(timed_out)
+            if flight is not None:
+                SINGLEFLIGHT.leave(cache_key, flight)
 
-    # STREAMING: do NOT attempt token tracking
+    # STREAMING: scan SSE chunks for the usage event as they pass through.
+    # PASS-THROUGH: relay the JSON body, keeping only its tail for usage.
     bytes_out = 0
+    if is_stream:
+        usage_parser = make_stream_usage_parser(api_format)
+    else:
+        usage_parser = TailUsageScanner()
+    # ⏱️ TTFB / TTFT / inter-chunk gaps as the stream passes through
+    timer = StreamTimer(start, api_format)
+    timer.on_headers(upstream.headers_at)
 
-    async def stream(resp):
+    def take(chunk: bytes, at: float):
         nonlocal bytes_out
+        bytes_out += len(chunk)
+        timer.on_chunk(chunk, at)
+        usage_parser.feed(chunk)
+        if collector is not None:
+            collector.feed(chunk)
+        if flight is not None:
+            flight.publish(chunk)
+
+    async def stream(resp):
+        completed = timed_out = False
         try:
-            async for chunk in resp.content.iter_any():
-                bytes_out += len(chunk)
+            if upstream.first_chunk:
+                take(upstream.first_chunk, upstream.first_chunk_at)
+                yield upstream.first_chunk
+            async for chunk in upstream.chunks or resp.content.iter_any():
+                take(chunk, time())
                 yield chunk
-        except aiohttp.ClientConnectionError:
+            completed = True
+        except aiohttp.ClientConnectionError as e:
             # Upstream closed mid-stream; treat as EOF to avoid noisy TaskGroup errors.
-            pass
+            timed_out = isinstance(e, aiohttp.ServerTimeoutError)
         finally:
             duration_ms = int((time() - start) * 1000)
+            usage_parser.finish()
+            (prompt_tokens, completion_tokens, total_tokens), estimated = (
+                estimate_if_missing(request, resp.status, usage_parser.result())
+            )
+            if is_stream:
+                timing = timer.fields(completion_tokens)
+            else:
+                timing = {"ttfb_ms": ttfb_ms}
 
             await USAGE_SINK.record(
                 UsageRecord(
                     timestamp=time(),
                     owner=request.state.owner,
-                    provider=request.path_params["provider"],
+                    key_id=getattr(request.state, "key_id", None),
+                    route_alias=getattr(request.state, "route_alias", None),
+                    route_attempt=getattr(request.state, "route_attempt", None),
+                    provider=provider,
                     model=request.state.model,
                     status_code=resp.status,
                     duration_ms=duration_ms,
-                    bytes_in=bytes_in,
+                    bytes_in=body_size(body),
                     bytes_out=bytes_out,
-                    prompt_tokens=None,
-                    completion_tokens=None,
-                    total_tokens=None,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    total_tokens=total_tokens,
+                    tokens_estimated=estimated,
+                    hedged=hedged,
+                    hedge_winner=hedge_winner,
+                    credential_id=credential_id,
+                    **timing,
                 )
             )
+            if completed and collector is not None:
+                await RESPONSE_CACHE.store(
+                    collector, resp.status, resp.headers, is_stream=is_stream
+                )
+            if flight is not None:
+                flight.finish(usage_parser.result(), completed)
+                SINGLEFLIGHT.leave(cache_key, flight)
             resp.close()
-            await session.close()
+            release(timed_out)
 
+    if flight is not None:
+        flight.start(resp.status, resp.headers, buffered=False)
 
-    resp = await session.request(
-        method=request.method,
-        url=target_url,
-        headers=headers,
-        params=request.query_params,
-        data=body
-    )
-    
     return StreamingResponse(
         stream(resp),
         status_code=resp.status,
         headers=dict(resp.headers),
-        media_type=resp.headers.get("content-type")
+        media_type=resp.headers.get("content-type"),
+    )
+
+
+async def serve_coalesced_response(
+    request: Request, provider: str, flight: Flight, body: RequestBody, start: float
+):
+    """Answer a follower from the leader's upstream response."""
+    try:
+        status_code, headers, media_type = await asyncio.shield(flight.response)
+    except Exception:
+        raise HTTPException(502, "Upstream request failed")
+
+    async def record(bytes_out: int):
+        prompt_tokens, completion_tokens, total_tokens = flight.usage
+        await USAGE_SINK.record(
+            UsageRecord(
+                timestamp=time(),
+                owner=request.state.owner,
+                key_id=getattr(request.state, "key_id", None),
+                route_alias=getattr(request.state, "route_alias", None),
+                route_attempt=getattr(request.state, "route_attempt", None),
+                provider=provider,
+                model=request.state.model,
+                status_code=status_code,
+                duration_ms=int((time() - start) * 1000),
+                bytes_in=body_size(body),
+                bytes_out=bytes_out,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=total_tokens,
+                coalesced=True,
+            )
+        )
+
+    if flight.buffered:
+        await flight.wait_finished()
+        if flight.failed:
+            raise HTTPException(502, "Upstream request failed")
+        raw = b"".join(flight.chunks)
+        await record(len(raw))
+        return Response(
+            content=raw,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    async def fan_out():
+        # Raises FlightAborted if the leader's stream ended early, so the
+        # follower's response is cut off rather than ended cleanly
+        bytes_out = 0
+        try:
+            async for chunk in flight.iter_chunks():
+                bytes_out += len(chunk)
+                yield chunk
+        finally:
+            await record(bytes_out)
+
+    return StreamingResponse(
+        fan_out(),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+async def serve_batched_response(
+    request: Request,
+    provider: str,
+    member: BatchMember,
+    body: RequestBody,
+    start: float,
+    embedding_fill: Optional[EmbeddingFill] = None,
+):
+    """Answer a batched embeddings caller from its slice of the batch's call.
+
+    Returns None when the caller has to send its request on its own (it was
+    alone in its batch, or the batch was refused).
+    """
+    try:
+        part = await asyncio.shield(member.result)
+    except HTTPException:
+        raise  # e.g. the batch was refused admission: same answer for all
+    except Exception:
+        raise HTTPException(502, "Upstream request failed")
+    if part is None:
+        return None
+
+    raw = part.body
+    if embedding_fill is not None:
+        raw = embedding_fill.merge(part.status_code, raw)
+
+    await USAGE_SINK.record(
+        UsageRecord(
+            timestamp=time(),
+            owner=request.state.owner,
+            key_id=getattr(request.state, "key_id", None),
+            route_alias=getattr(request.state, "route_alias", None),
+            route_attempt=getattr(request.state, "route_attempt", None),
+            provider=provider,
+            model=request.state.model,
+            status_code=part.status_code,
+            duration_ms=int((time() - start) * 1000),
+            bytes_in=body_size(body),
+            bytes_out=len(raw),
+            prompt_tokens=part.prompt_tokens,
+            total_tokens=part.total_tokens,
+            batch_size=part.batch_size,
+        )
+    )
+    return Response(
+        content=raw,
+        status_code=part.status_code,
+        headers=part.headers,
+        media_type=part.headers.get("content-type"),
+    )
+
+
+async def replay_cached_response(
+    request: Request, provider: str, entry: CachedResponse, body: RequestBody
+):
+    """Serve a cache hit from memory; SSE hits are replayed chunk by chunk."""
+    start = time()
+    headers = {**entry.headers, "x-gateway-cache": "hit"}
+
+    async def record(bytes_out: int):
+        await USAGE_SINK.record(
+            UsageRecord(
+                timestamp=time(),
+                owner=request.state.owner,
+                key_id=getattr(request.state, "key_id", None),
+                route_alias=getattr(request.state, "route_alias", None),
+                route_attempt=getattr(request.state, "route_attempt", None),
+                provider=provider,
+                model=request.state.model,
+                status_code=entry.status_code,
+                duration_ms=int((time() - start) * 1000),
+                bytes_in=body_size(body),
+                bytes_out=bytes_out,
+                prompt_tokens=0,
+                completion_tokens=0,
+                total_tokens=0,
+                cache_hit=True,
+            )
+        )
+
+    if entry.events is None:
+        await record(len(entry.body))
+        return Response(
+            content=entry.body,
+            status_code=entry.status_code,
+            headers=headers,
+            media_type=entry.media_type,
+        )
+
+    async def replay():
+        bytes_out = 0
+        try:
+            for event in entry.events:
+                bytes_out += len(event)
+                yield event
+        finally:
+            await record(bytes_out)
+
+    return StreamingResponse(
+        replay(),
+        status_code=entry.status_code,
+        headers=headers,
+        media_type=entry.media_type,
     )
@@ -0,0 +1,12 @@
+from .shared_table import SharedCounterTable
+from .limiter import RateLimiter, RateLimitUsageWriter, key_id_for
+
+RATE_LIMITER = RateLimiter()
+
+__all__ = [
+    "SharedCounterTable",
+    "RateLimiter",
+    "RateLimitUsageWriter",
+    "key_id_for",
+    "RATE_LIMITER",
+]
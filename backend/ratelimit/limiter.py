@@ -0,0 +1,137 @@
+import os
+import tempfile
+import time
+from typing import Optional
+
+from backend.config import RateLimitConfigModel
+from backend.config.key_hashing import key_id as key_id_for
+from backend.usage import UsageRecord
+
+from .shared_table import SharedCounterTable
+
+WINDOW_SECONDS = 60.0
+STATE_FILE = "llm-forward-ratelimit"
+
+
+def default_state_path() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, STATE_FILE)
+
+
+def _slot_key(key_id: str) -> int:
+    return int(key_id, 16) or 1
+
+
+class RateLimiter:
+    """Per-key RPM/TPM limits (GCRA) kept in a table shared by all workers.
+
+    Each key has a theoretical arrival time (TAT) per limit. A request moves
+    the RPM TAT forward by 60/rpm seconds and is refused if that would put
+    it more than a minute ahead of now. Token counts are only known once the
+    response is done, so the TPM TAT is moved forward when usage is recorded;
+    a new request is refused if its estimated prompt would push the TPM TAT
+    more than a minute ahead.
+
+    A key whose TATs have both passed is indistinguishable from a new one,
+    so its slot is handed to the next key that needs one.
+    """
+
+    def __init__(self):
+        self.cfg = RateLimitConfigModel()
+        self.slots = self.cfg.slots
+        self._table: Optional[SharedCounterTable] = None
+        self._tpm: dict[str, int] = {}
+        self.limited = 0
+        self.unlimited = 0  # requests let through because the table was full
+
+    def configure(self, cfg: RateLimitConfigModel, keys: int = 0):
+        """``keys``: how many keys may hold limits; the table gets twice that."""
+        slots = max(cfg.slots, 2 * keys)
+        if cfg == self.cfg and slots <= self.slots:
+            return
+        self.cfg = cfg
+        self.slots = slots
+        self.close()
+
+    def _open(self) -> SharedCounterTable:
+        if self._table is None:
+            self._table = SharedCounterTable(
+                self.cfg.state_path or default_state_path(), self.slots
+            )
+        return self._table
+
+    def check(
+        self,
+        key_id: str,
+        rpm: Optional[int],
+        tpm: Optional[int],
+        tokens: int = 0,
+    ) -> Optional[float]:
+        """Admit one request; return the seconds to wait if it is over a limit."""
+        if tpm:
+            self._tpm[key_id] = tpm
+        else:
+            self._tpm.pop(key_id, None)
+
+        now = time.time()
+        with self._open().slot(_slot_key(key_id), expired_before=now) as tats:
+            if tats is None:
+                # Table full: fail open rather than block traffic
+                self.unlimited += 1
+                return None
+            rpm_tat, tpm_tat = tats
+            # A prompt bigger than the whole budget still goes once the
+            # window is clear.
+            cost = min(tokens * WINDOW_SECONDS / tpm, WINDOW_SECONDS) if tpm else 0
+            if tpm and tpm_tat - now >= WINDOW_SECONDS - cost and tpm_tat > now:
+                wait = tpm_tat + cost - now - WINDOW_SECONDS
+            elif rpm:
+                new_tat = max(rpm_tat, now) + WINDOW_SECONDS / rpm
+                wait = new_tat - now - WINDOW_SECONDS
+                if wait <= 0:
+                    tats[0] = new_tat
+                    return None
+            else:
+                return None
+
+        self.limited += 1
+        return wait
+
+    def charge(self, key_id: str, tokens: int):
+        """Count tokens a key has used against its TPM limit."""
+        tpm = self._tpm.get(key_id)
+        if not tpm or not tokens:
+            return
+        now = time.time()
+        with self._open().slot(_slot_key(key_id), expired_before=now) as tats:
+            if tats is not None:
+                tats[1] = max(tats[1], now) + tokens * WINDOW_SECONDS / tpm
+
+    def stats(self) -> dict:
+        return {
+            "limited": self.limited,
+            "unlimited": self.unlimited,
+            "slots": self._table.slots if self._table else self.slots,
+            "state_path": self._table.path if self._table else None,
+        }
+
+    def close(self):
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+
+
+class RateLimitUsageWriter:
+    """Usage writer that charges recorded tokens to the key's TPM limit."""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def write(self, usage: UsageRecord):
+        # Cache hits and coalesced followers cost the provider nothing.
+        if usage.key_id is None or usage.cache_hit or usage.coalesced:
+            return
+        tokens = usage.total_tokens
+        if tokens is None:
+            tokens = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+        self.limiter.charge(usage.key_id, tokens)
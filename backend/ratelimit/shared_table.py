@@ -0,0 +1,91 @@
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX: counters stay per process
+    fcntl = None
+
+# key hash, then two float counters
+SLOT = struct.Struct("<Qdd")
+# Slots probed for a key before the table counts as full
+MAX_PROBE = 64
+
+
+class SharedCounterTable:
+    """Fixed-size hash table of float pairs in a memory-mapped file.
+
+    Every worker process maps the same file, so reads and updates are plain
+    memory accesses; a short ``flock`` makes each read-modify-write atomic
+    across processes.
+    """
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        size = slots * SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            # A bigger file (left by a worker sized for more keys) wins, so
+            # every worker hashes keys to the same slots
+            size = os.fstat(self._fd).st_size // SLOT.size * SLOT.size
+        self.slots = size // SLOT.size
+        self._mm = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, key: int, expired_before: float) -> Optional[int]:
+        """Offset of ``key``'s slot, or of a free one for it; None if full.
+
+        Linear probing over at most ``MAX_PROBE`` slots. Key 0 marks an empty
+        slot (nothing is stored past one), and a slot whose counters are all
+        below ``expired_before`` holds no state worth keeping: it is taken
+        over.
+        """
+        start = key % self.slots
+        free = None
+        for i in range(min(MAX_PROBE, self.slots)):
+            offset = ((start + i) % self.slots) * SLOT.size
+            stored, a, b = SLOT.unpack_from(self._mm, offset)
+            if stored == key:
+                return offset
+            if stored == 0:
+                return offset if free is None else free
+            if free is None and a < expired_before and b < expired_before:
+                free = offset
+        return free
+
+    @contextmanager
+    def slot(self, key: int, expired_before: float = float("-inf")):
+        """Lock the table and yield ``[a, b]`` for ``key``; changes are written back.
+
+        A new key starts at ``[0, 0]``, in an empty slot or one whose
+        counters are all below ``expired_before``. Yields None when the
+        table is full.
+        """
+        with self._locked():
+            offset = self._find(key, expired_before)
+            if offset is None:
+                yield None
+                return
+            stored, a, b = SLOT.unpack_from(self._mm, offset)
+            values = [a, b] if stored == key else [0.0, 0.0]
+            yield values
+            SLOT.pack_into(self._mm, offset, key, values[0], values[1])
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,84 @@
+from typing import Optional, Union
+
+from fastapi import HTTPException, Request
+
+BINARY_MIME_PREFIXES = ("audio/", "video/", "image/")
+BINARY_MIME_TYPES = {"application/octet-stream", "application/zip", "application/pdf"}
+
+
+def _mime_type(content_type: Optional[str]) -> str:
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def should_stream_body(content_type: Optional[str]) -> bool:
+    """Multipart and binary bodies never carry an inspectable model field."""
+    mime = _mime_type(content_type)
+    return (
+        mime.startswith("multipart/")
+        or mime in BINARY_MIME_TYPES
+        or mime.startswith(BINARY_MIME_PREFIXES)
+    )
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(413, "Request body too large")
+
+
+def check_declared_length(request: Request, max_bytes: Optional[int]):
+    if max_bytes is None:
+        return
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise _too_large()
+
+
+async def read_body(request: Request, max_bytes: Optional[int]) -> bytes:
+    """Read a body to inspect it, aborting as soon as it passes ``max_bytes``."""
+    if max_bytes is None:
+        return await request.body()
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large()
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class StreamedBody:
+    """Request body relayed from the ASGI receive channel without buffering.
+
+    Passed to aiohttp as ``data``; the size limit is enforced chunk by chunk
+    and ``exceeded`` lets the proxy turn the aborted upload into a 413.
+    """
+
+    def __init__(self, request: Request, max_bytes: Optional[int] = None):
+        self._request = request
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.exceeded = False
+
+    async def __aiter__(self):
+        async for chunk in self._request.stream():
+            self.bytes_read += len(chunk)
+            if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+                self.exceeded = True
+                raise _too_large()
+            if chunk:
+                yield chunk
+
+
+RequestBody = Union[bytes, StreamedBody]
+
+
+def body_size(body: RequestBody) -> int:
+    if isinstance(body, StreamedBody):
+        return body.bytes_read
+    return len(body)
+
+
+def raise_if_body_too_large(body: RequestBody):
+    if isinstance(body, StreamedBody) and body.exceeded:
+        raise _too_large()
@@ -0,0 +1,281 @@
+import json
+import re
+from typing import Any, Optional
+
+# Top-level members the gateway itself reads on every request
+SCANNED_KEYS = ("model", "stream")
+# Below this a full json.loads (in C) is cheaper than scanning in Python
+SCAN_MIN_BYTES = 32 * 1024
+
+_WHITESPACE = b" \t\n\r"
+_SCALAR_BYTES = frozenset(b"0123456789+-.eEtrufalsnNIiybd")
+_SCALAR = re.compile(rb"[^,}\s]+")
+_NOT_PARSED = object()
+
+
+class _Unscannable(Exception):
+    """The scan cannot answer on its own; a full parse has to."""
+
+
+def _skip_ws(raw: bytes, pos: int) -> int:
+    while raw[pos : pos + 1] in (b" ", b"\t", b"\n", b"\r"):
+        pos += 1
+    return pos
+
+
+def _skip_ws_back(raw: bytes, pos: int) -> int:
+    while pos > 0 and raw[pos - 1] in _WHITESPACE:
+        pos -= 1
+    return pos
+
+
+def _escaped(raw: bytes, quote: int) -> bool:
+    backslashes = 0
+    while raw[quote - 1 - backslashes] == 0x5C:
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _string_end(raw: bytes, pos: int) -> int:
+    """Index just past the string whose opening quote is at ``pos``."""
+    end = raw.find(b'"', pos + 1)
+    while end >= 0 and _escaped(raw, end):
+        end = raw.find(b'"', end + 1)
+    if end < 0:
+        raise _Unscannable
+    return end + 1
+
+
+def _string_start(raw: bytes, end: int) -> int:
+    """Index of the opening quote of the string that ends just before ``end``."""
+    start = raw.rfind(b'"', 0, end - 1)
+    while start > 0 and _escaped(raw, start):
+        start = raw.rfind(b'"', 0, start)
+    if start < 0:
+        raise _Unscannable
+    return start
+
+
+def _key(raw: bytes, start: int, end: int) -> str:
+    key = raw[start + 1 : end - 1]
+    return json.loads(raw[start:end]) if b"\\" in key else key.decode()
+
+
+_LITERALS = {b"true": True, b"false": False, b"null": None}
+
+
+def _value(raw: bytes) -> Any:
+    if raw[:1] == b'"' and b"\\" not in raw:
+        return raw[1:-1].decode()
+    if raw in _LITERALS:
+        return _LITERALS[raw]
+    return json.loads(raw)
+
+
+def _may_hold_keys(raw: bytes, keys, start: int, end: int) -> bool:
+    """Whether ``raw[start:end]`` could contain one of ``keys`` as an object key.
+
+    Walks the strings in the range (``bytes.find`` from quote to quote) and
+    gives up, answering True, once that would cost more than a fraction of
+    a full parse (bodies made of many small strings).
+    """
+    budget = 16 + (end - start) // 8192
+    tokens = {b'"%s"' % key.encode() for key in keys}
+    longest = 6 * max(map(len, keys)) + 2  # every character \u-escaped
+    pos = raw.find(b'"', start, end)
+    while pos >= 0:
+        budget -= 1
+        if budget < 0:
+            return True
+        stop = _string_end(raw, pos)
+        if stop - pos <= longest:
+            token = raw[pos:stop]
+            if token in tokens:
+                return True
+            if b"\\" in token:
+                try:
+                    if json.loads(token) in keys:
+                        return True
+                except ValueError:
+                    return True
+        pos = raw.find(b'"', stop, end)
+    return False
+
+
+def _scan_forward(raw: bytes, members: dict) -> tuple[int, bool]:
+    """Read top-level members from the front until a nested value.
+
+    Returns where that value starts and whether the object ended first.
+    """
+    pos = _skip_ws(raw, 0)
+    if raw[pos : pos + 1] != b"{":
+        raise _Unscannable
+    pos = _skip_ws(raw, pos + 1)
+    if raw[pos : pos + 1] == b"}":
+        return pos, True
+    while True:
+        if raw[pos : pos + 1] != b'"':
+            raise _Unscannable
+        key_end = _string_end(raw, pos)
+        key = _key(raw, pos, key_end)
+        pos = _skip_ws(raw, key_end)
+        if raw[pos : pos + 1] != b":":
+            raise _Unscannable
+        start = _skip_ws(raw, pos + 1)
+        first = raw[start : start + 1]
+        if first in (b"{", b"["):
+            if key in SCANNED_KEYS:
+                raise _Unscannable
+            return start, False
+        if first == b'"':
+            end = _string_end(raw, start)
+        else:
+            match = _SCALAR.match(raw, start)
+            if match is None:
+                raise _Unscannable
+            end = match.end()
+        members[key] = (start, end)  # later duplicates win, as in json.loads
+        pos = _skip_ws(raw, end)
+        separator = raw[pos : pos + 1]
+        if separator == b"}":
+            return pos, True
+        if separator != b",":
+            raise _Unscannable
+        pos = _skip_ws(raw, pos + 1)
+
+
+def _scan_backward(raw: bytes, members: dict) -> int:
+    """Read top-level members from the back until a nested value; returns its end."""
+    pos = _skip_ws_back(raw, len(raw))
+    if raw[pos - 1 : pos] != b"}":
+        raise _Unscannable
+    pos -= 1
+    while True:
+        end = _skip_ws_back(raw, pos)
+        last = raw[end - 1 : end]
+        if last in (b"}", b"]"):
+            return end
+        if last == b'"':
+            start = _string_start(raw, end)
+        else:
+            start = end
+            while start > 0 and raw[start - 1] in _SCALAR_BYTES:
+                start -= 1
+            if start == end:
+                raise _Unscannable
+        pos = _skip_ws_back(raw, start)
+        if raw[pos - 1 : pos] != b":":
+            raise _Unscannable
+        key_end = _skip_ws_back(raw, pos - 1)
+        if raw[key_end - 1 : key_end] != b'"':
+            raise _Unscannable
+        key_start = _string_start(raw, key_end)
+        members.setdefault(_key(raw, key_start, key_end), (start, end))
+        pos = _skip_ws_back(raw, key_start)
+        if raw[pos - 1 : pos] != b",":
+            raise _Unscannable  # the forward scan would have reached "{"
+        pos -= 1
+
+
+def scan_members(raw: bytes) -> dict[str, tuple[int, int]]:
+    """Byte spans of the top-level ``SCANNED_KEYS`` in a JSON object.
+
+    Walks the top-level members from both ends, jumping over string values
+    with ``bytes.find``; nested values (usually ``messages``) are never
+    decoded or walked. Raises ``_Unscannable`` when only a full parse can
+    tell, e.g. a scanned key sits between two nested values.
+    """
+    front: dict[str, tuple[int, int]] = {}
+    middle_start, done = _scan_forward(raw, front)
+    if done:
+        return {k: front[k] for k in SCANNED_KEYS if k in front}
+
+    back: dict[str, tuple[int, int]] = {}
+    middle_end = _scan_backward(raw, back)
+    if _may_hold_keys(raw, SCANNED_KEYS, middle_start, middle_end):
+        raise _Unscannable
+    spans = {}
+    for key in SCANNED_KEYS:
+        if key in back or key in front:
+            spans[key] = back.get(key) or front[key]
+    return spans
+
+
+class ParsedBody:
+    """A JSON request body, decoded only as far as each stage needs.
+
+    ``model`` and ``stream`` come from a scan of the top-level members; the
+    full ``payload`` is parsed at most once, the first time a stage needs
+    the whole object. Kept on ``request.state.parsed_body`` so later stages
+    never parse the body again.
+    """
+
+    def __init__(self, raw: bytes, values: dict[str, Any], payload=_NOT_PARSED):
+        self.raw = raw
+        self._values = values
+        self._payload = payload
+
+    @classmethod
+    def scan(cls, raw: bytes) -> Optional["ParsedBody"]:
+        """None when the body is not a JSON object (forwarded opaquely)."""
+        if len(raw) >= SCAN_MIN_BYTES:
+            try:
+                spans = scan_members(raw)
+                values = {k: _value(raw[s:e]) for k, (s, e) in spans.items()}
+                return cls(raw, values)
+            except (_Unscannable, ValueError):
+                pass
+        parsed = cls(raw, {})
+        payload = parsed.payload
+        if payload is None:
+            return None
+        parsed._values = {k: payload[k] for k in SCANNED_KEYS if k in payload}
+        return parsed
+
+    @classmethod
+    def from_payload(cls, payload: dict, **dumps) -> "ParsedBody":
+        raw = json.dumps(payload, **dumps).encode()
+        return cls(raw, {k: payload[k] for k in SCANNED_KEYS if k in payload}, payload)
+
+    @property
+    def model(self) -> Any:
+        return self._values.get("model")
+
+    @property
+    def stream(self) -> bool:
+        return bool(self._values.get("stream", False))
+
+    @property
+    def payload(self) -> Optional[dict]:
+        """The whole body as a dict (parsed on first use), None if it is not one."""
+        if self._payload is _NOT_PARSED:
+            try:
+                payload = json.loads(self.raw)
+            except ValueError:
+                payload = None
+            self._payload = payload if isinstance(payload, dict) else None
+        return self._payload
+
+    def has_member(self, key: str) -> bool:
+        if key in self._values:
+            return True
+        if self._payload is _NOT_PARSED and not _may_hold_keys(
+            self.raw, (key,), 0, len(self.raw)
+        ):
+            return False
+        return key in (self.payload or {})
+
+    def with_member(self, key: str, value: Any) -> "ParsedBody":
+        """A copy with ``key`` added up front, without re-encoding the rest."""
+        pos = _skip_ws(self.raw, 0) + 1
+        first = _skip_ws(self.raw, pos)
+        empty = self.raw[first : first + 1] == b"}"
+        member = json.dumps({key: value}, separators=(",", ":")).encode()[1:-1]
+        raw = self.raw[:pos] + member + (b"" if empty else b",") + self.raw[pos:]
+        values = {**self._values}
+        if key in SCANNED_KEYS:
+            values[key] = value
+        payload = self._payload
+        if payload is not _NOT_PARSED and payload is not None:
+            payload = {key: value, **payload}
+        return ParsedBody(raw, values, payload)
@@ -0,0 +1,9 @@
+from .router import ModelRouter, TargetStats
+
+MODEL_ROUTER = ModelRouter()
+
+__all__ = [
+    "ModelRouter",
+    "TargetStats",
+    "MODEL_ROUTER",
+]
@@ -0,0 +1,99 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.config import ModelAliasConfigModel
+
+EWMA_ALPHA = 0.2  # weight of the newest sample in the latency / error EWMAs
+# A target failing every request scores as this many times slower, plus one
+ERROR_PENALTY = 10.0
+# Latency assumed for a target that has only failed, when no target of the
+# alias has answered yet either
+FAILED_LATENCY_MS = 1000.0
+
+
+@dataclass
+class TargetStats:
+    latency_ms: Optional[float] = None
+    error_rate: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    last_tried: float = 0.0  # monotonic
+
+    def score(self, fallback_ms: float) -> float:
+        """Penalized latency; ``fallback_ms`` stands in if it never answered."""
+        latency = self.latency_ms if self.latency_ms is not None else fallback_ms
+        return latency * (1 + ERROR_PENALTY * self.error_rate)
+
+    def stats(self) -> dict:
+        return {
+            "latency_ms": (
+                round(self.latency_ms, 1) if self.latency_ms is not None else None
+            ),
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class ModelRouter:
+    """Orders a model alias's targets by live latency and error rate.
+
+    Stats are kept per (provider, model) and shared by every alias that
+    uses the target. Targets never tried, or not tried for
+    ``probe_interval`` seconds, go first once so their stats stay current;
+    ties keep the configured order. A target that has only failed is
+    scored as the slowest target of the alias, plus its error penalty.
+    """
+
+    def __init__(self):
+        self.targets: dict[tuple[str, str], TargetStats] = {}
+
+    def rank(self, alias: ModelAliasConfigModel) -> list[tuple[str, str]]:
+        now = time.monotonic()
+        targets = alias.parsed_targets
+        latencies = [
+            stats.latency_ms
+            for stats in map(self.targets.get, targets)
+            if stats is not None and stats.latency_ms is not None
+        ]
+        fallback_ms = max(latencies, default=FAILED_LATENCY_MS)
+
+        def key(item):
+            position, target = item
+            stats = self.targets.get(target)
+            if stats is None or stats.requests == 0:
+                return (0, 0.0, position)
+            if now - stats.last_tried > alias.probe_interval:
+                return (0, 0.0, position)
+            return (1, stats.score(fallback_ms), position)
+
+        ranked = [t for _, t in sorted(enumerate(targets), key=key)]
+        # Only one request at a time refreshes a stale target.
+        self._stats_for(ranked[0]).last_tried = now
+        return ranked
+
+    def observe(self, provider: str, model: str, latency_ms: float, ok: bool):
+        stats = self._stats_for((provider, model))
+        stats.requests += 1
+        stats.last_tried = time.monotonic()
+        stats.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - stats.error_rate)
+        if not ok:
+            stats.errors += 1
+            return
+        if stats.latency_ms is None:
+            stats.latency_ms = latency_ms
+        else:
+            stats.latency_ms += EWMA_ALPHA * (latency_ms - stats.latency_ms)
+
+    def stats(self) -> dict:
+        return {
+            f"{provider}:{model}": stats.stats()
+            for (provider, model), stats in self.targets.items()
+        }
+
+    def _stats_for(self, target: tuple[str, str]) -> TargetStats:
+        stats = self.targets.get(target)
+        if stats is None:
+            stats = self.targets[target] = TargetStats()
+        return stats
@@ -0,0 +1,13 @@
+from .adaptive import AIMDLimiter, parse_retry_after
+from .fair_queue import AdmissionTicket, FairQueueScheduler, ProviderQueue
+
+SCHEDULER = FairQueueScheduler()
+
+__all__ = [
+    "AIMDLimiter",
+    "parse_retry_after",
+    "AdmissionTicket",
+    "FairQueueScheduler",
+    "ProviderQueue",
+    "SCHEDULER",
+]
@@ -0,0 +1,93 @@
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from backend.config import AdaptiveConcurrencyConfigModel
+
+SHORT_ALPHA = 0.3  # recent latency
+LONG_ALPHA = 0.02  # baseline latency
+MIN_DECREASE_INTERVAL = 0.1  # seconds
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds from ``retry-after-ms`` or ``Retry-After`` (seconds or HTTP date)."""
+    raw = headers.get("retry-after-ms")
+    if raw:
+        try:
+            return max(0.0, float(raw) / 1000)
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease in-flight limit.
+
+    Every healthy response adds 1/limit (about +1 per round trip of full
+    concurrency). A 429/503, a timeout, or recent latency rising above
+    ``latency_tolerance`` times the long-run baseline multiplies the limit
+    by ``backoff_ratio``, at most once per round trip.
+    """
+
+    def __init__(self, cfg: AdaptiveConcurrencyConfigModel, ceiling: Optional[int]):
+        self.cfg = cfg
+        self.ceiling = ceiling
+        self.limit = float(min(cfg.initial_limit, self.max_limit))
+        self.short_latency_ms: Optional[float] = None
+        self.long_latency_ms: Optional[float] = None
+        self._last_decrease = 0.0
+        self.decreases = 0
+
+    @property
+    def max_limit(self) -> int:
+        if self.ceiling is None:
+            return self.cfg.max_limit
+        return min(self.cfg.max_limit, self.ceiling)
+
+    @property
+    def current(self) -> int:
+        return max(self.cfg.min_limit, int(self.limit))
+
+    def on_success(self, latency_ms: float):
+        if self.short_latency_ms is None:
+            self.short_latency_ms = self.long_latency_ms = latency_ms
+        else:
+            self.short_latency_ms += SHORT_ALPHA * (latency_ms - self.short_latency_ms)
+            self.long_latency_ms += LONG_ALPHA * (latency_ms - self.long_latency_ms)
+
+        if self.short_latency_ms > self.cfg.latency_tolerance * self.long_latency_ms:
+            self.on_overload()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_overload(self):
+        now = time.monotonic()
+        # One cut per round trip: the rest of that window saw the same overload.
+        interval = max(MIN_DECREASE_INTERVAL, (self.short_latency_ms or 0) / 1000)
+        if now - self._last_decrease < interval:
+            return
+        self._last_decrease = now
+        self.limit = max(self.cfg.min_limit, self.limit * self.cfg.backoff_ratio)
+        self.decreases += 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.current,
+            "max_limit": self.max_limit,
+            "decreases": self.decreases,
+            "latency_ms": (
+                round(self.short_latency_ms, 1)
+                if self.short_latency_ms is not None
+                else None
+            ),
+        }
@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Mapping, Optional, Union
+
+from fastapi import HTTPException
+
+from backend.config import ProviderConfigModel
+
+from .adaptive import AIMDLimiter, parse_retry_after
+
+PRIORITY_RANK = {"interactive": 0, "batch": 1}
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    owner: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+@dataclass
+class AdmissionTicket:
+    provider: str
+    wait_ms: float = 0.0
+
+
+class ProviderQueue:
+    """Concurrency cap for one provider, with a weighted fair queue behind it.
+
+    Uses start-time fair queuing: each owner's requests get virtual finish
+    tags spaced by cost/share, so under contention owners are served in
+    proportion to their share regardless of how many (or how large)
+    requests they send.
+    Interactive requests always go ahead of batch ones.
+
+    With adaptive concurrency the limit follows an AIMD controller instead
+    of staying at ``max_concurrency``, and an upstream Retry-After holds
+    the queue briefly.
+    """
+
+    def __init__(self, limit: Optional[int], max_wait: float):
+        self.limit = limit
+        self.ceiling = limit
+        self.max_wait = max_wait
+        self.adaptive: Optional[AIMDLimiter] = None
+        self.max_hold = 0.0
+        self.held_until = 0.0
+        self.active = 0
+        self.virtual_time = 0.0
+        self._heap: list[_Waiter] = []
+        self._last_finish: dict[str, float] = {}
+        self._queued = {name: 0 for name in PRIORITY_RANK}
+        self.admitted = 0
+        self.timed_out = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def configure(self, cfg: Optional[ProviderConfigModel]):
+        if cfg is None:
+            # Provider removed: let anything still queued through.
+            self.ceiling = None
+            self.adaptive = None
+        else:
+            self.ceiling = cfg.max_concurrency
+            self.max_wait = cfg.max_queue_wait
+            adaptive_cfg = cfg.adaptive_concurrency
+            self.max_hold = adaptive_cfg.max_hold_seconds
+            if not adaptive_cfg.enabled:
+                self.adaptive = None
+            elif self.adaptive is None or self.adaptive.cfg != adaptive_cfg:
+                self.adaptive = AIMDLimiter(adaptive_cfg, self.ceiling)
+            else:
+                self.adaptive.ceiling = self.ceiling
+        self.apply_limit()
+
+    def apply_limit(self):
+        self.limit = self.adaptive.current if self.adaptive else self.ceiling
+        self.dispatch()
+
+    def hold(self, seconds: float):
+        delay = min(seconds, self.max_hold)
+        until = time.monotonic() + delay
+        if until <= self.held_until:
+            return
+        self.held_until = until
+        asyncio.get_running_loop().call_later(delay, self._resume, until)
+
+    def _resume(self, until: float):
+        if self.held_until == until:
+            self.held_until = 0.0
+        self.dispatch()
+
+    def has_room(self) -> bool:
+        if self.held_until > time.monotonic():
+            return False
+        return self.limit is None or self.active < self.limit
+
+    @property
+    def waiting(self) -> int:
+        return sum(self._queued.values())
+
+    def enqueue(
+        self, owner: str, priority: str, share: float, seq: int, cost: float = 1.0
+    ) -> _Waiter:
+        start = max(self.virtual_time, self._last_finish.get(owner, 0.0))
+        finish = start + cost / share
+        self._last_finish[owner] = finish
+        waiter = _Waiter(
+            rank=PRIORITY_RANK[priority],
+            finish=finish,
+            seq=seq,
+            start=start,
+            owner=owner,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._heap, waiter)
+        self._queued[priority] += 1
+        return waiter
+
+    def dispatch(self):
+        while self._heap and self.has_room():
+            waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue
+            self._dequeued(waiter)
+            self.virtual_time = waiter.start
+            self.active += 1
+            waiter.future.set_result(None)
+        if not self._heap:
+            # Idle: old finish tags no longer matter.
+            self._last_finish.clear()
+
+    def abandon(self, waiter: _Waiter):
+        waiter.cancelled = True
+        self._dequeued(waiter)
+
+    def _dequeued(self, waiter: _Waiter):
+        priority = "interactive" if waiter.rank == 0 else "batch"
+        self._queued[priority] -= 1
+
+    def record_wait(self, wait_ms: float):
+        self.admitted += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "adaptive": self.adaptive.stats() if self.adaptive else None,
+            "held": self.held_until > time.monotonic(),
+            "active": self.active,
+            "queued": dict(self._queued),
+            "admitted": self.admitted,
+            "timed_out": self.timed_out,
+            "wait_ms_mean": (
+                round(self.wait_ms_total / self.admitted, 1) if self.admitted else 0.0
+            ),
+            "wait_ms_max": round(self.wait_ms_max, 1),
+        }
+
+
+class FairQueueScheduler:
+    """Admission control between auth and the upstream call.
+
+    Requests beyond a provider's ``max_concurrency`` wait in that provider's
+    fair queue; a request still queued after ``max_queue_wait`` seconds is
+    rejected with 429.
+    """
+
+    def __init__(self):
+        self.queues: dict[str, ProviderQueue] = {}
+        self._seq = itertools.count()
+
+    def sync(self, providers: dict[str, ProviderConfigModel]):
+        for name, queue in self.queues.items():
+            if name not in providers:
+                queue.configure(None)
+        for name, cfg in providers.items():
+            queue = self.queues.get(name)
+            if queue is None:
+                queue = self.queues[name] = ProviderQueue(
+                    cfg.max_concurrency, cfg.max_queue_wait
+                )
+            queue.configure(cfg)
+
+    async def acquire(
+        self,
+        provider: str,
+        owner: str,
+        priority: str = "interactive",
+        share: float = 1.0,
+        cost: Union[float, Callable[[], float]] = 1.0,
+    ) -> AdmissionTicket:
+        """Admit a request, queueing it while the provider is saturated.
+
+        ``cost`` weighs the request in the owner's fair share (the gateway
+        passes its estimated prompt size in thousands of tokens, at least 1).
+        A callable is only evaluated if the request has to queue.
+        """
+        queue = self.queues.get(provider)
+        if queue is None:
+            queue = self.queues[provider] = ProviderQueue(None, 0)
+
+        if queue.has_room() and not queue.waiting:
+            queue.active += 1
+            queue.record_wait(0.0)
+            return AdmissionTicket(provider)
+
+        start = time.monotonic()
+        if callable(cost):
+            cost = cost()
+        waiter = queue.enqueue(owner, priority, share, next(self._seq), cost)
+        queue.dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), queue.max_wait)
+        except BaseException as e:
+            if waiter.future.done():
+                # Admitted just as we gave up; hand the slot on.
+                queue.active -= 1
+                queue.dispatch()
+            else:
+                queue.abandon(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                queue.timed_out += 1
+                raise HTTPException(
+                    429,
+                    "Provider busy, request timed out in queue",
+                    headers={"Retry-After": str(max(1, math.ceil(queue.max_wait)))},
+                )
+            raise
+
+        wait_ms = (time.monotonic() - start) * 1000
+        queue.record_wait(wait_ms)
+        return AdmissionTicket(provider, wait_ms)
+
+    def release(self, ticket: AdmissionTicket):
+        queue = self.queues.get(ticket.provider)
+        if queue is None:
+            return
+        queue.active -= 1
+        queue.dispatch()
+
+    def observe(
+        self,
+        provider: str,
+        status: Optional[int],
+        latency_ms: float,
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        """Feed an upstream outcome back; ``status=None`` means it timed out."""
+        queue = self.queues.get(provider)
+        if queue is None or queue.adaptive is None:
+            return
+        if status in (429, 503):
+            retry_after = parse_retry_after(headers) if headers else None
+            if retry_after:
+                queue.hold(retry_after)
+            queue.adaptive.on_overload()
+        elif status is None:
+            queue.adaptive.on_overload()
+        elif status < 500:
+            queue.adaptive.on_success(latency_ms)
+        queue.apply_limit()
+
+    def stats(self) -> dict:
+        return {name: queue.stats() for name, queue in self.queues.items()}
@@ -0,0 +1,44 @@
+from .transport import (
+    AiohttpTransport,
+    HTTP2Transport,
+    UpstreamConnectError,
+    build_transport,
+)
+from .session_pool import UpstreamPool, UpstreamSessionPool
+from .balancer import EndpointBalancer, EndpointState
+from .hedging import Hedger, UpstreamAttempt, race_hedged
+from .budget import RetryBudget, TokenBudget
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .credentials import Credential, CredentialPool, credential_id
+
+UPSTREAM_POOL = UpstreamSessionPool()
+UPSTREAM_BALANCER = EndpointBalancer(UPSTREAM_POOL)
+UPSTREAM_HEDGER = Hedger()
+UPSTREAM_RETRIES = RetryBudget()
+UPSTREAM_CREDENTIALS = CredentialPool()
+
+__all__ = [
+    "AiohttpTransport",
+    "HTTP2Transport",
+    "UpstreamConnectError",
+    "build_transport",
+    "UpstreamPool",
+    "UpstreamSessionPool",
+    "UPSTREAM_POOL",
+    "EndpointBalancer",
+    "EndpointState",
+    "UPSTREAM_BALANCER",
+    "Hedger",
+    "UpstreamAttempt",
+    "race_hedged",
+    "UPSTREAM_HEDGER",
+    "RetryBudget",
+    "TokenBudget",
+    "UPSTREAM_RETRIES",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "Credential",
+    "CredentialPool",
+    "credential_id",
+    "UPSTREAM_CREDENTIALS",
+]
@@ -0,0 +1,210 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from backend.config import ProviderConfigModel
+
+from .circuit_breaker import HALF_OPEN, CircuitBreaker, CircuitOpenError
+
+EWMA_ALPHA = 0.3
+PROBE_TIMEOUT = 5.0  # seconds
+
+
+@dataclass
+class EndpointState:
+    provider: str
+    url: str
+    weight: float = 1.0
+    in_flight: int = 0
+    ewma_latency_ms: Optional[float] = None
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    down_until: float = 0.0
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+    @property
+    def healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+    def score(self, default_latency_ms: float) -> float:
+        # Least outstanding requests, weighted by EWMA latency and config weight.
+        latency = self.ewma_latency_ms or default_latency_ms
+        return (self.in_flight + 1) * latency / self.weight
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "ewma_latency_ms": (
+                round(self.ewma_latency_ms, 1)
+                if self.ewma_latency_ms is not None
+                else None
+            ),
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit": self.breaker.state,
+        }
+
+
+class EndpointBalancer:
+    """Routes each provider request to one of its weighted endpoints.
+
+    Endpoints are chosen by fewest in-flight requests scaled by an EWMA of
+    their response latency. Repeated failures (passive) or failed health
+    probes (active) take an endpoint out of rotation for a while.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.endpoints: dict[str, list[EndpointState]] = {}
+        self._configs: dict[str, ProviderConfigModel] = {}
+        self._probes: dict[str, asyncio.Task] = {}
+
+    def sync(self, providers: dict[str, ProviderConfigModel]):
+        for name in list(self.endpoints):
+            if name not in providers:
+                del self.endpoints[name]
+                self._configs.pop(name, None)
+                self._stop_probe(name)
+
+        for name, cfg in providers.items():
+            if self._configs.get(name) == cfg:
+                continue  # unchanged: keep its probe running
+            # Keep counters for endpoints that survive the reload.
+            current = {e.url: e for e in self.endpoints.get(name, [])}
+            states = []
+            for endpoint in cfg.upstream_endpoints:
+                url = str(endpoint.url).rstrip("/")
+                state = current.get(url) or EndpointState(name, url)
+                state.weight = endpoint.weight
+                states.append(state)
+            self.endpoints[name] = states
+            self._configs[name] = cfg
+
+            self._stop_probe(name)
+            if cfg.health_check_path:
+                self._probes[name] = asyncio.get_running_loop().create_task(
+                    self._probe_loop(name)
+                )
+
+    def acquire(
+        self, provider: str, exclude: Optional[EndpointState] = None
+    ) -> Optional[EndpointState]:
+        states = self.endpoints.get(provider, [])
+        if not states:
+            return None
+        cfg = self._configs.get(provider)
+        if cfg is not None and cfg.circuit_breaker.enabled:
+            # 🔌 Fail fast instead of queueing behind a failing upstream
+            allowed = [e for e in states if e.breaker.available(cfg.circuit_breaker)]
+            if not allowed:
+                raise CircuitOpenError(min(e.breaker.retry_after() for e in states))
+            states = allowed
+        # Prefer a different endpoint (e.g. for a hedge or retry) when there is one.
+        states = [e for e in states if e is not exclude] or states
+
+        candidates = [e for e in states if e.healthy] or states
+        known = [e.ewma_latency_ms for e in candidates if e.ewma_latency_ms]
+        default_latency = sum(known) / len(known) if known else 1.0
+        endpoint = min(candidates, key=lambda e: e.score(default_latency))
+        endpoint.in_flight += 1
+        endpoint.requests += 1
+        endpoint.breaker.on_acquire()
+        return endpoint
+
+    def observe(
+        self,
+        endpoint: EndpointState,
+        latency_ms: float,
+        ok: bool,
+        settled: bool = True,
+    ):
+        """Feed one upstream outcome (latency to response headers) back in.
+
+        With ``settled=False`` a good answer reaches the circuit breaker only
+        through ``settle()``, once its body has been read.
+        """
+        cfg = self._configs.get(endpoint.provider)
+        if cfg is not None and (settled or not ok):
+            endpoint.breaker.record(ok, cfg.circuit_breaker)
+        if ok:
+            endpoint.consecutive_failures = 0
+            if endpoint.ewma_latency_ms is None:
+                endpoint.ewma_latency_ms = latency_ms
+            else:
+                endpoint.ewma_latency_ms += EWMA_ALPHA * (
+                    latency_ms - endpoint.ewma_latency_ms
+                )
+            return
+        self._fail(endpoint, cfg)
+
+    def settle(self, endpoint: EndpointState, ok: bool):
+        """Outcome of an answer observed with ``settled=False``: False if its
+        body timed out after the headers arrived."""
+        cfg = self._configs.get(endpoint.provider)
+        if cfg is not None:
+            endpoint.breaker.record(ok, cfg.circuit_breaker)
+        if not ok:
+            self._fail(endpoint, cfg)
+
+    def _fail(self, endpoint: EndpointState, cfg: Optional[ProviderConfigModel]):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if cfg and endpoint.consecutive_failures >= cfg.unhealthy_threshold:
+            endpoint.down_until = time.monotonic() + cfg.unhealthy_cooldown
+
+    def release(self, endpoint: EndpointState):
+        endpoint.in_flight -= 1
+        if endpoint.breaker.state == HALF_OPEN:
+            # A trial that ended without an outcome must not block the next one.
+            endpoint.breaker.probing = False
+
+    def stats(self) -> dict:
+        return {
+            name: [e.stats() for e in states] for name, states in self.endpoints.items()
+        }
+
+    async def close(self):
+        for name in list(self._probes):
+            self._stop_probe(name)
+
+    def _stop_probe(self, name: str):
+        task = self._probes.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    async def _probe_loop(self, name: str):
+        while True:
+            cfg = self._configs[name]
+            await asyncio.gather(
+                *(self._probe(e, cfg) for e in self.endpoints.get(name, []))
+            )
+            await asyncio.sleep(cfg.health_check_interval)
+
+    async def _probe(self, endpoint: EndpointState, cfg: ProviderConfigModel):
+        pool = self.pool.acquire(endpoint.provider)
+        try:
+            resp = await pool.transport.request(
+                "GET",
+                endpoint.url + cfg.health_check_path,
+                headers={"Authorization": f"Bearer {cfg.credentials[0]}"},
+                timeout=PROBE_TIMEOUT,
+            )
+            await resp.read()
+            resp.release()
+            ok = resp.status < 500
+        except Exception:
+            ok = False
+        finally:
+            self.pool.release(pool)
+
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.down_until = 0.0
+        else:
+            # Stay out of rotation until a later probe succeeds.
+            endpoint.down_until = time.monotonic() + 2 * cfg.health_check_interval
@@ -0,0 +1,41 @@
+MAX_BUDGET_TOKENS = 10.0
+
+
+class TokenBudget:
+    """Token bucket: each request earns ``ratio`` tokens, each extra attempt costs one."""
+
+    def __init__(self, max_tokens: float = MAX_BUDGET_TOKENS):
+        self.max_tokens = max_tokens
+        self.tokens = 0.0
+
+    def earn(self, ratio: float):
+        self.tokens = min(self.max_tokens, self.tokens + ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class RetryBudget:
+    """Per-provider retry allowance, so retries stay a small share of traffic."""
+
+    def __init__(self):
+        self._budgets: dict[str, TokenBudget] = {}
+        self.retries = 0
+        self.denied = 0
+
+    def earn(self, provider: str, ratio: float):
+        self._budgets.setdefault(provider, TokenBudget()).earn(ratio)
+
+    def try_retry(self, provider: str) -> bool:
+        budget = self._budgets.get(provider)
+        if budget is None or not budget.try_spend():
+            self.denied += 1
+            return False
+        self.retries += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"retries": self.retries, "denied": self.denied}
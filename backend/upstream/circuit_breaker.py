@@ -0,0 +1,96 @@
+import math
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+from backend.config import CircuitBreakerConfigModel
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BUCKET_SECONDS = 1.0
+
+
+class CircuitOpenError(HTTPException):
+    """Every endpoint of a provider is failing fast."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail="Upstream temporarily unavailable",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling error and timeout rate.
+
+    Outcomes are counted in one-second buckets. Once the window holds
+    ``min_requests`` outcomes and the failure share reaches ``failure_rate``
+    the circuit opens; after ``open_seconds`` a single trial request is let
+    through and its outcome closes or re-opens it.
+    """
+
+    def __init__(self):
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+        # [bucket_start, requests, failures]
+        self._buckets: deque[list] = deque()
+
+    def available(self, cfg: CircuitBreakerConfigModel) -> bool:
+        if not cfg.enabled:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == HALF_OPEN:
+            return not self.probing
+        return True
+
+    def on_acquire(self):
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def retry_after(self) -> float:
+        return max(0.0, self.open_until - time.monotonic())
+
+    def record(self, ok: bool, cfg: CircuitBreakerConfigModel):
+        if not cfg.enabled:
+            return
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self.probing = False
+            if ok:
+                self.state = CLOSED
+                self._buckets.clear()
+            else:
+                self._open(now, cfg)
+            return
+        if self.state == OPEN:
+            return  # late answers from before the circuit opened
+
+        bucket_start = now - now % BUCKET_SECONDS
+        if not self._buckets or self._buckets[-1][0] != bucket_start:
+            self._buckets.append([bucket_start, 0, 0])
+        self._buckets[-1][1] += 1
+        if not ok:
+            self._buckets[-1][2] += 1
+        while self._buckets and self._buckets[0][0] <= now - cfg.window_seconds:
+            self._buckets.popleft()
+
+        requests = sum(b[1] for b in self._buckets)
+        failures = sum(b[2] for b in self._buckets)
+        if requests >= cfg.min_requests and failures / requests >= cfg.failure_rate:
+            self._open(now, cfg)
+
+    def _open(self, now: float, cfg: CircuitBreakerConfigModel):
+        self.state = OPEN
+        self.open_until = now + cfg.open_seconds
+        self.opened += 1
+        self._buckets.clear()
@@ -0,0 +1,180 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Mapping, Optional
+
+from backend.config import ProviderConfigModel
+from backend.config.key_hashing import key_id as credential_id
+from backend.scheduler import parse_retry_after
+
+HEADROOM_TTL = 60.0  # seconds a headroom reading is trusted without a reset time
+
+# (remaining, limit, reset) header names, OpenAI then Anthropic style
+HEADROOM_HEADERS = (
+    (
+        "x-ratelimit-remaining-requests",
+        "x-ratelimit-limit-requests",
+        "x-ratelimit-reset-requests",
+    ),
+    (
+        "x-ratelimit-remaining-tokens",
+        "x-ratelimit-limit-tokens",
+        "x-ratelimit-reset-tokens",
+    ),
+    (
+        "anthropic-ratelimit-requests-remaining",
+        "anthropic-ratelimit-requests-limit",
+        "anthropic-ratelimit-requests-reset",
+    ),
+    (
+        "anthropic-ratelimit-tokens-remaining",
+        "anthropic-ratelimit-tokens-limit",
+        "anthropic-ratelimit-tokens-reset",
+    ),
+)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset(raw: Optional[str]) -> Optional[float]:
+    """Seconds until a rate-limit reset: "6m0s"/"20ms" durations or ISO times."""
+    if not raw:
+        return None
+    parts = _DURATION_PART.findall(raw)
+    if parts and "".join(n + u for n, u in parts) == raw:
+        return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    try:
+        reset_at = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, reset_at.timestamp() - time.time())
+
+
+@dataclass
+class Credential:
+    provider: str
+    api_key: str
+    key_id: str
+    in_flight: int = 0
+    last_used: float = 0.0
+    # Fraction of the upstream limit left, from the last response headers
+    headroom: Optional[float] = None
+    remaining: Optional[int] = None
+    headroom_until: float = 0.0
+    cooldown_until: float = 0.0
+    requests: int = 0
+    rate_limited: int = 0
+
+    @property
+    def cooling(self) -> bool:
+        return self.cooldown_until > time.monotonic()
+
+    def effective_headroom(self, now: float) -> float:
+        if self.headroom is None or now >= self.headroom_until:
+            return 1.0  # unknown or stale: assume the window has reset
+        if self.remaining is not None and self.remaining <= self.in_flight:
+            return 0.0
+        return self.headroom
+
+    def stats(self) -> dict:
+        return {
+            "id": self.key_id,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "cooling": self.cooling,
+            "headroom": (
+                round(self.headroom, 3) if self.headroom is not None else None
+            ),
+        }
+
+
+class CredentialPool:
+    """Rotates each provider's API keys.
+
+    Picks the key with the most rate-limit headroom reported by the
+    provider's ``x-ratelimit-*`` headers, falling back to the least
+    recently used one. A key answered with 429 rests until its
+    Retry-After (or ``credential_cooldown``) has passed.
+    """
+
+    def __init__(self):
+        self.credentials: dict[str, list[Credential]] = {}
+        self._cooldowns: dict[str, float] = {}
+
+    def sync(self, providers: dict[str, ProviderConfigModel]):
+        for name in list(self.credentials):
+            if name not in providers:
+                del self.credentials[name]
+                self._cooldowns.pop(name, None)
+
+        for name, cfg in providers.items():
+            # Keep counters and cooldowns for keys that survive the reload.
+            current = {c.api_key: c for c in self.credentials.get(name, [])}
+            self.credentials[name] = [
+                current.get(key) or Credential(name, key, credential_id(key))
+                for key in cfg.credentials
+            ]
+            self._cooldowns[name] = cfg.credential_cooldown
+
+    def acquire(self, provider: str) -> Optional[Credential]:
+        credentials = self.credentials.get(provider)
+        if not credentials:
+            return None
+        now = time.monotonic()
+        ready = [c for c in credentials if c.cooldown_until <= now]
+        if ready:
+            credential = min(
+                ready,
+                key=lambda c: (-c.effective_headroom(now), c.in_flight, c.last_used),
+            )
+        else:
+            credential = min(credentials, key=lambda c: c.cooldown_until)
+        credential.in_flight += 1
+        credential.requests += 1
+        credential.last_used = now
+        return credential
+
+    def observe(self, credential: Credential, status: int, headers: Mapping[str, str]):
+        now = time.monotonic()
+        if status == 429:
+            credential.rate_limited += 1
+            cooldown = parse_retry_after(headers)
+            if cooldown is None:
+                cooldown = self._cooldowns.get(credential.provider, HEADROOM_TTL)
+            credential.cooldown_until = now + cooldown
+            credential.headroom = 0.0
+            credential.headroom_until = credential.cooldown_until
+            return
+
+        fractions = []
+        remaining = None
+        resets = []
+        for remaining_name, limit_name, reset_name in HEADROOM_HEADERS:
+            try:
+                left = int(headers[remaining_name])
+                limit = int(headers[limit_name])
+            except (KeyError, ValueError):
+                continue
+            if limit > 0:
+                fractions.append(left / limit)
+            if "request" in remaining_name:
+                remaining = left
+            reset = parse_reset(headers.get(reset_name))
+            if reset is not None:
+                resets.append(reset)
+        if fractions:
+            credential.headroom = min(fractions)
+            credential.remaining = remaining
+            credential.headroom_until = now + (max(resets) if resets else HEADROOM_TTL)
+
+    def release(self, credential: Credential):
+        credential.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            name: [c.stats() for c in credentials]
+            for name, credentials in self.credentials.items()
+        }
@@ -0,0 +1,132 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Optional
+
+from backend.config import HedgeConfigModel
+
+from .budget import TokenBudget
+
+LATENCY_WINDOW = 200  # recent samples kept per provider
+
+
+@dataclass
+class UpstreamAttempt:
+    resp: Any
+    endpoint: Any = None
+    credential: Any = None
+    headers_at: float = 0.0
+    # For streams the first chunk is read before the attempt counts as answered
+    first_chunk: Optional[bytes] = None
+    first_chunk_at: float = 0.0
+    chunks: Any = None
+
+
+class LatencyWindow:
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def add(self, latency_ms: float):
+        self.samples.append(latency_ms)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+
+class Hedger:
+    """Tracks recent time-to-answer per provider and decides when to hedge."""
+
+    def __init__(self):
+        self._windows: dict[tuple[str, bool], LatencyWindow] = {}
+        self._budgets: dict[str, TokenBudget] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay_for(
+        self, provider: str, is_stream: bool, cfg: HedgeConfigModel
+    ) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off."""
+        if not cfg.enabled:
+            return None
+        self._budgets.setdefault(provider, TokenBudget()).earn(cfg.budget_ratio)
+
+        window = self._windows.get((provider, is_stream))
+        if window is None or len(window.samples) < cfg.min_samples:
+            return None
+        delay_ms = window.percentile(cfg.percentile)
+        return min(max(delay_ms, cfg.min_delay_ms), cfg.max_delay_ms) / 1000
+
+    def record(self, provider: str, is_stream: bool, latency_ms: float):
+        key = (provider, is_stream)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = LatencyWindow()
+        window.add(latency_ms)
+
+    def try_hedge(self, provider: str) -> bool:
+        budget = self._budgets.get(provider)
+        if budget is None or not budget.try_spend():
+            return False
+        self.hedges += 1
+        return True
+
+    def record_winner(self, index: int):
+        if index > 0:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        return {"hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+
+async def race_hedged(start_attempt, discard, delay: Optional[float], allow_hedge):
+    """Run attempt 0; after ``delay`` seconds without an answer start attempt 1.
+
+    Returns ``(result, winner_index, hedged)``. The slower attempt is
+    cancelled, or passed to ``discard`` if it had already answered.
+    """
+    if delay is None:
+        return await start_attempt(0), 0, False
+
+    first = asyncio.ensure_future(start_attempt(0))
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except BaseException:
+        first.cancel()
+        raise
+    if done or not allow_hedge():
+        return await first, 0, False
+
+    second = asyncio.ensure_future(start_attempt(1))
+    attempts = [first, second]
+    pending = set(attempts)
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            winners = [t for t in done if t.exception() is None]
+            if not winners:
+                error = next(iter(done)).exception()
+                continue
+            winner = winners[0]
+            for task in winners[1:]:
+                discard(task.result())
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(partial(_discard_late, discard))
+            return winner.result(), attempts.index(winner), True
+    except BaseException:
+        for task in attempts:
+            task.cancel()
+        raise
+    raise error
+
+
+def _discard_late(discard, task: asyncio.Future):
+    # A loser may still finish before its cancellation lands.
+    if not task.cancelled() and task.exception() is None:
+        discard(task.result())
@@ -0,0 +1,129 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from backend.config import ProviderConfigModel
+
+from .transport import AiohttpTransport, HTTP2Transport, build_transport
+
+WARMUP_TIMEOUT = 5.0  # seconds
+
+
+@dataclass
+class UpstreamPool:
+    provider: str
+    # aiohttp session or HTTP/2 connections, per the provider's transport
+    transport: Union[AiohttpTransport, HTTP2Transport]
+    fingerprint: Optional[tuple]
+    active: int = 0
+    retired: bool = False
+
+
+def pool_fingerprint(cfg: ProviderConfigModel) -> tuple:
+    # Only settings that affect the connector force a rebuild.
+    return (
+        cfg.transport,
+        tuple(str(e.url) for e in cfg.upstream_endpoints),
+        cfg.max_connections,
+        cfg.max_connections_per_host,
+        cfg.keepalive_timeout,
+        cfg.dns_cache_ttl,
+        cfg.connect_timeout,
+        cfg.read_timeout,
+    )
+
+
+class UpstreamSessionPool:
+    """Long-lived upstream sessions, one per provider.
+
+    Pools are leased per request; a pool replaced by a config reload is
+    retired and only closed once its last in-flight request releases it.
+    """
+
+    def __init__(self):
+        self.pools: dict[str, UpstreamPool] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    async def sync(self, providers: dict[str, ProviderConfigModel]) -> list[str]:
+        """Rebuild pools whose connection settings changed; return their names."""
+        for name in list(self.pools):
+            if name not in providers:
+                self._retire(self.pools.pop(name))
+
+        rebuilt = []
+        for name, cfg in providers.items():
+            fingerprint = pool_fingerprint(cfg)
+            current = self.pools.get(name)
+            if current is not None and current.fingerprint == fingerprint:
+                continue
+            if current is not None:
+                self._retire(current)
+            self.pools[name] = UpstreamPool(name, build_transport(cfg), fingerprint)
+            rebuilt.append(name)
+
+        await asyncio.gather(
+            *(self._warm(self.pools[name], providers[name]) for name in rebuilt)
+        )
+        return rebuilt
+
+    def acquire(self, provider: str) -> UpstreamPool:
+        pool = self.pools.get(provider)
+        if pool is None:
+            # Not synced yet; the next sync() replaces it with a tuned pool.
+            pool = UpstreamPool(provider, build_transport(None), None)
+            self.pools[provider] = pool
+        pool.active += 1
+        return pool
+
+    def release(self, pool: UpstreamPool):
+        pool.active -= 1
+        if pool.retired and pool.active <= 0:
+            self._close_later(pool)
+
+    def stats(self) -> dict:
+        return {
+            name: {"active": pool.active, "tuned": pool.fingerprint is not None}
+            for name, pool in self.pools.items()
+        }
+
+    async def close(self):
+        pools = list(self.pools.values())
+        self.pools.clear()
+        await asyncio.gather(*(pool.transport.close() for pool in pools))
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def _retire(self, pool: UpstreamPool):
+        pool.retired = True
+        if pool.active <= 0:
+            self._close_later(pool)
+
+    def _close_later(self, pool: UpstreamPool):
+        if pool.transport.closed:
+            return
+        task = asyncio.get_running_loop().create_task(pool.transport.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _warm(self, pool: UpstreamPool, cfg: ProviderConfigModel):
+        if cfg.warm_connections <= 0:
+            return
+
+        async def open_one(url: str):
+            try:
+                resp = await pool.transport.request(
+                    "HEAD", url, timeout=WARMUP_TIMEOUT
+                )
+                await resp.read()
+                resp.release()
+            except Exception as e:
+                # Warming is best-effort; real requests will reconnect.
+                print(f"[upstream] Warmup for '{pool.provider}' failed:", e)
+
+        await asyncio.gather(
+            *(
+                open_one(str(endpoint.url))
+                for endpoint in cfg.upstream_endpoints
+                for _ in range(cfg.warm_connections)
+            )
+        )
@@ -0,0 +1,205 @@
+import asyncio
+from typing import Any, Optional
+
+import aiohttp
+
+from backend.config import ProviderConfigModel
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0
+
+
+class UpstreamConnectError(aiohttp.ClientConnectionError):
+    """The connection could not be opened; nothing was sent upstream."""
+
+
+class AiohttpTransport:
+    """HTTP/1.1 upstream transport: one pooled aiohttp session per provider."""
+
+    name = "aiohttp"
+
+    def __init__(self, cfg: Optional[ProviderConfigModel]):
+        if cfg is None:
+            connector = aiohttp.TCPConnector(ttl_dns_cache=300)
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=DEFAULT_CONNECT_TIMEOUT,
+                sock_read=DEFAULT_READ_TIMEOUT,
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=cfg.max_connections,
+                limit_per_host=cfg.max_connections_per_host,
+                keepalive_timeout=cfg.keepalive_timeout,
+                use_dns_cache=cfg.dns_cache_ttl > 0,
+                ttl_dns_cache=cfg.dns_cache_ttl or None,
+            )
+            # No total limit: long streams are fine as long as data keeps coming.
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=cfg.connect_timeout,
+                sock_read=cfg.read_timeout,
+            )
+
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            auto_decompress=False,
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self.session.closed
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers=None,
+        params=None,
+        data=None,
+        timeout: Optional[float] = None,
+    ):
+        """Awaitable for the response (status + headers, body not yet read)."""
+        extra = {}
+        if timeout is not None:
+            extra["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        return self.session.request(
+            method, url, headers=headers, params=params, data=data, **extra
+        )
+
+    async def close(self):
+        await self.session.close()
+
+
+class _H2Content:
+    def __init__(self, resp: "H2Response"):
+        self._resp = resp
+
+    def iter_any(self):
+        return self._resp._iter_raw()
+
+
+class H2Response:
+    """Gives an httpx response the parts of aiohttp's response the proxy uses."""
+
+    def __init__(self, transport: "HTTP2Transport", resp):
+        self._transport = transport
+        self._resp = resp
+        self.status = resp.status_code
+        self.headers = resp.headers
+        self.content = _H2Content(self)
+
+    async def _iter_raw(self):
+        # Raw bytes: like aiohttp with auto_decompress=False, encodings pass through.
+        try:
+            async for chunk in self._resp.aiter_raw():
+                yield chunk
+        except Exception as e:
+            raise self._transport.translate(e) from e
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self._iter_raw()])
+
+    def release(self):
+        self.close()
+
+    def close(self):
+        if not self._resp.is_closed:
+            self._transport.close_later(self._resp.aclose())
+
+
+class HTTP2Transport:
+    """HTTP/2 upstream transport (httpx): concurrent requests share a connection.
+
+    HTTPS endpoints negotiate h2 via ALPN and may fall back to HTTP/1.1;
+    plain-http endpoints use h2 with prior knowledge (h2c).
+    """
+
+    name = "http2"
+
+    def __init__(self, cfg: ProviderConfigModel):
+        try:
+            import httpx
+        except ImportError as e:  # pragma: no cover - optional dependency
+            raise RuntimeError(
+                "transport 'http2' needs httpx[http2] (pip install 'llm-forward[http2]')"
+            ) from e
+
+        self._httpx = httpx
+        tls = any(str(e.url).startswith("https://") for e in cfg.upstream_endpoints)
+        self.client = httpx.AsyncClient(
+            http2=True,
+            http1=tls,
+            limits=httpx.Limits(
+                max_connections=cfg.max_connections or None,
+                keepalive_expiry=cfg.keepalive_timeout,
+            ),
+            timeout=httpx.Timeout(
+                connect=cfg.connect_timeout,
+                read=cfg.read_timeout,
+                write=None,
+                pool=None,
+            ),
+        )
+        self._closing: set[asyncio.Task] = set()
+
+    @property
+    def closed(self) -> bool:
+        return self.client.is_closed
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers=None,
+        params=None,
+        data=None,
+        timeout: Optional[float] = None,
+    ) -> H2Response:
+        extra: dict[str, Any] = {}
+        if timeout is not None:
+            extra["timeout"] = timeout
+        request = self.client.build_request(
+            method, url, headers=headers, params=params, content=data, **extra
+        )
+        try:
+            resp = await self.client.send(request, stream=True)
+        except Exception as e:
+            raise self.translate(e) from e
+        return H2Response(self, resp)
+
+    def translate(self, e: Exception) -> Exception:
+        """Map httpx errors onto the aiohttp ones the proxy already handles."""
+        httpx = self._httpx
+        if isinstance(e, httpx.ConnectTimeout):
+            return aiohttp.ConnectionTimeoutError(str(e))
+        if isinstance(e, httpx.ConnectError):
+            return UpstreamConnectError(str(e))
+        if isinstance(e, httpx.TimeoutException):
+            return aiohttp.ServerTimeoutError(str(e))
+        if isinstance(e, httpx.TransportError):
+            return aiohttp.ClientConnectionError(str(e))
+        return e
+
+    def close_later(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self):
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        await self.client.aclose()
+
+
+TRANSPORTS = {
+    "aiohttp": AiohttpTransport,
+    "http2": HTTP2Transport,
+}
+
+
+def build_transport(cfg: Optional[ProviderConfigModel]):
+    if cfg is None:
+        return AiohttpTransport(None)
+    return TRANSPORTS[cfg.transport](cfg)
@@ -1,7 +1,26 @@
 from .models import UsageRecord
 from .usage_sink import UsageSink
 from .usage_jsonl_writer import JSONLUsageWriter
+from .stream_timing import P2Quantile, StreamTimer
+from .token_estimator import estimate_prompt_tokens, request_prompt_tokens
+from .stream_usage import (
+    TailUsageScanner,
+    extract_usage,
+    add_stream_usage_option,
+    make_stream_usage_parser,
+)
 
 USAGE_SINK = UsageSink()
 
-__all__ = ["UsageRecord", "JSONLUsageWriter"]
+__all__ = [
+    "UsageRecord",
+    "JSONLUsageWriter",
+    "P2Quantile",
+    "StreamTimer",
+    "TailUsageScanner",
+    "add_stream_usage_option",
+    "estimate_prompt_tokens",
+    "extract_usage",
+    "make_stream_usage_parser",
+    "request_prompt_tokens",
+]
@@ -12,6 +12,29 @@ class UsageRecord:
     duration_ms: int
     bytes_in: int
     bytes_out: int
+    # Hash of the gateway key (see backend.config.key_hashing.key_id)
+    key_id: Optional[str] = None
     prompt_tokens: Optional[int] = None
     completion_tokens: Optional[int] = None
     total_tokens: Optional[int] = None
+    # Set on /route/... requests: the alias and which fallback answered (0 = first)
+    route_alias: Optional[str] = None
+    route_attempt: Optional[int] = None
+    # Tokens come from the pre-flight estimate (upstream reported no usage)
+    tokens_estimated: bool = False
+    cache_hit: bool = False
+    coalesced: bool = False
+    # Requests that shared one batched upstream call (embeddings batching)
+    batch_size: Optional[int] = None
+    hedged: bool = False
+    # Attempt that answered first when hedged (0 = original, 1 = hedge)
+    hedge_winner: Optional[int] = None
+    # Hash of the provider API key used (see backend.config.key_hashing.key_id)
+    credential_id: Optional[str] = None
+    # Latency breakdown, ms since the upstream call started (see StreamTimer)
+    ttfb_ms: Optional[int] = None
+    ttft_ms: Optional[int] = None
+    gap_mean_ms: Optional[float] = None
+    gap_max_ms: Optional[float] = None
+    gap_p95_ms: Optional[float] = None
+    tokens_per_second: Optional[float] = None
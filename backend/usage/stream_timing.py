@@ -0,0 +1,124 @@
+import re
+from typing import Optional
+
+# First event that carries generated output (not just the role preamble)
+FIRST_TOKEN_PATTERNS = {
+    "openai": re.compile(rb'"(?:content|reasoning_content|arguments|text)":"[^"]'),
+    "anthropic": re.compile(rb'"content_block_delta"'),
+}
+
+
+class P2Quantile:
+    """Streaming quantile estimate in constant memory (Jain & Chlamtac P²)."""
+
+    def __init__(self, p: float):
+        self.p = p
+        self._initial: list[float] = []
+        self._q: Optional[list[float]] = None
+        self._n = [0, 1, 2, 3, 4]
+        self._desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self._step = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float):
+        if self._q is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self._q = sorted(self._initial)
+            return
+
+        q, n = self._q, self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._step[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._q, self._n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        if self._q is not None:
+            return self._q[2]
+        if not self._initial:
+            return None
+        ordered = sorted(self._initial)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.p))]
+
+
+class StreamTimer:
+    """Latency breakdown of one upstream response, fed as chunks arrive.
+
+    Tracks time to response headers (TTFB), time to the first chunk carrying
+    generated output (TTFT), gaps between chunks (mean/max/p95) and output
+    tokens per second after the first token.
+    """
+
+    def __init__(self, start: float, api_format: str = "openai"):
+        self.start = start
+        self._pattern = FIRST_TOKEN_PATTERNS.get(
+            api_format, FIRST_TOKEN_PATTERNS["openai"]
+        )
+        self.headers_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.last_chunk_at: Optional[float] = None
+        self.gaps = 0
+        self.gap_total = 0.0
+        self.gap_max = 0.0
+        self.gap_p95 = P2Quantile(0.95)
+
+    def on_headers(self, at: float):
+        self.headers_at = at
+
+    def on_chunk(self, chunk: bytes, at: float):
+        if self.last_chunk_at is not None:
+            gap = (at - self.last_chunk_at) * 1000
+            self.gaps += 1
+            self.gap_total += gap
+            self.gap_max = max(self.gap_max, gap)
+            self.gap_p95.add(gap)
+        self.last_chunk_at = at
+        if self.first_token_at is None and self._pattern.search(chunk):
+            self.first_token_at = at
+
+    def fields(self, completion_tokens: Optional[int] = None) -> dict:
+        """UsageRecord fields for what was observed."""
+
+        def since_start(t: Optional[float]) -> Optional[int]:
+            return round((t - self.start) * 1000) if t is not None else None
+
+        tokens_per_second = None
+        if completion_tokens and self.first_token_at is not None:
+            generating = self.last_chunk_at - self.first_token_at
+            if generating > 0:
+                tokens_per_second = round(completion_tokens / generating, 2)
+
+        p95 = self.gap_p95.value()
+        return {
+            "ttfb_ms": since_start(self.headers_at),
+            "ttft_ms": since_start(self.first_token_at),
+            "gap_mean_ms": round(self.gap_total / self.gaps, 2) if self.gaps else None,
+            "gap_max_ms": round(self.gap_max, 2) if self.gaps else None,
+            "gap_p95_ms": round(p95, 2) if p95 is not None else None,
+            "tokens_per_second": tokens_per_second,
+        }
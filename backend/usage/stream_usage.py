@@ -0,0 +1,242 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from backend.request_json import ParsedBody
+
+USAGE_MARKER = b'"usage"'
+MAX_PARTIAL_LINE = 64 * 1024  # bytes of an unterminated line kept between chunks
+USAGE_TAIL_BYTES = 16 * 1024  # tail of a JSON body kept to find its usage object
+
+
+def extract_usage(
+    usage: dict,
+) -> tuple[Optional[int], Optional[int], Optional[int]]:
+    """Normalize an OpenAI- or Anthropic-style usage object."""
+    if "prompt_tokens" in usage or "completion_tokens" in usage:
+        return (
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            usage.get("total_tokens"),
+        )
+
+    prompt_tokens = None
+    if "input_tokens" in usage:
+        prompt_tokens = (
+            (usage.get("input_tokens") or 0)
+            + (usage.get("cache_creation_input_tokens") or 0)
+            + (usage.get("cache_read_input_tokens") or 0)
+        )
+    completion_tokens = usage.get("output_tokens")
+    total_tokens = None
+    if prompt_tokens is not None and completion_tokens is not None:
+        total_tokens = prompt_tokens + completion_tokens
+    return prompt_tokens, completion_tokens, total_tokens
+
+
+class StreamUsageParser(ABC):
+    """Incremental SSE scanner that only decodes lines carrying usage.
+
+    Chunks are scanned with ``bytes.find`` for the usage marker; only the
+    unterminated tail of the last line is kept between chunks, and only
+    matching lines are handed to ``json.loads``.
+    """
+
+    def __init__(self):
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.total_tokens: Optional[int] = None
+        self._partial = b""
+
+    def feed(self, chunk: bytes):
+        if self._partial:
+            chunk = self._partial + chunk
+
+        end = chunk.rfind(b"\n")
+        if end == -1:
+            self._partial = chunk if len(chunk) <= MAX_PARTIAL_LINE else b""
+            return
+        tail = chunk[end + 1 :]
+        self._partial = tail if len(tail) <= MAX_PARTIAL_LINE else b""
+
+        pos = chunk.find(USAGE_MARKER, 0, end)
+        while pos != -1:
+            line_start = chunk.rfind(b"\n", 0, pos) + 1
+            line_end = chunk.find(b"\n", pos)
+            if self._has_usage_object(chunk, pos + len(USAGE_MARKER), line_end):
+                self._on_line(chunk[line_start:line_end])
+            pos = chunk.find(USAGE_MARKER, line_end, end)
+
+    def finish(self):
+        # Flush a final event that was not newline-terminated.
+        if self._partial:
+            partial, self._partial = self._partial, b""
+            self.feed(partial + b"\n")
+
+    def result(self) -> tuple[Optional[int], Optional[int], Optional[int]]:
+        return self.prompt_tokens, self.completion_tokens, self.total_tokens
+
+    @staticmethod
+    def _has_usage_object(chunk: bytes, pos: int, end: int) -> bool:
+        # Skip `: ` and reject `"usage": null` without decoding the line.
+        while pos < end and chunk[pos] in b" :\t":
+            pos += 1
+        return pos < end and chunk[pos] == ord("{")
+
+    def _on_line(self, line: bytes):
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return
+        try:
+            event = json.loads(line[5:])
+        except ValueError:
+            return
+        if isinstance(event, dict):
+            self._on_event(event)
+
+    @abstractmethod
+    def _on_event(self, event: dict):
+        """Take the usage out of one decoded event."""
+
+
+class OpenAIStreamUsageParser(StreamUsageParser):
+    """Reads the final chunk sent when ``stream_options.include_usage`` is set."""
+
+    def _on_event(self, event: dict):
+        usage = event.get("usage")
+        if isinstance(usage, dict):
+            (
+                self.prompt_tokens,
+                self.completion_tokens,
+                self.total_tokens,
+            ) = extract_usage(usage)
+
+
+class AnthropicStreamUsageParser(StreamUsageParser):
+    """Combines ``message_start`` input usage with ``message_delta`` output."""
+
+    def _on_event(self, event: dict):
+        if event.get("type") == "message_start":
+            usage = (event.get("message") or {}).get("usage")
+        elif event.get("type") == "message_delta":
+            usage = event.get("usage")
+        else:
+            return
+        if not isinstance(usage, dict):
+            return
+
+        prompt_tokens, completion_tokens, _ = extract_usage(usage)
+        if "input_tokens" in usage:
+            self.prompt_tokens = prompt_tokens
+        if completion_tokens is not None:
+            # output_tokens is cumulative in message_delta
+            self.completion_tokens = completion_tokens
+        if self.prompt_tokens is not None and self.completion_tokens is not None:
+            self.total_tokens = self.prompt_tokens + self.completion_tokens
+
+
+class TailUsageScanner:
+    """Reads ``usage`` from the end of a JSON body streamed straight through.
+
+    Only the last ``window`` bytes are kept, so memory stays flat however
+    large the response is; the usage object is decoded once at EOF.
+    """
+
+    def __init__(self, window: int = USAGE_TAIL_BYTES):
+        self.window = window
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.total_tokens: Optional[int] = None
+        self._tail = b""
+
+    def feed(self, chunk: bytes):
+        if len(chunk) >= self.window:
+            self._tail = chunk[-self.window :]
+        else:
+            keep = self.window - len(chunk)
+            self._tail = self._tail[-keep:] + chunk
+
+    def finish(self):
+        tail, self._tail = self._tail, b""
+        pos = tail.rfind(USAGE_MARKER)
+        while pos != -1:
+            usage = _decode_object_after(tail, pos + len(USAGE_MARKER))
+            if usage is not None:
+                (
+                    self.prompt_tokens,
+                    self.completion_tokens,
+                    self.total_tokens,
+                ) = extract_usage(usage)
+                return
+            pos = tail.rfind(USAGE_MARKER, 0, pos)
+
+    def result(self) -> tuple[Optional[int], Optional[int], Optional[int]]:
+        return self.prompt_tokens, self.completion_tokens, self.total_tokens
+
+
+def _decode_object_after(data: bytes, pos: int) -> Optional[dict]:
+    while pos < len(data) and data[pos] in b" :\t\r\n":
+        pos += 1
+    if pos >= len(data) or data[pos] != ord("{"):
+        return None
+
+    # Brace-match the object, skipping over string contents.
+    depth = 0
+    in_string = False
+    escaped = False
+    for end in range(pos, len(data)):
+        c = data[end]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == 0x5C:  # backslash
+                escaped = True
+            elif c == 0x22:  # quote
+                in_string = False
+        elif c == 0x22:
+            in_string = True
+        elif c == 0x7B:  # {
+            depth += 1
+        elif c == 0x7D:  # }
+            depth -= 1
+            if depth == 0:
+                try:
+                    obj = json.loads(data[pos : end + 1])
+                except ValueError:
+                    return None
+                return obj if isinstance(obj, dict) else None
+    return None
+
+
+STREAM_USAGE_PARSERS = {
+    "openai": OpenAIStreamUsageParser,
+    "anthropic": AnthropicStreamUsageParser,
+}
+
+
+def make_stream_usage_parser(api_format: str) -> StreamUsageParser:
+    return STREAM_USAGE_PARSERS.get(api_format, OpenAIStreamUsageParser)()
+
+
+def add_stream_usage_option(parsed: ParsedBody) -> ParsedBody:
+    """Ask an OpenAI-compatible upstream to send a final usage chunk."""
+    if not parsed.stream:
+        return parsed
+    if not parsed.has_member("stream_options"):
+        # Spliced in up front: the rest of the body is not re-encoded.
+        return parsed.with_member("stream_options", {"include_usage": True})
+
+    payload = parsed.payload
+    if payload is None:
+        return parsed
+    options = payload.get("stream_options")
+    if options is None:
+        options = {}
+    if not isinstance(options, dict) or "include_usage" in options:
+        return parsed  # respect an explicit client choice
+
+    return ParsedBody.from_payload(
+        {**payload, "stream_options": {**options, "include_usage": True}},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
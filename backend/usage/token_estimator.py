@@ -0,0 +1,140 @@
+import json
+from math import ceil
+from typing import Any, Optional
+
+# (model name fragments, ASCII chars per token, tokens per wide char); the
+# first family with a fragment in "/<model>" wins. Approximations of each
+# family's BPE on mixed English prose and code; wide (CJK-range) characters
+# are counted on their own because they take roughly a token each instead of
+# sharing one with their neighbours.
+FAMILY_RATIOS = (
+    (("gpt-4o", "gpt-4.1", "gpt-5", "/o1", "/o3", "/o4"), 4.2, 0.8),
+    (("gpt-4", "gpt-3.5", "text-embedding"), 4.0, 1.1),
+    (("claude",), 3.5, 1.2),
+    (("qwen", "deepseek", "glm"), 3.9, 0.7),
+    (("llama", "mistral", "mixtral", "gemma"), 3.7, 1.2),
+)
+DEFAULT_RATIO = (4.0, 1.0)
+
+# Chat framing: tokens per message and for priming the reply (OpenAI style)
+MESSAGE_OVERHEAD = 3
+REPLY_PRIMING = 3
+IMAGE_TOKENS = 765  # a high-detail 1024x1024 image; low detail is 85
+LOW_DETAIL_IMAGE_TOKENS = 85
+
+PROMPT_FIELDS = ("system", "instructions", "prompt", "input")
+SCHEMA_FIELDS = ("tools", "functions", "response_format")
+
+
+def family_ratio(model: Optional[str]) -> tuple[float, float]:
+    name = "/" + (model or "").lower().rsplit("/", 1)[-1]
+    for fragments, chars_per_token, wide_tokens in FAMILY_RATIOS:
+        if any(f in name for f in fragments):
+            return chars_per_token, wide_tokens
+    return DEFAULT_RATIO
+
+
+class _Estimate:
+    def __init__(self, model: Optional[str]):
+        self.chars_per_token, self.wide_tokens = family_ratio(model)
+        self.tokens = 0.0
+        self.found = False
+
+    def text(self, text: str):
+        self.found = True
+        chars = len(text)
+        if text.isascii():
+            self.tokens += chars / self.chars_per_token
+            return
+        # Two- and three-byte UTF-8 characters: each extra byte is ~half a
+        # wide (CJK) character, which costs about a token on its own.
+        wide = (len(text.encode()) - chars) / 2
+        self.tokens += (chars - wide) / self.chars_per_token + wide * self.wide_tokens
+
+    def content(self, value: Any):
+        if isinstance(value, str):
+            self.text(value)
+        elif isinstance(value, list):
+            if value and all(isinstance(v, int) for v in value):
+                self.found = True
+                self.tokens += len(value)  # already token ids
+                return
+            for part in value:
+                self.part(part)
+
+    def part(self, part: Any):
+        if not isinstance(part, dict):
+            self.content(part)
+            return
+        if "role" in part:
+            self.message(part)  # responses API input items
+            return
+        kind = part.get("type", "")
+        if "image" in kind:
+            self.found = True
+            detail = (part.get("image_url") or {}) if kind == "image_url" else {}
+            low = isinstance(detail, dict) and detail.get("detail") == "low"
+            self.tokens += LOW_DETAIL_IMAGE_TOKENS if low else IMAGE_TOKENS
+        elif "text" in part:
+            self.content(part["text"])
+        elif "content" in part:
+            self.content(part["content"])  # e.g. Anthropic tool_result blocks
+        elif "input" in part:
+            self.schema(part["input"])  # tool_use arguments
+
+    def schema(self, value: Any):
+        self.text(value if isinstance(value, str) else json.dumps(value))
+
+    def message(self, message: Any):
+        self.tokens += MESSAGE_OVERHEAD
+        if not isinstance(message, dict):
+            return
+        self.content(message.get("content"))
+        if isinstance(message.get("name"), str):
+            self.text(message["name"])
+        for call in message.get("tool_calls") or ():
+            if isinstance(call, dict):
+                self.schema(call.get("function"))
+
+
+def estimate_prompt_tokens(payload: Any) -> Optional[int]:
+    """Approximate prompt tokens of a parsed request body, offline.
+
+    Covers chat (OpenAI and Anthropic messages), completions, embeddings and
+    responses-style bodies, plus tool schemas. None when the body carries
+    nothing that looks like a prompt.
+    """
+    if not isinstance(payload, dict):
+        return None
+    estimate = _Estimate(payload.get("model"))
+
+    messages = payload.get("messages")
+    if isinstance(messages, list):
+        estimate.found = True
+        for message in messages:
+            estimate.message(message)
+        estimate.tokens += REPLY_PRIMING
+    for field in PROMPT_FIELDS:
+        estimate.content(payload.get(field))
+    for field in SCHEMA_FIELDS:
+        if payload.get(field):
+            estimate.schema(payload[field])
+
+    if not estimate.found:
+        return None
+    return ceil(estimate.tokens)
+
+
+def request_prompt_tokens(request) -> Optional[int]:
+    """Estimate for the request's parsed body, computed on first use.
+
+    Only TPM limits, contended admission and responses without usage need
+    it, so most requests never walk their messages.
+    """
+    state = request.state
+    if not hasattr(state, "prompt_tokens_estimate"):
+        parsed = getattr(state, "parsed_body", None)
+        state.prompt_tokens_estimate = (
+            estimate_prompt_tokens(parsed.payload) if parsed is not None else None
+        )
+    return state.prompt_tokens_estimate
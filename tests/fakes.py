@@ -0,0 +1,103 @@
+"""Stand-ins for the upstream pool, its aiohttp session and the usage sink,
+shared by the tests that drive ``forward_request``."""
+
+from typing import Optional
+
+SSE_HEADERS = {"content-type": "text/event-stream"}
+
+
+class FakeContent:
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    """An upstream response; its body is streamed in ``chunks`` (10-byte
+    pieces of ``body`` unless given)."""
+
+    def __init__(
+        self,
+        status: int = 200,
+        headers: Optional[dict[str, str]] = None,
+        body: bytes = b"",
+        chunks: Optional[list[bytes]] = None,
+    ):
+        self.status = status
+        self.headers = {"content-type": "application/json", **(headers or {})}
+        if chunks is None:
+            chunks = [body[i : i + 10] for i in range(0, len(body), 10)]
+        self.content = FakeContent(chunks)
+        self.closed = False
+
+    async def read(self):
+        return b"".join(self.content.chunks)
+
+    def close(self):
+        self.closed = True
+
+    def release(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, response):
+        self._response = response
+
+    async def __aenter__(self):
+        return self._response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def __await__(self):
+        # aiohttp's request context manager can also be awaited directly
+        return self.__aenter__().__await__()
+
+
+class FakeSession:
+    """Answers with the given responses in turn (the last one repeats) and
+    records each request."""
+
+    def __init__(self, *responses: FakeResponse):
+        self.responses = list(responses)
+        self.requests: list[dict] = []
+
+    def request(self, method, url, headers=None, params=None, data=None):
+        self.requests.append(
+            {
+                "method": method,
+                "url": url,
+                "headers": dict(headers or {}),
+                "params": params,
+                "data": data,
+            }
+        )
+        if len(self.responses) > 1:
+            return FakeContext(self.responses.pop(0))
+        return FakeContext(self.responses[0])
+
+
+class FakePool:
+    def __init__(self, transport):
+        self.transport = transport
+        self.providers: list[str] = []
+        self.released = 0
+
+    def acquire(self, provider):
+        self.providers.append(provider)
+        return self
+
+    def release(self, pool):
+        self.released += 1
+
+
+class FakeUsageSink:
+    def __init__(self):
+        self.records = []
+
+    async def record(self, usage):
+        self.records.append(usage)
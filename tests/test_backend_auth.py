@@ -3,7 +3,8 @@ import pytest
 from fastapi import FastAPI, Request
 
 from backend.auth import authenticate_and_authorize
-from backend.config import GatewayKeyModel
+from backend.config import AuthIndex, GatewayKeyModel
+from backend.request_body import StreamedBody
 
 
 def build_app(provider_allowed_models, gateway_keys):
@@ -14,8 +15,7 @@ def build_app(provider_allowed_models, gateway_keys):
         await authenticate_and_authorize(
             request,
             provider,
-            provider_allowed_models,
-            gateway_keys,
+            AuthIndex(gateway_keys, {"openai": provider_allowed_models}),
         )
         return {
             "owner": request.state.owner,
@@ -153,3 +153,77 @@ async def test_auth_model_not_allowed_by_provider():
         )
 
     assert resp.status_code == 403
+
+
+def build_upload_app(gateway_keys, max_body_bytes=None):
+    app = FastAPI()
+
+    @app.post("/auth/{provider}")
+    async def auth_route(provider: str, request: Request):
+        body = await authenticate_and_authorize(
+            request,
+            provider,
+            AuthIndex(gateway_keys, {"openai": ["*"]}),
+            max_body_bytes=max_body_bytes,
+        )
+        if isinstance(body, StreamedBody):
+            size = 0
+            async for chunk in body:
+                size += len(chunk)
+            return {"streamed": True, "size": size}
+        return {"streamed": False, "size": len(body)}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_auth_streams_multipart_body_without_buffering():
+    gateway_keys = {
+        "test-key": GatewayKeyModel(owner="alice", providers=["openai"], models=["*"])
+    }
+    app = build_upload_app(gateway_keys)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/auth/openai",
+            headers={"authorization": "Bearer test-key"},
+            files={"file": ("a.wav", b"\x00" * 5000, "audio/wav")},
+            data={"model": "whisper-1"},
+        )
+
+    assert resp.status_code == 200
+    assert resp.json()["streamed"] is True
+    assert resp.json()["size"] > 5000
+
+
+@pytest.mark.asyncio
+async def test_auth_enforces_max_body_bytes():
+    gateway_keys = {
+        "test-key": GatewayKeyModel(owner="alice", providers=["openai"], models=["*"])
+    }
+    app = build_upload_app(gateway_keys, max_body_bytes=100)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        json_resp = await client.post(
+            "/auth/openai",
+            headers={"authorization": "Bearer test-key"},
+            json={"model": "gpt-ok", "input": "x" * 200},
+        )
+
+        async def chunks():
+            for _ in range(10):
+                yield b"\x00" * 50
+
+        binary_resp = await client.post(
+            "/auth/openai",
+            headers={
+                "authorization": "Bearer test-key",
+                "content-type": "application/octet-stream",
+            },
+            content=chunks(),
+        )
+
+    assert json_resp.status_code == 413
+    assert binary_resp.status_code == 413
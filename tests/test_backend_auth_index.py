@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+import backend.config.auth_index as auth_index_module
+from backend.auth import authenticate_and_authorize
+from backend.config import (
+    AuthIndex,
+    ConfigSnapshot,
+    GatewayConfigModel,
+    GatewayKeyModel,
+    ModelMatcher,
+)
+
+
+def key(**kwargs) -> GatewayKeyModel:
+    return GatewayKeyModel(
+        **{"owner": "alice", "providers": ["openai"], "models": ["*"], **kwargs}
+    )
+
+
+def test_model_matcher_supports_exact_names_and_globs():
+    matcher = ModelMatcher.compile(["gpt-4o", "gpt-4.1*", "claude-?-haiku"])
+    assert matcher("gpt-4o")
+    assert matcher("gpt-4.1")
+    assert matcher("gpt-4.1-mini-2025-04-14")
+    assert matcher("claude-3-haiku")
+    assert not matcher("gpt-4o-mini")
+    assert not matcher("xgpt-4.1")
+    assert not matcher({"not": "a string"})
+    assert ModelMatcher.compile(["*"])("anything")
+
+
+def test_decisions_check_key_and_provider_models():
+    index = AuthIndex(
+        {"k": key(models=["gpt-4.1*"])}, {"openai": ["gpt-4.1", "gpt-4.1-mini"]}
+    )
+    policy = index.get("k")
+    assert index.model_denied(policy, "openai", "gpt-4.1-mini") is None
+    assert index.model_denied(policy, "openai", "gpt-4o") == "Model not allowed"
+    assert (
+        index.model_denied(policy, "openai", "gpt-4.1-nano")
+        == "Model not supported by provider"
+    )
+    # /route/...: no provider yet
+    assert index.model_denied(policy, None, "gpt-4.1-nano") is None
+
+
+def test_decisions_are_memoized_and_bounded(monkeypatch):
+    monkeypatch.setattr(auth_index_module, "MAX_DECISIONS", 3)
+    index = AuthIndex({"k": key(models=["gpt-*"])}, {"openai": ["*"]})
+    calls = []
+    decide = index._decide
+    monkeypatch.setattr(index, "_decide", lambda *a: calls.append(a) or decide(*a))
+
+    policy = index.get("k")
+    for _ in range(3):
+        assert index.model_denied(policy, "openai", "gpt-4o") is None
+    assert len(calls) == 1
+
+    for i in range(10):
+        index.model_denied(policy, "openai", f"gpt-{i}")
+    assert len(index._decisions) <= 3
+
+
+def test_expiry_is_a_monotonic_deadline(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(auth_index_module.time, "monotonic", lambda: clock[0])
+    expires = datetime.now(timezone.utc) + timedelta(seconds=60)
+    index = AuthIndex({"k": key(expires_at=expires)}, {"openai": ["*"]})
+
+    policy = index.get("k")
+    assert 1059 < policy.deadline <= 1060
+    assert not policy.expired
+    clock[0] += 61
+    assert policy.expired
+    assert index.get("missing") is None
+
+
+def test_each_snapshot_compiles_its_own_index():
+    cfg = GatewayConfigModel.model_validate(
+        {
+            "providers": {
+                "openai": {
+                    "base_url": "http://upstream",
+                    "api_key": "k",
+                    "allowed_models": ["gpt-4.1", "gpt-4.1-mini"],
+                }
+            },
+            "gateway_keys": {
+                "k": {"owner": "alice", "providers": ["openai"], "models": ["gpt-4.1*"]}
+            },
+        }
+    )
+    first, second = ConfigSnapshot(cfg), ConfigSnapshot(cfg)
+    first.auth.model_denied(first.auth.get("k"), "openai", "gpt-4.1")
+    assert first.auth is not second.auth
+    assert not second.auth._decisions
+    assert second.auth.get("k").providers == frozenset({"openai"})
+
+
+def test_glob_that_matches_no_provider_model_is_rejected():
+    with pytest.raises(ValueError, match="model 'o3\\*' not allowed"):
+        GatewayConfigModel.model_validate(
+            {
+                "providers": {
+                    "openai": {
+                        "base_url": "http://upstream",
+                        "api_key": "k",
+                        "allowed_models": ["gpt-4.1"],
+                    }
+                },
+                "gateway_keys": {
+                    "k": {"owner": "alice", "providers": ["openai"], "models": ["o3*"]}
+                },
+            }
+        )
+
+
+@pytest.mark.asyncio
+async def test_auth_uses_the_compiled_policy():
+    index = AuthIndex(
+        {"test-key": key(models=["gpt-4.1*"], providers=["openai"])},
+        {"openai": ["*"]},
+    )
+    app = FastAPI()
+
+    @app.post("/auth/{provider}")
+    async def auth_route(provider: str, request: Request):
+        await authenticate_and_authorize(request, provider, index)
+        return {"providers": sorted(request.state.allowed_providers)}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {"authorization": "Bearer test-key"}
+        dated = await client.post(
+            "/auth/openai", headers=headers, json={"model": "gpt-4.1-2025-04-14"}
+        )
+        other = await client.post(
+            "/auth/openai", headers=headers, json={"model": "gpt-4o"}
+        )
+        provider = await client.post(
+            "/auth/anthropic", headers=headers, json={"model": "gpt-4.1"}
+        )
+
+    assert dated.json() == {"providers": ["openai"]}
+    assert other.status_code == 403
+    assert provider.json()["detail"] == "Provider not allowed"
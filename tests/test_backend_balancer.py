@@ -0,0 +1,99 @@
+import pytest
+
+from backend.config import ProviderConfigModel
+from backend.upstream import EndpointBalancer, UpstreamSessionPool
+
+
+def provider(**kwargs):
+    return ProviderConfigModel(
+        api_key="k",
+        allowed_models=["*"],
+        endpoints=[
+            {"url": "http://a.example.com"},
+            {"url": "http://b.example.com/", "weight": 2},
+        ],
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_picks_least_outstanding_weighted_by_latency():
+    balancer = EndpointBalancer(UpstreamSessionPool())
+    balancer.sync({"vllm": provider()})
+    a, b = balancer.endpoints["vllm"]
+    assert (a.url, b.url) == ("http://a.example.com", "http://b.example.com")
+
+    balancer.observe(a, 100, ok=True)
+    balancer.observe(b, 100, ok=True)
+    # b has twice the weight, so it takes two requests before a is preferred
+    picks = [balancer.acquire("vllm").url for _ in range(3)]
+    assert picks.count("http://b.example.com") == 2
+
+    for endpoint in (a, b, b):
+        balancer.release(endpoint)
+    balancer.observe(b, 1000, ok=True)
+    assert balancer.acquire("vllm") is a
+
+
+@pytest.mark.asyncio
+async def test_failing_endpoint_leaves_rotation_and_counters_survive_sync():
+    balancer = EndpointBalancer(UpstreamSessionPool())
+    balancer.sync({"vllm": provider(unhealthy_threshold=2)})
+    a, b = balancer.endpoints["vllm"]
+
+    balancer.observe(b, 0, ok=False)
+    assert b.healthy
+    balancer.observe(b, 0, ok=False)
+    assert not b.healthy
+    assert all(balancer.acquire("vllm") is a for _ in range(3))
+
+    balancer.sync({"vllm": provider(unhealthy_threshold=2)})
+    assert balancer.endpoints["vllm"][1] is b
+    stats = balancer.stats()["vllm"]
+    assert stats[0]["in_flight"] == 3
+    assert stats[1]["failures"] == 2
+    assert stats[1]["healthy"] is False
+
+
+def test_provider_requires_base_url_or_endpoints():
+    with pytest.raises(ValueError):
+        ProviderConfigModel(api_key="k", allowed_models=["*"])
+
+
+@pytest.mark.asyncio
+async def test_health_probe_takes_failing_endpoint_out():
+    from aiohttp import web
+
+    async def health(request):
+        return web.Response(status=200 if request.host.startswith("127.") else 503)
+
+    app = web.Application()
+    app.router.add_get("/health", health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    pool = UpstreamSessionPool()
+    balancer = EndpointBalancer(pool)
+    cfg = ProviderConfigModel(
+        api_key="k",
+        allowed_models=["*"],
+        endpoints=[
+            {"url": f"http://127.0.0.1:{port}"},
+            {"url": f"http://localhost:{port}"},
+        ],
+        health_check_path="/health",
+    )
+    balancer.sync({"vllm": cfg})
+    good, bad = balancer.endpoints["vllm"]
+    await balancer._probe(good, cfg)
+    await balancer._probe(bad, cfg)
+
+    assert good.healthy
+    assert not bad.healthy
+
+    await balancer.close()
+    await pool.close()
+    await runner.cleanup()
@@ -0,0 +1,139 @@
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import backend.proxy as proxy_module
+from backend.cache import ResponseCache
+from backend.config import ResponseCacheConfigModel
+from backend.proxy import replay_cached_response
+
+from fakes import FakeUsageSink
+
+
+def make_cache(**kwargs):
+    cache = ResponseCache()
+    cache.configure(ResponseCacheConfigModel(enabled=True, **kwargs))
+    return cache
+
+
+def body(**payload):
+    return json.dumps({"model": "gpt-ok", "temperature": 0, **payload}).encode()
+
+
+def test_key_is_canonical_and_requires_determinism():
+    cache = make_cache()
+    a = b'{"model":"gpt-ok","temperature":0,"messages":[{"role":"user"}]}'
+    b = b'{"messages": [{"role": "user"}], "temperature": 0, "model": "gpt-ok"}'
+
+    assert cache.key_for("openai", "POST", "v1/chat", a) == cache.key_for(
+        "openai", "POST", "/v1/chat/", b
+    )
+    assert cache.key_for("anthropic", "POST", "v1/chat", a) != cache.key_for(
+        "openai", "POST", "v1/chat", a
+    )
+    assert cache.key_for("openai", "POST", "v1/chat", body(temperature=0.7)) is None
+    assert cache.key_for("openai", "GET", "v1/models", a) is None
+    assert make_cache(deterministic_only=False).key_for(
+        "openai", "POST", "v1/chat", body(temperature=0.7)
+    )
+
+
+def test_key_varies_with_query_and_variant_headers():
+    cache = make_cache()
+    base = cache.key_for("openai", "POST", "v1/chat", body(), [("a", "1")], {})
+
+    assert base == cache.key_for(
+        "openai", "POST", "v1/chat", body(), [("a", "1")], {"User-Agent": "x"}
+    )
+    assert base != cache.key_for("openai", "POST", "v1/chat", body(), [("a", "2")])
+    for header in ("Accept-Encoding", "anthropic-version", "OpenAI-Organization"):
+        assert base != cache.key_for(
+            "openai", "POST", "v1/chat", body(), [("a", "1")], {header: "x"}
+        )
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_oversized_entries():
+    cache = make_cache(max_entries=2, max_entry_bytes=10)
+    for name in ("a", "b", "c"):
+        collector = cache.collector(name)
+        collector.feed(b"ok")
+        await cache.store(collector, 200, {}, is_stream=False)
+
+    assert await cache.get("a") is None
+    assert (await cache.get("c")).body == b"ok"
+
+    collector = cache.collector("big")
+    collector.feed(b"x" * 11)
+    await cache.store(collector, 200, {}, is_stream=False)
+    assert await cache.get("big") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_memory_eviction(tmp_path):
+    cache = make_cache(disk_path=str(tmp_path))
+    collector = cache.collector("k")
+    collector.feed(b'data: {"a":1}\n\n')
+    collector.feed(b"data: [DONE]\n\n")
+    await cache.store(
+        collector, 200, {"content-type": "text/event-stream"}, is_stream=True
+    )
+
+    fresh = make_cache(disk_path=str(tmp_path))
+    entry = await fresh.get("k")
+    assert entry.events == [b'data: {"a":1}\n\n', b"data: [DONE]\n\n"]
+    assert entry.media_type == "text/event-stream"
+    assert fresh.stats()["entries"] == 1
+
+
+GZIPPED_SSE = gzip.compress(b"data: 1\n\ndata: 2\n\n")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "encoding, chunks",
+    [
+        ("identity", [b"data: 1\r\n\r\ndata: ", b"2\r\n\r\n"]),
+        ("gzip", [GZIPPED_SSE[:10], GZIPPED_SSE[10:]]),
+    ],
+)
+async def test_streams_are_stored_as_received(encoding, chunks):
+    cache = make_cache()
+    collector = cache.collector("k")
+    for chunk in chunks:
+        collector.feed(chunk)
+    headers = {"content-type": "text/event-stream", "content-encoding": encoding}
+    await cache.store(collector, 200, headers, is_stream=True)
+
+    # CRLF-delimited and compressed streams replay byte for byte
+    assert (await cache.get("k")).events == chunks
+
+
+@pytest.mark.asyncio
+async def test_replay_streams_events_and_records_cache_hit(monkeypatch):
+    cache = make_cache()
+    collector = cache.collector("k")
+    collector.feed(b'data: {"a":1}\n\n')
+    collector.feed(b"data: [DONE]\n\n")
+    await cache.store(
+        collector, 200, {"content-type": "text/event-stream"}, is_stream=True
+    )
+    fake_usage = FakeUsageSink()
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", fake_usage)
+
+    request = SimpleNamespace(
+        state=SimpleNamespace(owner="ci", model="gpt-ok", stream=True),
+        path_params={"provider": "openai"},
+    )
+    response = await replay_cached_response(
+        request, "openai", await cache.get("k"), body()
+    )
+    received = [chunk async for chunk in response.body_iterator]
+
+    assert received == [b'data: {"a":1}\n\n', b"data: [DONE]\n\n"]
+    assert response.headers["x-gateway-cache"] == "hit"
+    record = fake_usage.records[0]
+    assert record.cache_hit is True
+    assert record.total_tokens == 0
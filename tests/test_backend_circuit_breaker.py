@@ -0,0 +1,214 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import backend.proxy as proxy_module
+from backend.config import ProviderConfigModel, RetryConfigModel
+from backend.proxy import forward_request
+from backend.upstream import (
+    CircuitOpenError,
+    EndpointBalancer,
+    RetryBudget,
+    UpstreamSessionPool,
+)
+
+from fakes import FakeUsageSink
+
+
+def provider(endpoints, **breaker):
+    return ProviderConfigModel(
+        api_key="k",
+        allowed_models=["*"],
+        endpoints=endpoints,
+        unhealthy_threshold=100,
+        circuit_breaker={
+            "enabled": True,
+            "min_requests": 4,
+            "open_seconds": 30,
+            **breaker,
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_on_failure_rate_and_fails_fast():
+    balancer = EndpointBalancer(UpstreamSessionPool())
+    balancer.sync({"vllm": provider([{"url": "http://a.example.com"}])})
+    (a,) = balancer.endpoints["vllm"]
+
+    for ok in (True, False, True, False):
+        balancer.observe(a, 10, ok=ok)
+    assert a.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError) as exc:
+        balancer.acquire("vllm")
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "30"
+    assert balancer.stats()["vllm"][0]["circuit"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_half_open_allows_one_trial_then_closes():
+    balancer = EndpointBalancer(UpstreamSessionPool())
+    balancer.sync({"vllm": provider([{"url": "http://a.example.com"}])})
+    (a,) = balancer.endpoints["vllm"]
+    for _ in range(4):
+        balancer.observe(a, 10, ok=False)
+    a.breaker.open_until = 0  # cooldown elapsed
+
+    trial = balancer.acquire("vllm")
+    assert a.breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        balancer.acquire("vllm")
+
+    balancer.observe(trial, 10, ok=True)
+    balancer.release(trial)
+    assert a.breaker.state == "closed"
+    assert balancer.acquire("vllm") is a
+
+
+@pytest.mark.asyncio
+async def test_open_endpoint_is_skipped_while_others_serve():
+    balancer = EndpointBalancer(UpstreamSessionPool())
+    balancer.sync(
+        {
+            "vllm": provider(
+                [{"url": "http://a.example.com"}, {"url": "http://b.example.com"}]
+            )
+        }
+    )
+    a, b = balancer.endpoints["vllm"]
+    for _ in range(4):
+        balancer.observe(a, 10, ok=False)
+    assert all(balancer.acquire("vllm") is b for _ in range(3))
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget()
+    assert budget.try_retry("openai") is False
+    for _ in range(4):
+        budget.earn("openai", 0.25)
+    assert budget.try_retry("openai") is True
+    assert budget.try_retry("openai") is False
+    assert budget.stats() == {"retries": 1, "denied": 2}
+
+
+@pytest.mark.asyncio
+async def test_connect_error_retries_on_another_endpoint(monkeypatch):
+    async def chat(request):
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    live_port = runner.addresses[0][1]
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead_port = s.getsockname()[1]
+
+    pool = UpstreamSessionPool()
+    balancer = EndpointBalancer(pool)
+    retries = RetryBudget()
+    cfg = provider(
+        [
+            {"url": f"http://127.0.0.1:{dead_port}", "weight": 10},
+            {"url": f"http://127.0.0.1:{live_port}"},
+        ]
+    )
+    await pool.sync({"vllm": cfg})
+    balancer.sync({"vllm": cfg})
+    retries.earn("vllm", 1.0)
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", pool)
+    monkeypatch.setattr(proxy_module, "UPSTREAM_BALANCER", balancer)
+    monkeypatch.setattr(proxy_module, "UPSTREAM_RETRIES", retries)
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", FakeUsageSink())
+
+    try:
+        endpoint = balancer.acquire("vllm")
+        assert endpoint.url.endswith(str(dead_port))
+        request = SimpleNamespace(
+            method="POST",
+            headers={},
+            query_params={},
+            state=SimpleNamespace(owner="alice", model="m", stream=False),
+            path_params={"provider": "vllm"},
+        )
+        response = await forward_request(
+            request,
+            f"{endpoint.url}/v1/chat",
+            "provider-key",
+            b'{"model":"m"}',
+            endpoint=endpoint,
+            retry=RetryConfigModel(backoff_ms=0),
+        )
+
+        assert response.status_code == 200
+        assert retries.stats()["retries"] == 1
+        dead, live = balancer.endpoints["vllm"]
+        assert dead.failures == 1
+        assert (dead.in_flight, live.in_flight) == (0, 0)
+    finally:
+        await pool.close()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream", [False, True])
+async def test_read_timeout_after_headers_counts_as_failure(monkeypatch, stream):
+    async def stall(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b'{"partial":')
+        await asyncio.sleep(1)
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat", stall)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+
+    pool = UpstreamSessionPool()
+    balancer = EndpointBalancer(pool)
+    cfg = provider([{"url": f"http://127.0.0.1:{port}"}], min_requests=1)
+    cfg.read_timeout = 0.1
+    await pool.sync({"vllm": cfg})
+    balancer.sync({"vllm": cfg})
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", pool)
+    monkeypatch.setattr(proxy_module, "UPSTREAM_BALANCER", balancer)
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", FakeUsageSink())
+
+    try:
+        endpoint = balancer.acquire("vllm")
+        request = SimpleNamespace(
+            method="POST",
+            headers={},
+            query_params={},
+            state=SimpleNamespace(owner="alice", model="m", stream=stream),
+            path_params={"provider": "vllm"},
+        )
+        if stream:
+            response = await forward_request(
+                request, f"{endpoint.url}/v1/chat", "k", b"{}", endpoint=endpoint
+            )
+            async for _ in response.body_iterator:
+                pass
+        else:
+            with pytest.raises(aiohttp.ServerTimeoutError):
+                await forward_request(
+                    request, f"{endpoint.url}/v1/chat", "k", b"{}", endpoint=endpoint
+                )
+
+        assert endpoint.failures == 1 and endpoint.in_flight == 0
+        assert endpoint.breaker.state == "open"
+    finally:
+        await pool.close()
+        await runner.cleanup()
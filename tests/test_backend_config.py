@@ -1,6 +1,11 @@
+import asyncio
+import threading
+import time
 from pathlib import Path
 
-from backend.config import config_store
+import yaml
+
+from backend.config import ConfigDiff, GatewayConfigModel, config_store
 
 
 def reset_config_store():
@@ -36,7 +41,9 @@ gateway_keys:
     assert config_store.ConfigStore.load() is True
     snapshot = config_store.ConfigStore.get()
     assert snapshot.config.providers["openai"].api_key == "k"
-    assert snapshot.config.gateway_keys["test-key"].owner == "alice"
+    # Only a salted hash of the key is kept
+    assert "test-key" not in snapshot.config.gateway_keys
+    assert snapshot.auth.get("test-key").key.owner == "alice"
 
 
 def test_config_store_rejects_invalid_references(tmp_path, monkeypatch):
@@ -87,3 +94,193 @@ gateway_keys:
 
     snapshot = config_store.ConfigStore.get()
     assert snapshot.config.providers["openai"].allowed_models == ["gpt-ok"]
+
+
+RELOAD_CONFIG = """
+providers:
+  openai:
+    base_url: "http://example.com"
+    api_key: "k"
+    allowed_models: ["gpt-ok"]
+  other:
+    base_url: "{other_url}"
+    api_key: "k"
+    allowed_models: ["*"]
+gateway_keys:
+  alice-key:
+    owner: "alice"
+    providers: ["openai"]
+    models: ["gpt-ok"]
+  bob-key:
+    owner: "{bob}"
+    providers: ["openai"]
+    models: ["gpt-ok"]
+response_cache:
+  enabled: {cache}
+""".lstrip()
+
+
+def write_reload_config(path: Path, other_url="http://other", bob="bob", cache="false"):
+    write_config(path, RELOAD_CONFIG.format(other_url=other_url, bob=bob, cache=cache))
+
+
+def test_diff_reports_changed_entries_and_sections():
+    old = GatewayConfigModel.model_validate(
+        yaml.safe_load(
+            RELOAD_CONFIG.format(other_url="http://a", bob="bob", cache="false")
+        )
+    )
+    raw = yaml.safe_load(
+        RELOAD_CONFIG.format(other_url="http://b", bob="bob", cache="true")
+    )
+    del raw["gateway_keys"]["alice-key"]
+    raw["gateway_keys"]["carol-key"] = {**raw["gateway_keys"]["bob-key"], "owner": "c"}
+    new = GatewayConfigModel.model_validate(raw)
+
+    changes = ConfigDiff.between(old, new)
+    assert changes.changed == {"providers": ("other",)}
+    assert changes.sections == ("response_cache",)
+    assert (
+        len(changes.added["gateway_keys"]) == len(changes.removed["gateway_keys"]) == 1
+    )
+    assert changes.touches("providers") and not changes.touches("rate_limit")
+    assert not ConfigDiff.between(new, new)
+
+
+async def test_reload_parses_off_the_event_loop_and_swaps_atomically(
+    tmp_path, monkeypatch
+):
+    reset_config_store()
+    config_path = tmp_path / "config.yaml"
+    monkeypatch.setattr(config_store, "CONFIG_PATH", config_path)
+    write_reload_config(config_path)
+    assert config_store.ConfigStore.load()
+    before = config_store.ConfigStore.get()
+
+    loop_thread = threading.get_ident()
+    prepare = config_store.ConfigStore._prepare.__func__
+    threads = []
+
+    def slow_prepare(cls, current):
+        threads.append(threading.get_ident())
+        time.sleep(0.2)  # a big config.yaml
+        return prepare(cls, current)
+
+    monkeypatch.setattr(config_store.ConfigStore, "_prepare", classmethod(slow_prepare))
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    write_reload_config(config_path, other_url="http://moved")
+    reloads = []
+    assert await config_store.ConfigStore.reload(
+        lambda: asyncio.sleep(0, reloads.append(1))
+    )
+    task.cancel()
+
+    assert threads and threads[0] != loop_thread
+    assert ticks >= 10  # the loop kept running while the config was parsed
+    after = config_store.ConfigStore.get()
+    assert after is not before and reloads == [1]
+    assert after.changes.summary()["changed"] == {"providers": ["other"]}
+    # Keys and provider models are unchanged: the compiled index is kept
+    assert after.auth is before.auth
+    status = config_store.ConfigStore.status()
+    assert status["last_reload"]["changed"] and status["changes"]["changed"]
+
+
+async def test_unchanged_reload_keeps_the_snapshot(tmp_path, monkeypatch):
+    reset_config_store()
+    config_path = tmp_path / "config.yaml"
+    monkeypatch.setattr(config_store, "CONFIG_PATH", config_path)
+    write_reload_config(config_path)
+    assert config_store.ConfigStore.load()
+    before = config_store.ConfigStore.get()
+
+    write_reload_config(config_path)
+    reloads = []
+    assert await config_store.ConfigStore.reload(
+        lambda: asyncio.sleep(0, reloads.append(1))
+    )
+    assert config_store.ConfigStore.get() is before and not reloads
+    assert config_store.ConfigStore.status()["last_reload"]["changed"] is False
+
+    write_config(config_path, "providers: {}\ngateway_keys: {broken")
+    assert not await config_store.ConfigStore.reload()
+    assert config_store.ConfigStore.get() is before
+
+
+async def test_changed_keys_recompile_only_their_policies(tmp_path, monkeypatch):
+    reset_config_store()
+    config_path = tmp_path / "config.yaml"
+    monkeypatch.setattr(config_store, "CONFIG_PATH", config_path)
+    write_reload_config(config_path)
+    assert config_store.ConfigStore.load()
+    before = config_store.ConfigStore.get().auth
+    alice = before.get("alice-key")
+    before.model_denied(alice, "openai", "gpt-ok")
+    before.model_denied(before.get("bob-key"), "openai", "gpt-ok")
+
+    write_reload_config(config_path, bob="robert")
+    assert await config_store.ConfigStore.reload()
+    after = config_store.ConfigStore.get().auth
+
+    assert after is not before
+    # alice's decision carried over, bob's was dropped
+    assert list(after._decisions) == list(before._decisions)[:1]
+    assert after.get("alice-key") is alice
+    assert after.get("bob-key").key.owner == "robert"
+
+
+async def test_on_reload_rebuilds_only_touched_state(tmp_path, monkeypatch):
+    import backend.main as main_module
+
+    reset_config_store()
+    config_path = tmp_path / "config.yaml"
+    monkeypatch.setattr(config_store, "CONFIG_PATH", config_path)
+    write_reload_config(config_path)
+    assert config_store.ConfigStore.load()
+
+    calls = []
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def __getattr__(self, method):
+            def record(*args):
+                calls.append(f"{self.name}.{method}")
+                return asyncio.sleep(0, []) if self.name == "UPSTREAM_POOL" else None
+
+            return record
+
+    for name in (
+        "RESPONSE_CACHE",
+        "EMBEDDING_CACHE",
+        "RATE_LIMITER",
+        "KEY_STORE",
+        "UPSTREAM_POOL",
+        "UPSTREAM_BALANCER",
+        "UPSTREAM_CREDENTIALS",
+        "SCHEDULER",
+    ):
+        monkeypatch.setattr(main_module, name, Recorder(name))
+
+    write_reload_config(config_path, cache="true")
+    assert await config_store.ConfigStore.reload(main_module.on_config_reload)
+    assert calls == ["RESPONSE_CACHE.configure"]
+
+    calls.clear()
+    write_reload_config(config_path, cache="true", other_url="http://moved")
+    assert await config_store.ConfigStore.reload(main_module.on_config_reload)
+    assert calls == [
+        "UPSTREAM_POOL.sync",
+        "UPSTREAM_BALANCER.sync",
+        "UPSTREAM_CREDENTIALS.sync",
+        "SCHEDULER.sync",
+    ]
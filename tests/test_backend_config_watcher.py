@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+import backend.config.config_watcher as config_watcher
+from backend.config import config_store, watch_config_file
+
+CONFIG = """
+providers:
+  openai:
+    base_url: "http://example.com"
+    api_key: "k"
+    allowed_models: ["{model}"]
+gateway_keys: {{}}
+""".lstrip()
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watched(request, tmp_path, monkeypatch):
+    if request.param == "polling":
+
+        def unavailable(directory):
+            raise OSError("no inotify here")
+
+        monkeypatch.setattr(config_watcher, "Inotify", unavailable)
+        monkeypatch.setattr(config_watcher, "POLL_INTERVAL", 0.02)
+    elif not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux-only")
+    monkeypatch.setattr(config_watcher, "DEBOUNCE", 0.1)
+
+    path = tmp_path / "config.yaml"
+    path.write_text(CONFIG.format(model="m0"))
+    monkeypatch.setattr(config_store, "CONFIG_PATH", path)
+    config_store.ConfigStore._current = None
+    config_store.ConfigStore._last_error = None
+    assert config_store.ConfigStore.load()
+    return path
+
+
+def allowed_models():
+    return config_store.ConfigStore.get().config.providers["openai"].allowed_models
+
+
+async def start_watcher(reloads: list) -> asyncio.Task:
+    async def on_reload():
+        reloads.append(allowed_models()[0])
+
+    task = asyncio.create_task(watch_config_file(on_reload=on_reload))
+    await asyncio.sleep(0.05)  # watch established
+    return task
+
+
+def atomic_write(path: Path, text: str):
+    tmp = path.with_name(".config.yaml.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+async def test_burst_of_writes_reloads_once(watched):
+    reloads = []
+    task = await start_watcher(reloads)
+    # A half-written file inside the burst never gets loaded
+    for i in range(1, 6):
+        watched.write_text(CONFIG.format(model=f"m{i}")[: 40 if i == 3 else None])
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.4)
+    task.cancel()
+
+    assert reloads == ["m5"]
+    assert config_store.ConfigStore.status()["last_error"] is None
+
+
+async def test_same_content_does_not_reload(watched):
+    reloads = []
+    task = await start_watcher(reloads)
+    watched.write_text(watched.read_text())
+    os.utime(watched)
+    await asyncio.sleep(0.4)
+    task.cancel()
+
+    assert reloads == []
+
+
+async def test_atomic_replace_is_picked_up(watched):
+    reloads = []
+    task = await start_watcher(reloads)
+    atomic_write(watched, CONFIG.format(model="renamed"))
+    await asyncio.sleep(0.4)
+    atomic_write(watched, CONFIG.format(model="again"))
+    await asyncio.sleep(0.4)
+    task.cancel()
+
+    assert reloads == ["renamed", "again"]
+    assert allowed_models() == ["again"]
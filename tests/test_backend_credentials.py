@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+
+import backend.proxy as proxy_module
+from backend.config import ProviderConfigModel
+from backend.proxy import forward_request
+from backend.upstream import CredentialPool, credential_id
+from backend.upstream.credentials import parse_reset
+
+from fakes import FakePool, FakeResponse, FakeSession, FakeUsageSink
+
+
+def pool_with(*keys, **kwargs):
+    pool = CredentialPool()
+    pool.sync(
+        {
+            "openai": ProviderConfigModel(
+                base_url="http://upstream",
+                api_keys=list(keys),
+                allowed_models=["*"],
+                **kwargs,
+            )
+        }
+    )
+    return pool
+
+
+def use(pool):
+    credential = pool.acquire("openai")
+    pool.release(credential)
+    return credential.api_key
+
+
+def test_rotates_least_recently_used_without_headers():
+    pool = pool_with("k1", "k2", "k3")
+    assert [use(pool) for _ in range(4)] == ["k1", "k2", "k3", "k1"]
+
+
+def test_prefers_key_with_most_reported_headroom():
+    pool = pool_with("k1", "k2")
+    k1, k2 = pool.credentials["openai"]
+    pool.observe(
+        k1,
+        200,
+        {"x-ratelimit-remaining-requests": "10", "x-ratelimit-limit-requests": "100"},
+    )
+    pool.observe(
+        k2,
+        200,
+        {
+            "x-ratelimit-remaining-requests": "90",
+            "x-ratelimit-limit-requests": "100",
+            "x-ratelimit-remaining-tokens": "5000",
+            "x-ratelimit-limit-tokens": "10000",
+            "x-ratelimit-reset-tokens": "6m0s",
+        },
+    )
+    assert k2.headroom == 0.5
+    assert [use(pool) for _ in range(3)] == ["k2", "k2", "k2"]
+
+
+def test_rate_limited_key_cools_down():
+    pool = pool_with("k1", "k2", credential_cooldown=30)
+    k1, k2 = pool.credentials["openai"]
+    pool.observe(k1, 429, {"retry-after": "20"})
+    pool.observe(k2, 429, {})
+
+    assert k1.cooling and k2.cooling
+    # Everything is resting: use the key that comes back first.
+    assert use(pool) == "k1"
+    assert pool.stats()["openai"][1]["rate_limited"] == 1
+
+
+def test_parse_reset_formats():
+    assert parse_reset("1m30.5s") == 90.5
+    assert parse_reset("20ms") == 0.02
+    assert parse_reset("2999-01-01T00:00:00Z") > 0
+    assert parse_reset("soon") is None
+
+
+def test_provider_needs_a_key():
+    with pytest.raises(ValueError):
+        ProviderConfigModel(base_url="http://upstream", allowed_models=["*"])
+
+
+@pytest.mark.asyncio
+async def test_proxy_moves_off_a_rate_limited_key(monkeypatch):
+    usage_body = b'{"usage":{"total_tokens":3}}'
+    session = FakeSession(
+        FakeResponse(429, {"retry-after": "60"}, usage_body),
+        FakeResponse(200, body=usage_body),
+    )
+    usage = FakeUsageSink()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", FakePool(session))
+    monkeypatch.setattr(proxy_module, "UPSTREAM_CREDENTIALS", pool_with("k1", "k2"))
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+
+    for _ in range(3):
+        request = SimpleNamespace(
+            method="POST",
+            headers={"Authorization": "Bearer gateway-key"},
+            query_params={},
+            state=SimpleNamespace(owner="alice", model="gpt-ok", stream=False),
+            path_params={"provider": "openai"},
+        )
+        await forward_request(
+            request, "http://upstream/v1/chat", "unused", b'{"model":"gpt-ok"}'
+        )
+
+    # k1 would be least recently used for the third request, but it is resting.
+    keys = [sent["headers"]["Authorization"] for sent in session.requests]
+    assert keys == ["Bearer k1", "Bearer k2", "Bearer k2"]
+    assert [r.credential_id for r in usage.records] == [
+        credential_id("k1"),
+        credential_id("k2"),
+        credential_id("k2"),
+    ]
@@ -0,0 +1,237 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import backend.proxy as proxy_module
+from backend.batching import EmbeddingBatcher, batch_inputs, proportional_split
+from backend.config import EmbeddingBatchConfigModel
+from backend.proxy import forward_request, serve_batched_response
+
+from fakes import FakePool, FakeResponse, FakeUsageSink
+
+
+def test_batch_inputs_shapes():
+    assert batch_inputs({"input": "hello"}) == ["hello"]
+    assert batch_inputs({"input": ["a", "b"]}) == ["a", "b"]
+    assert batch_inputs({"input": [1, 2, 3]}) == [[1, 2, 3]]
+    assert batch_inputs({"input": [[1, 2], [3]]}) == [[1, 2], [3]]
+    assert batch_inputs({"input": []}) is None
+    assert batch_inputs({"input": [{"x": 1}]}) is None
+    assert batch_inputs(None) is None
+
+
+def test_proportional_split_adds_up():
+    assert proportional_split(10, [1, 1, 1]) == [4, 3, 3]
+    assert proportional_split(7, [5, 2]) == [5, 2]
+    assert sum(proportional_split(101, [3, 7, 11, 13])) == 101
+    assert proportional_split(None, [1, 2]) == [None, None]
+
+
+URL = "http://upstream/v1/embeddings"
+
+
+class EmbeddingSession:
+    """Fake upstream that embeds each input as [index, len(input)].
+
+    Inputs equal to "bad" are refused with a 400, as OpenAI does for an
+    input over the model's context.
+    """
+
+    def __init__(self):
+        self.bodies = []
+
+    async def request(self, method, url, headers=None, params=None, data=None):
+        payload = json.loads(data)
+        self.bodies.append(payload)
+        inputs = payload["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if "bad" in inputs:
+            return FakeResponse(400, body=b'{"error":{"message":"too long"}}')
+        tokens = sum(len(i) for i in inputs)
+        return FakeResponse(
+            headers={"content-length": "1"},
+            body=json.dumps(
+                {
+                    "object": "list",
+                    "model": payload["model"],
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": [i, len(x)]}
+                        for i, x in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                }
+            ).encode(),
+        )
+
+
+def embeddings_request(owner):
+    return SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer gateway-key"},
+        query_params={},
+        state=SimpleNamespace(owner=owner, model="emb", stream=False),
+        path_params={"provider": "openai"},
+    )
+
+
+def use_upstream(monkeypatch):
+    session = EmbeddingSession()
+    usage = FakeUsageSink()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", FakePool(session))
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+    return session, usage
+
+
+async def call(batcher, cfg, owner, text):
+    # What the gateway route does for an embeddings request.
+    request = embeddings_request(owner)
+    payload = {"model": "emb", "input": text}
+    body = json.dumps(payload).encode()
+    batch, member, leads = batcher.join("openai", payload, batch_inputs(payload), cfg)
+    if leads:
+        batcher.launch(
+            batch,
+            cfg,
+            lambda combined: forward_request(request, URL, "k", combined, batch=batch),
+        )
+    response = await serve_batched_response(request, "openai", member, body, 0.0)
+    if response is None:
+        response = await forward_request(request, URL, "k", body)
+    return response
+
+
+@pytest.mark.asyncio
+async def test_concurrent_embeddings_share_one_upstream_call(monkeypatch):
+    session, usage = use_upstream(monkeypatch)
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True, window_ms=20, max_inputs=16)
+
+    responses = await asyncio.gather(
+        call(batcher, cfg, "alice", "aaaaaa"),
+        call(batcher, cfg, "bob", ["bb", "bb"]),
+        call(batcher, cfg, "carol", "c" * 10),
+    )
+
+    assert session.bodies == [
+        {"model": "emb", "input": ["aaaaaa", "bb", "bb", "c" * 10]}
+    ]
+    bodies = [json.loads(r.body) for r in responses]
+    assert [[d["embedding"] for d in b["data"]] for b in bodies] == [
+        [[0, 6]],
+        [[1, 2], [2, 2]],
+        [[3, 10]],
+    ]
+    assert [[d["index"] for d in b["data"]] for b in bodies] == [[0], [0, 1], [0]]
+    assert [b["usage"]["total_tokens"] for b in bodies] == [6, 4, 10]
+    # The upstream length described the combined body, not each slice.
+    assert responses[0].headers["content-length"] == str(len(responses[0].body))
+
+    by_owner = {r.owner: r for r in usage.records}
+    assert {o: r.total_tokens for o, r in by_owner.items()} == {
+        "alice": 6,
+        "bob": 4,
+        "carol": 10,
+    }
+    assert all(r.batch_size == 3 for r in usage.records)
+    # Each caller's own body, not the combined one
+    assert by_owner["alice"].bytes_in == len(b'{"model": "emb", "input": "aaaaaa"}')
+    assert batcher.stats() == {"open": 0, "batches": 1, "batched_requests": 2}
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_before_window():
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True, window_ms=10_000, max_inputs=2)
+    payload = {"model": "emb", "input": "x"}
+
+    batch, _, leads = batcher.join("openai", payload, ["x"], cfg)
+    assert leads
+    collecting = asyncio.create_task(batcher.collect(batch, cfg))
+    _, _, leads = batcher.join("openai", payload, ["y"], cfg)
+    assert not leads
+    await asyncio.wait_for(collecting, 1)
+
+    # A sealed batch is never joined; the next caller leads a new one.
+    other, _, leads = batcher.join("openai", payload, ["z"], cfg)
+    assert leads and other is not batch
+
+
+@pytest.mark.asyncio
+async def test_different_parameters_do_not_share_a_batch():
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True)
+    _, _, first = batcher.join("openai", {"model": "a", "input": "x"}, ["x"], cfg)
+    _, _, second = batcher.join(
+        "openai", {"model": "a", "input": "x", "dimensions": 64}, ["x"], cfg
+    )
+    assert first and second
+
+
+@pytest.mark.asyncio
+async def test_text_and_token_inputs_do_not_share_a_batch():
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True)
+    _, _, first = batcher.join("openai", {"model": "a"}, ["hello"], cfg)
+    _, _, second = batcher.join("openai", {"model": "a"}, [[1, 2, 3]], cfg)
+    _, _, third = batcher.join("openai", {"model": "a"}, [[4]], cfg)
+    assert first and second and not third
+
+
+@pytest.mark.asyncio
+async def test_refused_batch_is_sent_one_by_one(monkeypatch):
+    session, usage = use_upstream(monkeypatch)
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True, window_ms=20)
+
+    good, bad = await asyncio.gather(
+        call(batcher, cfg, "alice", "good"), call(batcher, cfg, "bob", "bad")
+    )
+
+    # One caller's bad input does not fail the other
+    assert (good.status_code, bad.status_code) == (200, 400)
+    assert json.loads(good.body)["data"][0]["embedding"] == [0, 4]
+    assert [b["input"] for b in session.bodies[1:]] in (
+        ["good", "bad"],
+        ["bad", "good"],
+    )
+    assert session.bodies[0]["input"] == ["good", "bad"]
+
+
+@pytest.mark.asyncio
+async def test_batch_survives_its_first_caller_leaving(monkeypatch):
+    session, usage = use_upstream(monkeypatch)
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True, window_ms=20)
+
+    first = asyncio.create_task(call(batcher, cfg, "alice", "aaaa"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(call(batcher, cfg, "bob", "bb"))
+    await asyncio.sleep(0)
+    first.cancel()  # alice's client disconnects during the window
+
+    response = await second
+    assert response.status_code == 200
+    assert json.loads(response.body)["data"][0]["embedding"] == [1, 2]
+    assert session.bodies == [{"model": "emb", "input": ["aaaa", "bb"]}]
+    assert [r.owner for r in usage.records] == ["bob"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [RuntimeError("boom"), asyncio.CancelledError()])
+async def test_followers_share_leader_failure(error):
+    batcher = EmbeddingBatcher()
+    cfg = EmbeddingBatchConfigModel(enabled=True)
+    batch, _, _ = batcher.join("openai", {"model": "a", "input": "x"}, ["x"], cfg)
+    _, member, _ = batcher.join("openai", {"model": "a", "input": "y"}, ["y"], cfg)
+
+    # A cancelled leader is an upstream failure for the others, not their own
+    # cancellation
+    batch.fail(error)
+    with pytest.raises(Exception) as info:
+        await serve_batched_response(
+            embeddings_request("bob"), "openai", member, b"{}", 0.0
+        )
+    assert info.value.status_code == 502
@@ -0,0 +1,161 @@
+import base64
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import backend.proxy as proxy_module
+from backend.cache import EmbeddingCache
+from backend.config import EmbeddingCacheConfigModel
+from backend.proxy import forward_request
+
+from fakes import FakePool, FakeResponse, FakeUsageSink
+
+
+def cache_with(tmp_path, **kwargs):
+    cache = EmbeddingCache()
+    cache.configure(
+        EmbeddingCacheConfigModel(enabled=True, path=str(tmp_path), **kwargs)
+    )
+    return cache
+
+
+def test_vectors_are_kept_exactly_by_default(tmp_path):
+    cache = cache_with(tmp_path)
+    vector = np.array([0.1, -1 / 3, 1e-8], dtype=np.float32)
+    cache.put("k", vector)
+
+    assert np.array_equal(cache.get("k"), vector)
+    assert cache.stats()["bytes"] == 3 * 4
+
+
+def test_vectors_round_trip_through_the_store(tmp_path):
+    cache = cache_with(tmp_path, dtype="float16")
+    vector = np.array([0.25, -1.5, 3.0], dtype=np.float32)
+    cache.put("k", vector)
+
+    assert np.array_equal(cache.get("k"), vector)
+    assert cache.stats()["bytes"] == 3 * 2
+    assert list(tmp_path.iterdir())  # memory-mapped file, not JSON
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = cache_with(tmp_path, max_entries=2)
+    cache.put("a", np.ones(4))
+    cache.put("b", np.ones(4) * 2)
+    cache.get("a")
+    cache.put("c", np.ones(4) * 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a")[0] == 1 and cache.get("c")[0] == 3
+    # The evicted row was reused, not appended.
+    assert cache.stats()["bytes"] == 2 * 4 * 4
+
+
+def test_merge_restores_original_order(tmp_path):
+    cache = cache_with(tmp_path, dtype="float32")
+    payload = {"model": "emb", "input": ["a", "b", "c"]}
+    first = cache.lookup("openai", payload, ["b"])
+    first.merge(
+        200,
+        json.dumps({"data": [{"index": 0, "embedding": [2.0, 2.0]}]}).encode(),
+    )
+
+    fill = cache.lookup("openai", payload, ["a", "b", "c"])
+    assert fill.misses == [0, 2]
+    merged = json.loads(
+        fill.merge(
+            200,
+            json.dumps(
+                {
+                    "object": "list",
+                    "data": [
+                        {"object": "embedding", "index": 1, "embedding": [3.0, 3.0]},
+                        {"object": "embedding", "index": 0, "embedding": [1.0, 1.0]},
+                    ],
+                    "usage": {"prompt_tokens": 2, "total_tokens": 2},
+                }
+            ).encode(),
+        )
+    )
+    assert [d["index"] for d in merged["data"]] == [0, 1, 2]
+    assert [d["embedding"] for d in merged["data"]] == [[1, 1], [2, 2], [3, 3]]
+    assert merged["usage"]["total_tokens"] == 2
+
+
+def test_keys_include_model_and_dimensions(tmp_path):
+    cache = cache_with(tmp_path)
+    cache.put(cache.lookup("openai", {"model": "emb"}, ["x"]).keys[0], np.ones(2))
+    assert cache.lookup("openai", {"model": "emb"}, ["x"]).complete
+    assert not cache.lookup("openai", {"model": "other"}, ["x"]).complete
+    assert not cache.lookup("openai", {"model": "emb", "dimensions": 2}, ["x"]).complete
+
+
+def test_base64_hits_are_encoded_like_upstream(tmp_path):
+    cache = cache_with(tmp_path, dtype="float32")
+    payload = {"model": "emb", "encoding_format": "base64"}
+    encoded = base64.b64encode(np.array([0.5, 1.5], dtype="<f4").tobytes()).decode()
+    cache.lookup("openai", payload, ["x"]).merge(
+        200, json.dumps({"data": [{"index": 0, "embedding": encoded}]}).encode()
+    )
+
+    body = json.loads(cache.lookup("openai", payload, ["x"]).response("emb"))
+    assert body["data"][0]["embedding"] == encoded
+
+
+class EmbeddingSession:
+    def __init__(self):
+        self.inputs = []
+
+    async def request(self, method, url, headers=None, params=None, data=None):
+        inputs = json.loads(data)["input"]
+        self.inputs.append(inputs)
+        return FakeResponse(
+            headers={"content-length": "7"},
+            body=json.dumps(
+                {
+                    "object": "list",
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": [len(x)]}
+                        for i, x in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": len(inputs), "total_tokens": 1},
+                }
+            ).encode(),
+        )
+
+
+@pytest.mark.asyncio
+async def test_only_misses_are_forwarded(monkeypatch, tmp_path):
+    cache = cache_with(tmp_path)
+    session = EmbeddingSession()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", FakePool(session))
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", FakeUsageSink())
+
+    async def embed(inputs):
+        # What the gateway route does before forwarding.
+        payload = {"model": "emb", "input": inputs}
+        fill = cache.lookup("openai", payload, inputs)
+        body = json.dumps({**payload, "input": [inputs[i] for i in fill.misses]})
+        request = SimpleNamespace(
+            method="POST",
+            headers={"Authorization": "Bearer gateway-key"},
+            query_params={},
+            state=SimpleNamespace(owner="alice", model="emb", stream=False),
+            path_params={"provider": "openai"},
+        )
+        response = await forward_request(
+            request,
+            "http://upstream/v1/embeddings",
+            "k",
+            body.encode(),
+            embedding_fill=fill,
+        )
+        assert response.headers["content-length"] == str(len(response.body))
+        return [d["embedding"] for d in json.loads(response.body)["data"]]
+
+    assert await embed(["a", "bb"]) == [[1], [2]]
+    assert await embed(["ccc", "a", "dddd", "bb"]) == [[3], [1], [4], [2]]
+    assert session.inputs == [["a", "bb"], ["ccc", "dddd"]]
+    assert cache.stats()["hits"] == 2
@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import backend.proxy as proxy_module
+from backend.config import HedgeConfigModel
+from backend.proxy import forward_request
+from backend.upstream import Hedger, race_hedged
+
+from fakes import FakePool, FakeResponse, FakeUsageSink
+
+
+def test_hedger_waits_for_samples_and_clamps_delay():
+    hedger = Hedger()
+    cfg = HedgeConfigModel(enabled=True, min_samples=5, percentile=90, max_delay_ms=500)
+    assert hedger.delay_for("openai", False, cfg) is None
+
+    for latency in (100, 120, 130, 150, 900):
+        hedger.record("openai", False, latency)
+    assert hedger.delay_for("openai", False, cfg) == 0.5
+    assert hedger.delay_for("openai", True, cfg) is None
+    assert hedger.delay_for("openai", False, HedgeConfigModel()) is None
+
+
+def test_hedge_budget_limits_extra_requests():
+    hedger = Hedger()
+    cfg = HedgeConfigModel(enabled=True, budget_ratio=0.5)
+    hedger.delay_for("openai", False, cfg)
+    assert hedger.try_hedge("openai") is False
+    hedger.delay_for("openai", False, cfg)
+    assert hedger.try_hedge("openai") is True
+    assert hedger.try_hedge("openai") is False
+
+
+@pytest.mark.asyncio
+async def test_race_prefers_fast_hedge_and_cancels_slow_original():
+    cancelled = []
+
+    async def attempt(index):
+        try:
+            await asyncio.sleep(1.0 if index == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return f"answer-{index}"
+
+    result, winner, hedged = await race_hedged(
+        attempt, lambda r: None, delay=0.01, allow_hedge=lambda: True
+    )
+    await asyncio.sleep(0)
+
+    assert (result, winner, hedged) == ("answer-1", 1, True)
+    assert cancelled == [0]
+
+
+@pytest.mark.asyncio
+async def test_race_without_budget_waits_for_original():
+    async def attempt(index):
+        await asyncio.sleep(0.02)
+        return index
+
+    assert await race_hedged(
+        attempt, lambda r: None, delay=0.001, allow_hedge=lambda: False
+    ) == (0, 0, False)
+
+
+class SlowFirstSession:
+    def __init__(self):
+        self.urls = []
+
+    async def request(self, method, url, headers=None, params=None, data=None):
+        self.urls.append(url)
+        if len(self.urls) == 1:
+            await asyncio.sleep(1.0)
+        return FakeResponse(body=b'{"usage":{"prompt_tokens":1,"total_tokens":1}}')
+
+
+@pytest.mark.asyncio
+async def test_forward_request_records_winning_hedge(monkeypatch):
+    session = SlowFirstSession()
+    usage = FakeUsageSink()
+    hedger = Hedger()
+    for _ in range(20):
+        hedger.record("openai", False, 10)
+    hedger._budgets["openai"] = type(
+        "Budget", (), {"earn": lambda self, r: None, "try_spend": lambda self: True}
+    )()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", FakePool(session))
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+    monkeypatch.setattr(proxy_module, "UPSTREAM_HEDGER", hedger)
+
+    request = SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer k"},
+        query_params={},
+        state=SimpleNamespace(owner="alice", model="gpt-ok", stream=False),
+        path_params={"provider": "openai"},
+    )
+    response = await forward_request(
+        request=request,
+        target_url="http://upstream/v1/chat",
+        provider_api_key="provider-key",
+        body=b'{"model":"gpt-ok"}',
+        hedge=HedgeConfigModel(enabled=True, min_delay_ms=10),
+    )
+
+    assert response.status_code == 200
+    assert len(session.urls) == 2
+    record = usage.records[0]
+    assert record.hedged is True
+    assert record.hedge_winner == 1
+    assert hedger.stats() == {"hedges": 1, "hedge_wins": 1}
@@ -0,0 +1,205 @@
+import asyncio
+import sqlite3
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+import backend.auth as auth_module
+import backend.keystore.sqlite_store as sqlite_store
+from backend.auth import authenticate_and_authorize
+from backend.config import AuthIndex, GatewayKeyModel, KeyStoreConfigModel
+from backend.keystore import KeyStore
+
+
+def key(owner: str, models=("*",)) -> GatewayKeyModel:
+    return GatewayKeyModel(owner=owner, providers=["openai"], models=list(models))
+
+
+def open_store(path, **cfg) -> KeyStore:
+    store = KeyStore()
+    store.configure(KeyStoreConfigModel(path=str(path), **cfg))
+    return store
+
+
+class CountingDB:
+    """Wraps a connection to count the statements the store runs."""
+
+    def __init__(self, db):
+        self.db = db
+        self.statements = []
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        return self.db.execute(sql, *args)
+
+
+async def test_keys_are_stored_hashed_in_wal_mode(tmp_path):
+    path = tmp_path / "keys.db"
+    store = open_store(path)
+    store.put("gw_alice", key("alice"))
+
+    assert (await store.get("gw_alice")).key.owner == "alice"
+    assert await store.get("gw_bob") is None
+
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    names = [name for (name,) in db.execute("SELECT name FROM gateway_keys")]
+    assert len(names) == 1 and "gw_alice" not in names[0]
+    store.close()
+
+
+async def test_lookups_read_through_a_bounded_lru(tmp_path):
+    store = open_store(tmp_path / "keys.db", cache_size=1)
+    store.put_many((f"gw_{i}", key(f"owner-{i}")) for i in range(3))
+    counting = store._db = CountingDB(store._db)
+
+    for _ in range(3):
+        assert (await store.get("gw_0")).key.owner == "owner-0"
+        assert await store.get("gw_unknown") is None
+    assert len(counting.statements) == 2
+
+    await store.get("gw_1")  # evicts gw_0, the least recently used
+    await store.get("gw_0")
+    assert len(counting.statements) == 4
+    assert store.stats()["cached"] == 1
+
+
+async def test_unknown_tokens_do_not_evict_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "MAX_UNKNOWN", 3)
+    store = open_store(tmp_path / "keys.db", cache_size=2)
+    store.put("gw_alice", key("alice"))
+    counting = store._db = CountingDB(store._db)
+    assert (await store.get("gw_alice")).key.owner == "alice"
+
+    for i in range(10):
+        assert await store.get(f"gw_random_{i}") is None
+    assert len(store._unknown) == 3
+    assert (await store.get("gw_alice")).key.owner == "alice"
+    assert len(counting.statements) == 11
+
+
+async def test_stop_waits_for_the_poller(tmp_path):
+    store = open_store(tmp_path / "keys.db", poll_interval=0.01)
+    store.start()
+    watcher = store._watcher
+    await asyncio.sleep(0.05)
+
+    await store.stop()
+    assert watcher.done() and not store.enabled
+    assert store._fetch_changes(0) == []
+
+
+async def test_poll_applies_only_changed_keys(tmp_path):
+    path = tmp_path / "keys.db"
+    store = open_store(path)
+    writer = open_store(path)  # e.g. the CLI, in another process
+    writer.put_many((f"gw_{i}", key(f"owner-{i}")) for i in range(100))
+
+    assert (await store.get("gw_0")).key.owner == "owner-0"
+    assert (await store.get("gw_1")).key.owner == "owner-1"
+    assert await store.get("gw_new") is None
+
+    writer.put("gw_0", key("owner-0", models=["gpt-4o"]))
+    writer.delete("gw_1")
+    writer.put("gw_new", key("carol"))
+    writer.put("gw_50", key("not-cached"))
+
+    assert await store.poll() == 3
+    policy = await store.get("gw_0")
+    assert policy.models("gpt-4o") and not policy.models("o3")
+    assert await store.get("gw_1") is None
+    assert (await store.get("gw_new")).key.owner == "carol"
+    assert store.stats()["seq"] == 104
+    # Nothing new: nothing applied
+    assert await store.poll() == 0
+
+
+async def test_poll_reads_bulk_changes_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "MAX_CHANGES", 10)
+    path = tmp_path / "keys.db"
+    store = open_store(path)
+    assert await store.get("gw_99") is None
+
+    open_store(path).put_many((f"gw_{i}", key(f"owner-{i}")) for i in range(100))
+    assert await store.poll() == 1
+    assert (await store.get("gw_99")).key.owner == "owner-99"
+
+
+async def test_changed_key_gets_fresh_model_decisions(tmp_path):
+    path = tmp_path / "keys.db"
+    store = open_store(path)
+    index = AuthIndex({}, {"openai": ["*"]})
+    store.put("gw_alice", key("alice", models=["gpt-4o"]))
+    assert index.model_denied(await store.get("gw_alice"), "openai", "o3")
+
+    store.put("gw_alice", key("alice", models=["o3"]))
+    store._apply(store._fetch_changes(0))
+    assert index.model_denied(await store.get("gw_alice"), "openai", "o3") is None
+
+
+async def test_invalid_rows_are_ignored(tmp_path):
+    store = open_store(tmp_path / "keys.db")
+    store.put("gw_alice", key("alice"))
+    store._db.execute("UPDATE gateway_keys SET policy = '{\"owner\": 1}'")
+    assert await store.get("gw_alice") is None
+
+
+async def test_auth_falls_back_to_the_key_store(tmp_path, monkeypatch):
+    store = open_store(tmp_path / "keys.db")
+    store.put("gw_store", key("bob"))
+    monkeypatch.setattr(auth_module, "KEY_STORE", store)
+    index = AuthIndex({"gw_yaml": key("alice")}, {"openai": ["*"]})
+    app = FastAPI()
+
+    @app.post("/auth/{provider}")
+    async def auth_route(provider: str, request: Request):
+        await authenticate_and_authorize(request, provider, index)
+        return {"owner": request.state.owner}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        owners = [
+            await client.post(
+                "/auth/openai",
+                headers={"authorization": f"Bearer {token}"},
+                json={"model": "gpt-4o"},
+            )
+            for token in ("gw_yaml", "gw_store", "gw_nobody")
+        ]
+
+    assert [r.status_code for r in owners] == [200, 200, 403]
+    assert [r.json().get("owner") for r in owners[:2]] == ["alice", "bob"]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("keys", [20_000])
+async def test_key_store_benchmark(tmp_path, keys):
+    path = tmp_path / "keys.db"
+    start = time.perf_counter()
+    open_store(path).put_many((f"gw_{i:05d}", key(f"o{i}")) for i in range(keys))
+    imported = time.perf_counter() - start
+
+    store = open_store(path)
+    tokens = [f"gw_{i:05d}" for i in range(0, keys, keys // 1000)]
+    start = time.perf_counter()
+    for token in tokens:
+        await store.get(token)
+    cold = (time.perf_counter() - start) / len(tokens)
+    start = time.perf_counter()
+    for token in tokens:
+        await store.get(token)
+    warm = (time.perf_counter() - start) / len(tokens)
+
+    open_store(path).put("gw_00000", key("changed"))
+    start = time.perf_counter()
+    store._apply(store._fetch_changes(store._seq))
+    polled = time.perf_counter() - start
+
+    # No up-front load: a cold lookup is one indexed read
+    print(
+        f"{keys} keys: import {imported:.2f} s, lookup {cold * 1e6:.0f} us cold / "
+        f"{warm * 1e6:.1f} us cached, one-key poll {polled * 1e6:.0f} us"
+    )
+    assert (await store.get("gw_00000")).key.owner == "changed"
@@ -1,61 +1,19 @@
+import json
 from types import SimpleNamespace
 
 import pytest
+from fastapi import HTTPException
 
 import backend.proxy as proxy_module
 from backend.proxy import forward_request
+from backend.request_body import StreamedBody
+from backend.upstream import UpstreamSessionPool
 
-
-class FakeResponse:
-    def __init__(self, status: int, headers: dict[str, str], body: bytes):
-        self.status = status
-        self.headers = headers
-        self._body = body
-
-    async def read(self):
-        return self._body
-
-
-class FakeContext:
-    def __init__(self, response: FakeResponse):
-        self._response = response
-
-    async def __aenter__(self):
-        return self._response
-
-    async def __aexit__(self, exc_type, exc, tb):
-        return False
-
-
-class FakeSession:
-    def __init__(self, response: FakeResponse, capture: dict, **kwargs):
-        self._response = response
-        self._capture = capture
-        self._capture["session_kwargs"] = kwargs
-
-    def request(self, method, url, headers=None, params=None, data=None):
-        self._capture["method"] = method
-        self._capture["url"] = url
-        self._capture["headers"] = dict(headers or {})
-        self._capture["params"] = params
-        self._capture["data"] = data
-        return FakeContext(self._response)
-
-    async def close(self):
-        self._capture["closed"] = True
-
-
-class FakeUsageSink:
-    def __init__(self):
-        self.records = []
-
-    async def record(self, usage):
-        self.records.append(usage)
+from fakes import FakePool, FakeResponse, FakeSession, FakeUsageSink
 
 
 @pytest.mark.asyncio
 async def test_forward_request_strips_hop_headers_and_records_usage(monkeypatch):
-    capture = {}
     response_body = (
         b'{"usage":{"prompt_tokens":1,"completion_tokens":2,"total_tokens":3}}'
     )
@@ -65,11 +23,10 @@ async def test_forward_request_strips_hop_headers_and_records_usage(monkeypatch)
         body=response_body,
     )
 
-    def fake_client_session(**kwargs):
-        return FakeSession(fake_response, capture, **kwargs)
-
+    session = FakeSession(fake_response)
+    fake_pool = FakePool(session)
     fake_usage = FakeUsageSink()
-    monkeypatch.setattr(proxy_module.aiohttp, "ClientSession", fake_client_session)
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", fake_pool)
     monkeypatch.setattr(proxy_module, "USAGE_SINK", fake_usage)
 
     request = SimpleNamespace(
@@ -96,15 +53,17 @@ async def test_forward_request_strips_hop_headers_and_records_usage(monkeypatch)
     assert response.status_code == 200
     assert response.body == response_body
     assert response.headers.get("x-upstream") == "1"
-    assert capture["method"] == "POST"
-    assert capture["url"] == "http://upstream/v1/chat"
-    assert capture["params"] == {}
-    assert capture["data"] == body
-    assert capture["headers"]["Authorization"] == "Bearer provider-key"
-    assert "Content-Length" not in capture["headers"]
-    assert "Connection" not in capture["headers"]
-    assert "Authorization" in capture["headers"]
-    assert capture.get("closed") is True
+    (sent,) = session.requests
+    assert sent["method"] == "POST"
+    assert sent["url"] == "http://upstream/v1/chat"
+    assert sent["params"] == {}
+    assert sent["data"] == body
+    assert sent["headers"]["Authorization"] == "Bearer provider-key"
+    assert "Content-Length" not in sent["headers"]
+    assert "Connection" not in sent["headers"]
+    assert "Authorization" in sent["headers"]
+    assert fake_pool.providers == ["openai"]
+    assert fake_pool.released == 1
 
     assert len(fake_usage.records) == 1
     record = fake_usage.records[0]
@@ -117,3 +76,178 @@ async def test_forward_request_strips_hop_headers_and_records_usage(monkeypatch)
     assert record.prompt_tokens == 1
     assert record.completion_tokens == 2
     assert record.total_tokens == 3
+
+
+@pytest.mark.asyncio
+async def test_forward_request_streaming_records_sse_usage(monkeypatch):
+    stream_body = (
+        b'data: {"choices":[{"delta":{"content":"hi"}}],"usage":null}\n\n'
+        b'data: {"choices":[],"usage":'
+        b'{"prompt_tokens":4,"completion_tokens":1,"total_tokens":5}}\n\n'
+        b"data: [DONE]\n\n"
+    )
+    fake_response = FakeResponse(
+        status=200,
+        headers={"content-type": "text/event-stream"},
+        body=stream_body,
+    )
+    fake_pool = FakePool(FakeSession(fake_response))
+    fake_usage = FakeUsageSink()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", fake_pool)
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", fake_usage)
+
+    request = SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer client-key"},
+        query_params={},
+        state=SimpleNamespace(owner="alice", model="gpt-ok", stream=True),
+        path_params={"provider": "openai"},
+    )
+
+    response = await forward_request(
+        request=request,
+        target_url="http://upstream/v1/chat",
+        provider_api_key="provider-key",
+        body=b'{"model":"gpt-ok","stream":true}',
+    )
+    received = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert received == stream_body
+    assert fake_pool.released == 1
+    record = fake_usage.records[0]
+    assert record.bytes_out == len(stream_body)
+    assert (record.prompt_tokens, record.completion_tokens, record.total_tokens) == (
+        4,
+        1,
+        5,
+    )
+
+
+@pytest.mark.asyncio
+async def test_forward_request_passthrough_streams_json_and_reads_tail_usage(
+    monkeypatch,
+):
+    response_body = (
+        b'{"data":[{"embedding":[0.1,0.2]}],'
+        b'"usage":{"prompt_tokens":6,"total_tokens":6}}'
+    )
+    fake_response = FakeResponse(
+        status=200,
+        headers={"content-type": "application/json"},
+        body=response_body,
+    )
+    fake_usage = FakeUsageSink()
+    monkeypatch.setattr(
+        proxy_module,
+        "UPSTREAM_POOL",
+        FakePool(FakeSession(fake_response)),
+    )
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", fake_usage)
+
+    request = SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer client-key"},
+        query_params={},
+        state=SimpleNamespace(owner="alice", model="emb", stream=False),
+        path_params={"provider": "openai"},
+    )
+
+    response = await forward_request(
+        request=request,
+        target_url="http://upstream/v1/embeddings",
+        provider_api_key="provider-key",
+        body=b'{"model":"emb","input":"x"}',
+        response_passthrough=True,
+    )
+    received = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert received == response_body
+    record = fake_usage.records[0]
+    assert record.bytes_out == len(response_body)
+    assert (record.prompt_tokens, record.completion_tokens, record.total_tokens) == (
+        6,
+        None,
+        6,
+    )
+
+
+@pytest.fixture
+async def echo_upstream():
+    from aiohttp import web
+
+    async def echo(request):
+        data = await request.read()
+        return web.json_response(
+            {
+                "size": len(data),
+                "chunked": request.headers.get("Content-Length") is None,
+            }
+        )
+
+    app = web.Application()
+    app.router.add_post("/upload", echo)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    yield f"http://127.0.0.1:{port}"
+    await runner.cleanup()
+
+
+def upload_request(total: int, content_length: bool = True):
+    async def stream():
+        for _ in range(total // 1000):
+            yield b"\x00" * 1000
+
+    headers = {"Authorization": "Bearer client-key", "Content-Type": "audio/wav"}
+    if content_length:
+        headers["content-length"] = str(total)
+    return SimpleNamespace(
+        method="POST",
+        headers=headers,
+        query_params={},
+        state=SimpleNamespace(owner="alice", model=None, stream=False),
+        path_params={"provider": "openai"},
+        stream=stream,
+    )
+
+
+@pytest.mark.asyncio
+async def test_forward_request_streams_upload_body(monkeypatch, echo_upstream):
+    fake_usage = FakeUsageSink()
+    pools = UpstreamSessionPool()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", pools)
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", fake_usage)
+    request = upload_request(5000)
+
+    response = await forward_request(
+        request=request,
+        target_url=f"{echo_upstream}/upload",
+        provider_api_key="provider-key",
+        body=StreamedBody(request),
+    )
+    await pools.close()
+
+    assert response.status_code == 200
+    assert json.loads(response.body) == {"size": 5000, "chunked": False}
+    assert fake_usage.records[0].bytes_in == 5000
+
+
+@pytest.mark.asyncio
+async def test_forward_request_rejects_oversized_upload(monkeypatch, echo_upstream):
+    pools = UpstreamSessionPool()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", pools)
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", FakeUsageSink())
+    request = upload_request(5000, content_length=False)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await forward_request(
+            request=request,
+            target_url=f"{echo_upstream}/upload",
+            provider_api_key="provider-key",
+            body=StreamedBody(request, max_bytes=2000),
+        )
+    await pools.close()
+
+    assert exc_info.value.status_code == 413
@@ -0,0 +1,152 @@
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+import backend.auth as auth_module
+import backend.ratelimit.shared_table as shared_table
+from backend.auth import authenticate_and_authorize
+from backend.config import AuthIndex, GatewayKeyModel, RateLimitConfigModel
+from backend.ratelimit import (
+    RateLimiter,
+    RateLimitUsageWriter,
+    SharedCounterTable,
+    key_id_for,
+)
+from backend.usage import UsageRecord
+
+
+def limiter_at(path) -> RateLimiter:
+    limiter = RateLimiter()
+    limiter.configure(RateLimitConfigModel(state_path=str(path), slots=64))
+    return limiter
+
+
+def test_rpm_allows_a_minute_of_burst_then_spaces_requests(tmp_path):
+    limiter = limiter_at(tmp_path / "rl")
+    key = key_id_for("gw_alice")
+
+    assert limiter.check(key, rpm=2, tpm=None) is None
+    assert limiter.check(key, rpm=2, tpm=None) is None
+    wait = limiter.check(key, rpm=2, tpm=None)
+    assert 29 < wait <= 30
+    assert limiter.check(key_id_for("gw_bob"), rpm=2, tpm=None) is None
+    assert limiter.stats()["limited"] == 1
+
+
+def test_workers_mapping_the_same_file_share_limits(tmp_path):
+    # Each uvicorn worker maps the state file on its own.
+    worker_a = limiter_at(tmp_path / "rl")
+    worker_b = limiter_at(tmp_path / "rl")
+    key = key_id_for("gw_alice")
+
+    assert worker_a.check(key, rpm=1, tpm=None) is None
+    assert worker_b.check(key, rpm=1, tpm=None) is not None
+
+
+@pytest.mark.asyncio
+async def test_tpm_is_charged_from_recorded_usage(tmp_path):
+    limiter = limiter_at(tmp_path / "rl")
+    writer = RateLimitUsageWriter(limiter)
+    key = key_id_for("gw_alice")
+
+    assert limiter.check(key, rpm=None, tpm=100) is None
+    await writer.write(
+        UsageRecord(
+            timestamp=time.time(),
+            owner="alice",
+            provider="openai",
+            model="gpt-ok",
+            status_code=200,
+            duration_ms=5,
+            bytes_in=1,
+            bytes_out=1,
+            key_id=key,
+            prompt_tokens=50,
+            completion_tokens=100,
+        )
+    )
+    # 150 tokens against 100/min: blocked for roughly another 30 seconds
+    wait = limiter.check(key, rpm=None, tpm=100)
+    assert 29 < wait <= 30
+
+
+@pytest.mark.asyncio
+async def test_auth_rejects_over_limit_with_retry_after(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth_module, "RATE_LIMITER", limiter_at(tmp_path / "rl"))
+    gateway_keys = {
+        "test-key": GatewayKeyModel(
+            owner="alice", providers=["openai"], models=["*"], rpm=1
+        )
+    }
+    app = FastAPI()
+
+    @app.post("/auth/{provider}")
+    async def auth_route(provider: str, request: Request):
+        await authenticate_and_authorize(
+            request, provider, AuthIndex(gateway_keys, {"openai": ["*"]})
+        )
+        return {"key_id": request.state.key_id}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {"authorization": "Bearer test-key"}
+        first = await client.post("/auth/openai", headers=headers, json={})
+        second = await client.post("/auth/openai", headers=headers, json={})
+
+    assert first.json() == {"key_id": key_id_for("test-key")}
+    assert second.status_code == 429
+    assert second.headers["retry-after"] == "60"
+
+
+def test_slots_of_recovered_keys_are_reused(tmp_path):
+    table = SharedCounterTable(str(tmp_path / "rl"), slots=4)
+    now = time.time()
+    for key in range(1, 5):
+        with table.slot(key, expired_before=now) as tats:
+            tats[:] = [now - 1, 0.0]  # limits already recovered
+    with table.slot(99, expired_before=now - 10) as tats:
+        assert tats is None  # nothing has expired by then: full
+
+    with table.slot(99, expired_before=now) as tats:
+        assert tats == [0.0, 0.0]
+        tats[0] = now + 60
+    # The key keeps its slot; the others are still found
+    with table.slot(99, expired_before=now) as tats:
+        assert tats[0] == now + 60
+    table.close()
+
+
+def test_probing_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_table, "MAX_PROBE", 3)
+    table = SharedCounterTable(str(tmp_path / "rl"), slots=64)
+    future = time.time() + 60
+    for key in (64, 128, 192):  # all hash to slot 0
+        with table.slot(key) as tats:
+            tats[0] = future
+    with table.slot(256) as tats:
+        assert tats is None
+    table.close()
+
+
+def test_full_table_fails_open_and_is_counted(tmp_path):
+    limiter = RateLimiter()
+    limiter.configure(RateLimitConfigModel(state_path=str(tmp_path / "rl"), slots=1))
+    assert limiter.check(key_id_for("gw_alice"), rpm=1, tpm=None) is None
+    assert limiter.check(key_id_for("gw_bob"), rpm=1, tpm=None) is None
+    assert limiter.stats()["unlimited"] == 1
+
+
+def test_table_is_sized_from_the_key_count(tmp_path):
+    cfg = RateLimitConfigModel(state_path=str(tmp_path / "rl"), slots=64)
+    limiter = RateLimiter()
+    limiter.configure(cfg, keys=1000)
+    limiter.check(key_id_for("gw_alice"), rpm=1, tpm=None)
+    assert limiter.stats()["slots"] == 2000
+
+    # Another worker (or a restart) sized for fewer keys maps the whole file
+    other = RateLimiter()
+    other.configure(cfg)
+    assert other.check(key_id_for("gw_alice"), rpm=1, tpm=None) is not None
+    assert other.stats()["slots"] == 2000
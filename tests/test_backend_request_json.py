@@ -0,0 +1,167 @@
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+import backend.request_json as request_json
+from backend.auth import authenticate_and_authorize
+from backend.config import AuthIndex, GatewayKeyModel
+from backend.request_json import ParsedBody
+from backend.usage import add_stream_usage_option
+
+
+class CountingJSON:
+    """Stands in for the json module to count full-body parses."""
+
+    def __init__(self):
+        self.parsed = []
+
+    def loads(self, raw):
+        self.parsed.append(len(raw))
+        return json.loads(raw)
+
+    def dumps(self, *args, **kwargs):
+        return json.dumps(*args, **kwargs)
+
+
+@pytest.fixture
+def always_scan(monkeypatch):
+    monkeypatch.setattr(request_json, "SCAN_MIN_BYTES", 0)
+
+
+def chat(prompt: str, **fields) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": "You are terse."},
+            {"role": "user", "content": prompt},
+        ],
+        **fields,
+    }
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        # SDK order: messages first, model and stream after
+        json.dumps(chat("hi", model="gpt-4o", stream=True)),
+        json.dumps({"model": "gpt-4o", "stream": False, **chat("hi")}),
+        json.dumps(chat('say "model": "x"', model="m"), indent=2),
+        json.dumps(chat("代码", model="m", stream=1), ensure_ascii=False),
+        # Model between two nested values: needs the full parse
+        json.dumps({**chat("hi"), "model": "m", "tools": [{"model": "nested"}]}),
+        # Duplicate keys: the last one wins, as upstream will read it
+        '{"model": "allowed", "messages": [], "model": "other"}',
+        '{"model": "allowed", "messages": [], "\\u006dodel": "other"}',
+        '{"model": "allowed", "messages": [{"x": ["]"]}], "stream": true}',
+        "{}",
+    ],
+)
+def test_scan_agrees_with_a_full_parse(always_scan, raw):
+    parsed = ParsedBody.scan(raw.encode())
+    payload = json.loads(raw)
+    assert parsed.model == payload.get("model")
+    assert parsed.stream == bool(payload.get("stream", False))
+    assert parsed.payload == payload
+
+
+@pytest.mark.parametrize("raw", [b"", b"not json", b"[1, 2]", b'{"model": "m"', b'"s"'])
+def test_non_objects_are_forwarded_opaquely(always_scan, raw):
+    assert ParsedBody.scan(raw) is None
+
+
+def test_large_prompt_is_not_parsed(monkeypatch):
+    counting = CountingJSON()
+    monkeypatch.setattr(request_json, "json", counting)
+    raw = json.dumps(chat("lorem ipsum " * 20_000, model="gpt-4o", stream=True))
+
+    parsed = ParsedBody.scan(raw.encode())
+    assert (parsed.model, parsed.stream) == ("gpt-4o", True)
+    # Only the two scalar values were decoded
+    assert all(size < 16 for size in counting.parsed)
+
+    assert parsed.payload["messages"][1]["role"] == "user"
+    assert parsed.payload is parsed.payload
+    assert counting.parsed.count(len(raw)) == 1
+
+
+def test_stream_options_are_spliced_in_without_a_parse(monkeypatch):
+    counting = CountingJSON()
+    monkeypatch.setattr(request_json, "json", counting)
+    raw = json.dumps(chat("x" * 100_000, model="m", stream=True)).encode()
+
+    injected = add_stream_usage_option(ParsedBody.scan(raw))
+    assert injected.raw.endswith(raw[1:])
+    assert json.loads(injected.raw)["stream_options"] == {"include_usage": True}
+    assert all(size < 16 for size in counting.parsed)
+
+
+def test_explicit_stream_options_are_respected():
+    raw = json.dumps(chat("hi", model="m", stream=True, stream_options={})).encode()
+    payload = json.loads(add_stream_usage_option(ParsedBody.scan(raw)).raw)
+    assert payload["stream_options"] == {"include_usage": True}
+
+    raw = json.dumps(
+        chat("hi", model="m", stream=True, stream_options={"include_usage": False})
+    ).encode()
+    assert add_stream_usage_option(ParsedBody.scan(raw)).raw == raw
+
+
+@pytest.mark.asyncio
+async def test_auth_caches_the_parsed_body_and_checks_the_last_model(monkeypatch):
+    monkeypatch.setattr(request_json, "SCAN_MIN_BYTES", 0)
+    gateway_keys = {
+        "test-key": GatewayKeyModel(owner="alice", providers=["openai"], models=["m"])
+    }
+    app = FastAPI()
+
+    @app.post("/auth/{provider}")
+    async def auth_route(provider: str, request: Request):
+        body = await authenticate_and_authorize(
+            request, provider, AuthIndex(gateway_keys, {"openai": ["*"]})
+        )
+        parsed = request.state.parsed_body
+        return {"same": parsed.raw is body, "model": parsed.model}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {"authorization": "Bearer test-key"}
+        ok = await client.post(
+            "/auth/openai", headers=headers, content=json.dumps(chat("hi", model="m"))
+        )
+        smuggled = await client.post(
+            "/auth/openai",
+            headers=headers,
+            content='{"model": "m", "messages": [], "model": "gpt-4o"}',
+        )
+
+    assert ok.json() == {"same": True, "model": "m"}
+    assert smuggled.status_code == 403
+
+
+def _best(fn, *args, repeat: int = 15) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("kb", [1, 16, 64, 256, 1024])
+def test_extraction_benchmark(kb):
+    words = "lorem ipsum dolor sit amet " * (kb * 1024 // 27)
+    raw = json.dumps(chat(words, model="gpt-4o", stream=True)).encode()
+
+    parsed = ParsedBody.scan(raw)
+    assert (parsed.model, parsed.stream) == ("gpt-4o", True)
+
+    # Timings only: wall-clock thresholds fail on loaded machines
+    scan = _best(ParsedBody.scan, raw)
+    full = _best(json.loads, raw)
+    print(
+        f"{kb:>5} KB  scan {scan * 1e6:8.1f} us  json.loads {full * 1e6:8.1f} us"
+        f"  ({full / scan:.1f}x)"
+    )
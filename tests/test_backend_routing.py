@@ -0,0 +1,246 @@
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.responses import Response, StreamingResponse
+
+import backend.main as main_module
+import backend.proxy as proxy_module
+from backend.config import ConfigSnapshot, ConfigStore, GatewayConfigModel
+from backend.config import ModelAliasConfigModel
+from backend.proxy import forward_request
+from backend.routing import ModelRouter
+from backend.upstream import UpstreamConnectError
+
+from fakes import FakePool, FakeResponse, FakeSession, FakeUsageSink
+
+FAST_CHAT = ModelAliasConfigModel(
+    targets=["openai:gpt-4.1-mini", "anthropic:claude-haiku"]
+)
+
+
+def test_faster_target_is_ranked_first():
+    router = ModelRouter()
+    router.observe("openai", "gpt-4.1-mini", 900, ok=True)
+    router.observe("anthropic", "claude-haiku", 300, ok=True)
+    assert router.rank(FAST_CHAT)[0] == ("anthropic", "claude-haiku")
+
+
+def test_errors_push_a_target_back():
+    router = ModelRouter()
+    router.observe("openai", "gpt-4.1-mini", 300, ok=True)
+    router.observe("anthropic", "claude-haiku", 500, ok=True)
+    for _ in range(3):
+        router.observe("openai", "gpt-4.1-mini", 0, ok=False)
+    assert router.rank(FAST_CHAT)[0] == ("anthropic", "claude-haiku")
+    assert router.stats()["openai:gpt-4.1-mini"]["errors"] == 3
+
+
+def test_target_failing_from_its_first_call_is_not_retried_first():
+    router = ModelRouter()
+    assert router.rank(FAST_CHAT)[0] == ("openai", "gpt-4.1-mini")
+    for _ in range(5):
+        # e.g. connection refused: never a latency sample
+        router.observe("openai", "gpt-4.1-mini", 0, ok=False)
+        assert router.rank(FAST_CHAT)[0] == ("anthropic", "claude-haiku")
+    router.observe("anthropic", "claude-haiku", 900, ok=True)
+    # Only failures, never a latency: ranked behind the slowest working target
+    assert router.rank(FAST_CHAT) == [
+        ("anthropic", "claude-haiku"),
+        ("openai", "gpt-4.1-mini"),
+    ]
+    assert router.stats()["openai:gpt-4.1-mini"]["latency_ms"] is None
+
+    # Re-probed once probe_interval has passed
+    router.targets[("openai", "gpt-4.1-mini")].last_tried -= (
+        FAST_CHAT.probe_interval + 1
+    )
+    assert router.rank(FAST_CHAT)[0] == ("openai", "gpt-4.1-mini")
+    assert router.rank(FAST_CHAT)[0] == ("anthropic", "claude-haiku")
+
+
+def test_unknown_and_stale_targets_are_probed_once(monkeypatch):
+    router = ModelRouter()
+    router.observe("openai", "gpt-4.1-mini", 300, ok=True)
+    # Never tried: gets the next request, then ranks on its own numbers.
+    assert router.rank(FAST_CHAT)[0] == ("anthropic", "claude-haiku")
+    router.observe("anthropic", "claude-haiku", 900, ok=True)
+    assert router.rank(FAST_CHAT)[0] == ("openai", "gpt-4.1-mini")
+
+    stats = router.targets[("anthropic", "claude-haiku")]
+    stats.last_tried -= FAST_CHAT.probe_interval + 1
+    assert router.rank(FAST_CHAT)[0] == ("anthropic", "claude-haiku")
+    # The probe is in flight: other requests keep the fast target.
+    assert router.rank(FAST_CHAT)[0] == ("openai", "gpt-4.1-mini")
+
+
+def gateway_config(
+    models=("fast-chat", "gpt-4.1-mini", "claude-haiku"), api_formats=None, **aliases
+):
+    return GatewayConfigModel.model_validate(
+        {
+            "providers": {
+                name: {
+                    "base_url": f"http://{name}",
+                    "api_key": "k",
+                    "allowed_models": ["*"],
+                    "api_format": (api_formats or {}).get(name, "openai"),
+                }
+                for name in ("openai", "anthropic", "vllm")
+            },
+            "gateway_keys": {
+                "test-key": {
+                    "owner": "alice",
+                    "providers": ["openai", "anthropic"],
+                    "models": list(models),
+                }
+            },
+            "model_aliases": aliases,
+        }
+    )
+
+
+def test_alias_targets_must_exist():
+    with pytest.raises(ValueError, match="unknown provider 'nope'"):
+        gateway_config(**{"fast-chat": {"targets": ["nope:m"]}})
+    with pytest.raises(ValueError, match="provider:model"):
+        ModelAliasConfigModel(targets=["gpt-4"])
+
+
+def test_alias_targets_share_one_api_format():
+    with pytest.raises(ValueError, match="targets mix API formats"):
+        gateway_config(
+            api_formats={"anthropic": "anthropic"},
+            **{"fast-chat": {"targets": FAST_CHAT.targets}},
+        )
+
+
+@pytest.mark.asyncio
+async def test_route_falls_back_before_anything_is_sent(monkeypatch):
+    cfg = gateway_config(
+        **{
+            "fast-chat": {
+                "targets": [
+                    "vllm:llama",
+                    "openai:gpt-4.1-mini",
+                    "anthropic:claude-haiku",
+                ]
+            }
+        }
+    )
+    monkeypatch.setattr(ConfigStore, "_current", ConfigSnapshot(cfg))
+    router = ModelRouter()
+    usage = FakeUsageSink()
+    monkeypatch.setattr(main_module, "MODEL_ROUTER", router)
+    monkeypatch.setattr(main_module, "USAGE_SINK", usage)
+
+    calls = []
+
+    async def fake_dispatch(
+        request, provider, path, provider_cfg, cfg, body, buffer_errors
+    ):
+        calls.append((provider, json.loads(body)["model"], buffer_errors))
+        assert "provider" not in request.path_params
+        if provider == "openai":
+            raise UpstreamConnectError("refused")
+        if provider == "anthropic":
+            return Response(b'{"error":"overloaded"}', status_code=529)
+        return Response(b'{"ok":true}', status_code=200)
+
+    monkeypatch.setattr(main_module, "dispatch", fake_dispatch)
+
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/route/v1/chat/completions",
+            headers={"authorization": "Bearer test-key"},
+            json={"model": "fast-chat", "messages": []},
+        )
+
+    # vllm is not allowed for this key; the last target has no fallback left.
+    assert calls == [
+        ("openai", "gpt-4.1-mini", True),
+        ("anthropic", "claude-haiku", False),
+    ]
+    assert resp.status_code == 529
+    assert [(r.route_alias, r.route_attempt, r.provider) for r in usage.records] == [
+        ("fast-chat", 0, "openai")
+    ]
+    assert router.stats()["openai:gpt-4.1-mini"]["errors"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "models, status, providers",
+    [
+        (["fast-chat", "claude-haiku"], 200, ["anthropic"]),
+        (["fast-chat"], 403, []),
+    ],
+)
+async def test_targets_need_their_model_allowed(monkeypatch, models, status, providers):
+    cfg = gateway_config(models, **{"fast-chat": {"targets": FAST_CHAT.targets}})
+    monkeypatch.setattr(ConfigStore, "_current", ConfigSnapshot(cfg))
+    monkeypatch.setattr(main_module, "MODEL_ROUTER", ModelRouter())
+    calls = []
+
+    async def fake_dispatch(
+        request, provider, path, provider_cfg, cfg, body, buffer_errors
+    ):
+        calls.append(provider)
+        return Response(b'{"ok":true}', status_code=200)
+
+    monkeypatch.setattr(main_module, "dispatch", fake_dispatch)
+
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/route/v1/chat/completions",
+            headers={"authorization": "Bearer test-key"},
+            json={"model": "fast-chat", "messages": []},
+        )
+
+    assert resp.status_code == status
+    assert calls == providers
+
+
+@pytest.mark.asyncio
+async def test_unknown_alias_is_404(monkeypatch):
+    monkeypatch.setattr(ConfigStore, "_current", ConfigSnapshot(gateway_config()))
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/route/v1/chat/completions",
+            headers={"authorization": "Bearer test-key"},
+            json={"model": "fast-chat"},
+        )
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_errors_are_buffered_when_fallback_is_possible(monkeypatch):
+    chunks = [b'{"error":', b'"upstream down"}']
+    monkeypatch.setattr(
+        proxy_module,
+        "UPSTREAM_POOL",
+        FakePool(FakeSession(FakeResponse(503, chunks=chunks))),
+    )
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", FakeUsageSink())
+
+    def request():
+        return SimpleNamespace(
+            method="POST",
+            headers={},
+            query_params={},
+            state=SimpleNamespace(owner="alice", model="m", stream=True),
+            path_params={"provider": "openai"},
+        )
+
+    buffered = await forward_request(
+        request(), "http://upstream/v1/chat", "k", b"{}", buffer_errors=True
+    )
+    assert not isinstance(buffered, StreamingResponse)
+    assert buffered.body == b'{"error":"upstream down"}'
+
+    streamed = await forward_request(request(), "http://upstream/v1/chat", "k", b"{}")
+    assert isinstance(streamed, StreamingResponse)
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from backend.config import AdaptiveConcurrencyConfigModel, ProviderConfigModel
+from backend.scheduler import AIMDLimiter, FairQueueScheduler, parse_retry_after
+
+
+def scheduler_with(limit, max_wait=5.0, **adaptive):
+    scheduler = FairQueueScheduler()
+    scheduler.sync(
+        {
+            "openai": ProviderConfigModel(
+                base_url="http://upstream",
+                api_key="k",
+                allowed_models=["*"],
+                max_concurrency=limit,
+                max_queue_wait=max_wait,
+                adaptive_concurrency=adaptive,
+            )
+        }
+    )
+    return scheduler
+
+
+async def admission_order(scheduler, holder, requests):
+    """Queue ``(name, owner, priority)`` requests behind ``holder`` on a
+    one-slot provider, then free the slot repeatedly and return who got in."""
+    served = []
+
+    async def run(name, owner, priority):
+        ticket = await scheduler.acquire("openai", owner, priority=priority)
+        served.append(name)
+        return ticket
+
+    tasks = {}
+    for name, owner, priority in requests:
+        tasks[name] = asyncio.create_task(run(name, owner, priority))
+        await asyncio.sleep(0)
+
+    current = holder
+    while len(served) < len(requests):
+        before = len(served)
+        scheduler.release(current)
+        while len(served) == before:
+            await asyncio.sleep(0)
+        current = await tasks[served[-1]]
+    scheduler.release(current)
+    return served
+
+
+@pytest.mark.asyncio
+async def test_owners_share_capacity_fairly():
+    scheduler = scheduler_with(limit=1)
+    holder = await scheduler.acquire("openai", "batcher")
+    requests = [(f"a{i}", "batcher", "interactive") for i in range(4)]
+    requests += [("b0", "alice", "interactive"), ("b1", "alice", "interactive")]
+
+    served = await admission_order(scheduler, holder, requests)
+
+    # alice arrived last but is interleaved with the batcher's backlog
+    assert served == ["a0", "b0", "a1", "b1", "a2", "a3"]
+    stats = scheduler.stats()["openai"]
+    assert stats["active"] == 0
+    assert stats["queued"] == {"interactive": 0, "batch": 0}
+    assert stats["admitted"] == 7
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_go_before_batch():
+    scheduler = scheduler_with(limit=1)
+    holder = await scheduler.acquire("openai", "ci")
+    requests = [
+        ("batch0", "ci", "batch"),
+        ("batch1", "ci", "batch"),
+        ("chat", "alice", "interactive"),
+    ]
+
+    assert await admission_order(scheduler, holder, requests) == [
+        "chat",
+        "batch0",
+        "batch1",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_limit_returns_429_and_frees_the_queue():
+    scheduler = scheduler_with(limit=1, max_wait=0.05)
+    holder = await scheduler.acquire("openai", "alice")
+
+    with pytest.raises(HTTPException) as exc:
+        await scheduler.acquire("openai", "bob")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+
+    scheduler.release(holder)
+    ticket = await asyncio.wait_for(scheduler.acquire("openai", "bob"), 1)
+    assert ticket.wait_ms == 0
+    stats = scheduler.stats()["openai"]
+    assert stats["timed_out"] == 1
+    assert stats["active"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unlimited_provider_never_queues():
+    scheduler = scheduler_with(limit=None)
+    tickets = [await scheduler.acquire("openai", "alice") for _ in range(50)]
+    assert scheduler.stats()["openai"]["active"] == 50
+    for ticket in tickets:
+        scheduler.release(ticket)
+
+
+def test_parse_retry_after_forms():
+    assert parse_retry_after({"retry-after": "3"}) == 3
+    assert parse_retry_after({"retry-after-ms": "250", "retry-after": "3"}) == 0.25
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after({}) is None
+
+
+def test_aimd_grows_additively_and_backs_off_multiplicatively():
+    limiter = AIMDLimiter(
+        AdaptiveConcurrencyConfigModel(enabled=True, initial_limit=4), ceiling=None
+    )
+    # +1/limit per response: about one more slot per round trip
+    for _ in range(5):
+        limiter.on_success(100)
+    assert limiter.current == 5
+
+    limiter.on_overload()
+    assert limiter.current == 2
+    # The same round trip's other 429s do not cut again.
+    limiter.on_overload()
+    assert limiter.current == 2
+    assert limiter.decreases == 1
+
+
+def test_aimd_cuts_when_latency_rises_and_respects_ceiling():
+    limiter = AIMDLimiter(
+        AdaptiveConcurrencyConfigModel(enabled=True, initial_limit=40), ceiling=8
+    )
+    assert limiter.current == 8
+    for _ in range(20):
+        limiter.on_success(100)
+    assert limiter.current == 8
+    limiter.on_success(1000)
+    assert limiter.current == 4
+
+
+@pytest.mark.asyncio
+async def test_upstream_429_shrinks_limit_and_holds_new_requests():
+    scheduler = scheduler_with(
+        limit=None, enabled=True, initial_limit=8, max_hold_seconds=0.05
+    )
+    scheduler.observe("openai", 429, 10, {"retry-after": "30"})
+    stats = scheduler.stats()["openai"]
+    assert stats["limit"] == 4
+    assert stats["held"] is True
+
+    ticket = await asyncio.wait_for(scheduler.acquire("openai", "alice"), 1)
+    assert ticket.wait_ms >= 40
+    assert scheduler.stats()["openai"]["held"] is False
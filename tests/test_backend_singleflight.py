@@ -0,0 +1,168 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import backend.proxy as proxy_module
+from backend.cache import FlightAborted, Singleflight
+from backend.proxy import forward_request
+
+from fakes import FakePool, FakeUsageSink
+
+
+class SlowContent:
+    def __init__(self, chunks, gate):
+        self._chunks = chunks
+        self._gate = gate
+
+    async def iter_any(self):
+        for chunk in self._chunks:
+            await self._gate.wait()
+            yield chunk
+
+
+class SlowResponse:
+    def __init__(self, chunks, gate):
+        self.status = 200
+        self.headers = {"content-type": "text/event-stream"}
+        self.content = SlowContent(chunks, gate)
+        self._gate = gate
+        self._chunks = chunks
+
+    async def read(self):
+        await self._gate.wait()
+        return b"".join(self._chunks)
+
+    def close(self):
+        pass
+
+    def release(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __await__(self):
+        return self.__aenter__().__await__()
+
+
+class CountingSession:
+    def __init__(self, chunks, gate):
+        self.calls = 0
+        self._chunks = chunks
+        self._gate = gate
+
+    def request(self, **kwargs):
+        self.calls += 1
+        return SlowResponse(self._chunks, self._gate)
+
+
+def make_request(owner, stream):
+    return SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer k"},
+        query_params={},
+        state=SimpleNamespace(owner=owner, model="gpt-ok", stream=stream),
+        path_params={"provider": "openai"},
+    )
+
+
+async def call(owner, stream):
+    response = await forward_request(
+        request=make_request(owner, stream),
+        target_url="http://upstream/v1/chat",
+        provider_api_key="provider-key",
+        body=b'{"model":"gpt-ok","temperature":0}',
+        cache_key="same",
+        coalesce=True,
+    )
+    if hasattr(response, "body_iterator"):
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return response.body
+
+
+def setup(monkeypatch, chunks):
+    gate = asyncio.Event()
+    session = CountingSession(chunks, gate)
+    usage = FakeUsageSink()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", FakePool(session))
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+    monkeypatch.setattr(proxy_module, "SINGLEFLIGHT", Singleflight())
+    return gate, session, usage
+
+
+@pytest.mark.asyncio
+async def test_identical_buffered_requests_share_one_upstream_call(monkeypatch):
+    body = b'{"usage":{"prompt_tokens":2,"completion_tokens":3,"total_tokens":5}}'
+    gate, session, usage = setup(monkeypatch, [body])
+
+    tasks = [asyncio.create_task(call(owner, False)) for owner in ("a", "b", "c")]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*tasks)
+
+    assert session.calls == 1
+    assert results == [body, body, body]
+    assert sorted(r.owner for r in usage.records) == ["a", "b", "c"]
+    assert [r.coalesced for r in usage.records].count(True) == 2
+    assert all(r.total_tokens == 5 for r in usage.records)
+
+
+@pytest.mark.asyncio
+async def test_streaming_followers_receive_fanned_out_chunks(monkeypatch):
+    chunks = [
+        b'data: {"choices":[],"usage":null}\n\n',
+        b'data: {"choices":[],"usage":{"prompt_tokens":1,"completion_tokens":1,'
+        b'"total_tokens":2}}\n\n',
+        b"data: [DONE]\n\n",
+    ]
+    gate, session, usage = setup(monkeypatch, chunks)
+
+    tasks = [asyncio.create_task(call(owner, True)) for owner in ("a", "b")]
+    await asyncio.sleep(0.01)
+    gate.set()
+    results = await asyncio.gather(*tasks)
+
+    assert session.calls == 1
+    assert results == [b"".join(chunks)] * 2
+    assert {r.owner: r.total_tokens for r in usage.records} == {"a": 2, "b": 2}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [RuntimeError("boom"), asyncio.CancelledError()])
+async def test_followers_fail_when_leader_fails(monkeypatch, error):
+    gate, session, usage = setup(monkeypatch, [])
+
+    # Simulate a leader already in flight whose upstream call then fails (or
+    # is cancelled, which followers must not take as their own cancellation).
+    flight, _ = proxy_module.SINGLEFLIGHT.join("same")
+    follower = asyncio.create_task(call("b", False))
+    await asyncio.sleep(0)
+    flight.fail(error)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await follower
+    assert exc_info.value.status_code == 502
+    assert session.calls == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream", [False, True])
+async def test_followers_are_not_served_a_truncated_response(monkeypatch, stream):
+    gate, session, usage = setup(monkeypatch, [])
+
+    # The leader's client disconnects (or upstream breaks) mid-response
+    flight, _ = proxy_module.SINGLEFLIGHT.join("same")
+    follower = asyncio.create_task(call("b", stream))
+    await asyncio.sleep(0)
+    flight.start(200, {"content-type": "application/json"}, buffered=not stream)
+    flight.publish(b'{"partial":')
+    flight.finish((None, None, None), completed=False)
+
+    expected = FlightAborted if stream else HTTPException
+    with pytest.raises(expected):
+        await follower
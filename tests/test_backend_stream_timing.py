@@ -0,0 +1,91 @@
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import backend.proxy as proxy_module
+from backend.proxy import forward_request
+from backend.usage import P2Quantile, StreamTimer
+
+from fakes import SSE_HEADERS, FakePool, FakeResponse, FakeSession, FakeUsageSink
+
+
+def test_p2_quantile_tracks_p95():
+    rng = random.Random(7)
+    samples = [rng.expovariate(1 / 20) for _ in range(5000)]
+    estimate = P2Quantile(0.95)
+    for x in samples:
+        estimate.add(x)
+    exact = sorted(samples)[int(len(samples) * 0.95)]
+    assert abs(estimate.value() - exact) / exact < 0.05
+
+
+def test_p2_quantile_with_few_samples():
+    estimate = P2Quantile(0.95)
+    assert estimate.value() is None
+    for x in (3.0, 1.0, 2.0):
+        estimate.add(x)
+    assert estimate.value() == 3.0
+
+
+def test_stream_timer_fields():
+    timer = StreamTimer(start=100.0)
+    timer.on_headers(100.05)
+    # Role preamble first: not a token yet.
+    timer.on_chunk(b'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n', 100.2)
+    timer.on_chunk(b'data: {"choices":[{"delta":{"content":"Hi"}}]}\n\n', 100.3)
+    timer.on_chunk(b'data: {"choices":[{"delta":{"content":" there"}}]}\n\n', 100.5)
+    timer.on_chunk(b'data: {"choices":[{"delta":{"content":"!"}}]}\n\n', 101.3)
+
+    fields = timer.fields(completion_tokens=10)
+    assert fields["ttfb_ms"] == 50
+    assert fields["ttft_ms"] == 300
+    assert fields["gap_max_ms"] == pytest.approx(800)
+    assert fields["gap_mean_ms"] == pytest.approx(366.67, abs=0.01)
+    assert fields["tokens_per_second"] == pytest.approx(10)
+
+
+def test_stream_timer_anthropic_first_token():
+    timer = StreamTimer(start=0.0, api_format="anthropic")
+    timer.on_chunk(b'event: message_start\ndata: {"type":"message_start"}\n\n', 0.1)
+    timer.on_chunk(
+        b'event: content_block_delta\ndata: {"type":"content_block_delta"}\n\n', 0.4
+    )
+    assert timer.fields()["ttft_ms"] == 400
+
+
+@pytest.mark.asyncio
+async def test_streamed_usage_record_carries_timing(monkeypatch):
+    chunks = [
+        b'data: {"choices":[{"delta":{"content":"hi"}}]}\n\n',
+        b'data: {"choices":[{"delta":{"content":" you"}}]}\n\n',
+        b'data: {"choices":[],"usage":{"prompt_tokens":3,"completion_tokens":2,"total_tokens":5}}\n\n',
+        b"data: [DONE]\n\n",
+    ]
+    usage = FakeUsageSink()
+    monkeypatch.setattr(
+        proxy_module,
+        "UPSTREAM_POOL",
+        FakePool(FakeSession(FakeResponse(headers=SSE_HEADERS, chunks=chunks))),
+    )
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+
+    request = SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer gateway-key"},
+        query_params={},
+        state=SimpleNamespace(owner="alice", model="m", stream=True),
+        path_params={"provider": "openai"},
+    )
+    body = json.dumps({"model": "m", "stream": True}).encode()
+    response = await forward_request(request, "http://upstream/v1/chat", "k", body)
+    async for _ in response.body_iterator:
+        pass
+
+    record = usage.records[0]
+    assert record.completion_tokens == 2
+    assert record.ttfb_ms is not None
+    assert record.ttft_ms is not None and record.ttft_ms >= record.ttfb_ms
+    assert record.gap_max_ms is not None and record.gap_p95_ms is not None
+    assert record.gap_mean_ms <= record.gap_max_ms
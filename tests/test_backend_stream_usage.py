@@ -0,0 +1,106 @@
+import json
+
+from backend.request_json import ParsedBody
+from backend.usage import (
+    TailUsageScanner,
+    add_stream_usage_option,
+    make_stream_usage_parser,
+)
+
+
+def feed_in_pieces(parser, data: bytes, size: int):
+    for i in range(0, len(data), size):
+        parser.feed(data[i : i + size])
+    parser.finish()
+
+
+OPENAI_STREAM = (
+    b'data: {"id":"1","choices":[{"delta":{"content":"Hi"}}],"usage":null}\n\n'
+    b'data: {"id":"1","choices":[{"delta":{"content":" usage"}}],"usage":null}\n\n'
+    b'data: {"id":"1","choices":[],'
+    b'"usage":{"prompt_tokens":7,"completion_tokens":2,"total_tokens":9}}\n\n'
+    b"data: [DONE]\n\n"
+)
+
+ANTHROPIC_STREAM = (
+    b"event: message_start\n"
+    b'data: {"type":"message_start","message":{"id":"m","usage":'
+    b'{"input_tokens":10,"cache_read_input_tokens":5,"output_tokens":1}}}\n\n'
+    b"event: content_block_delta\n"
+    b'data: {"type":"content_block_delta","delta":{"text":"hello"}}\n\n'
+    b"event: message_delta\n"
+    b'data: {"type":"message_delta","delta":{"stop_reason":"end_turn"},'
+    b'"usage":{"output_tokens":12}}\n\n'
+    b"event: message_stop\n"
+    b'data: {"type":"message_stop"}\n\n'
+)
+
+
+def test_openai_parser_reads_final_usage_chunk_across_splits():
+    for size in (1, 7, 64, len(OPENAI_STREAM)):
+        parser = make_stream_usage_parser("openai")
+        feed_in_pieces(parser, OPENAI_STREAM, size)
+        assert parser.result() == (7, 2, 9)
+
+
+def test_anthropic_parser_combines_start_and_delta():
+    for size in (3, 50, len(ANTHROPIC_STREAM)):
+        parser = make_stream_usage_parser("anthropic")
+        feed_in_pieces(parser, ANTHROPIC_STREAM, size)
+        assert parser.result() == (15, 12, 27)
+
+
+def test_parser_without_usage_event_reports_none():
+    parser = make_stream_usage_parser("openai")
+    feed_in_pieces(parser, OPENAI_STREAM.replace(b'"usage":{', b'"other":{'), 16)
+    assert parser.result() == (None, None, None)
+
+
+def inject(body: bytes) -> bytes:
+    return add_stream_usage_option(ParsedBody.scan(body)).raw
+
+
+def test_add_stream_usage_option():
+    body = json.dumps({"model": "m", "stream": True}).encode()
+    payload = json.loads(inject(body))
+    assert payload["stream_options"] == {"include_usage": True}
+
+    explicit = json.dumps(
+        {"model": "m", "stream": True, "stream_options": {"include_usage": False}}
+    ).encode()
+    assert inject(explicit) == explicit
+
+    not_streaming = json.dumps({"model": "m"}).encode()
+    assert inject(not_streaming) == not_streaming
+
+
+def test_tail_scanner_reads_usage_from_bounded_tail():
+    body = json.dumps(
+        {
+            "data": [{"embedding": [0.1] * 5000, "note": '"usage": {"x": 1}'}],
+            "usage": {
+                "prompt_tokens": 8,
+                "total_tokens": 8,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        }
+    ).encode()
+    scanner = TailUsageScanner(window=256)
+    for i in range(0, len(body), 100):
+        scanner.feed(body[i : i + 100])
+        assert len(scanner._tail) <= 256
+    scanner.finish()
+    assert scanner.result() == (8, None, 8)
+
+
+def test_tail_scanner_handles_anthropic_usage_and_missing_usage():
+    scanner = TailUsageScanner()
+    scanner.feed(b'{"content":[{"text":"}{"}],')
+    scanner.feed(b'"usage":{"input_tokens":3,"output_tokens":4}}')
+    scanner.finish()
+    assert scanner.result() == (3, 4, 7)
+
+    scanner = TailUsageScanner()
+    scanner.feed(b'{"error":{"message":"bad"}}')
+    scanner.finish()
+    assert scanner.result() == (None, None, None)
@@ -0,0 +1,185 @@
+import json
+import random
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+import backend.proxy as proxy_module
+from backend.auth import authenticate_and_authorize
+from backend.config import AuthIndex, GatewayKeyModel, RateLimitConfigModel
+from backend.proxy import forward_request
+from backend.ratelimit import RateLimiter, key_id_for
+from backend.usage import estimate_prompt_tokens, request_prompt_tokens
+from backend.usage.token_estimator import (
+    IMAGE_TOKENS,
+    MESSAGE_OVERHEAD,
+    REPLY_PRIMING,
+    family_ratio,
+)
+
+from fakes import SSE_HEADERS, FakePool, FakeResponse, FakeSession, FakeUsageSink
+
+WORDS = "the quick brown fox jumps over a lazy dog while return value self".split()
+
+
+def prose(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def test_chat_messages_count_text_and_framing():
+    payload = {
+        "model": "gpt-4",
+        "messages": [{"role": "user", "content": "a" * 400}],
+    }
+    assert estimate_prompt_tokens(payload) == 100 + MESSAGE_OVERHEAD + REPLY_PRIMING
+
+
+def test_model_family_picks_the_ratio():
+    assert family_ratio("gpt-4o-mini") == family_ratio("openai/o3-mini")
+    assert family_ratio("claude-sonnet-4")[0] < family_ratio("gpt-4o")[0]
+    # "o1" only matches the o-series, not names that merely contain it
+    assert family_ratio("foo1-model") == family_ratio(None)
+
+
+def test_wide_characters_count_about_a_token_each():
+    text = "你好世界" * 250
+    tokens = estimate_prompt_tokens({"model": "gpt-4", "prompt": text})
+    assert 900 <= tokens <= 1200
+
+
+def test_parts_images_tools_and_token_ids():
+    payload = {
+        "model": "claude-sonnet-4",
+        "system": [{"type": "text", "text": "Be brief."}],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "What is this?"},
+                    {"type": "image", "source": {"type": "base64", "data": "..."}},
+                ],
+            },
+            {
+                "role": "user",
+                "content": [{"type": "tool_result", "content": "42"}],
+            },
+        ],
+        "tools": [{"name": "lookup", "input_schema": {"type": "object"}}],
+    }
+    tokens = estimate_prompt_tokens(payload)
+    assert IMAGE_TOKENS < tokens < IMAGE_TOKENS + 60
+
+    assert estimate_prompt_tokens({"model": "m", "input": [[1, 2, 3], [4]]}) == 4
+
+
+def test_bodies_without_a_prompt_have_no_estimate():
+    assert estimate_prompt_tokens({"model": "m"}) is None
+    assert estimate_prompt_tokens([1, 2]) is None
+
+
+def long_chat() -> dict:
+    return json.loads(
+        json.dumps(
+            {
+                "model": "gpt-4o",
+                "messages": [
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prose(28_000)},
+                ],
+            }
+        )
+    )
+
+
+def test_estimate_for_a_32k_token_prompt():
+    assert 30_000 < estimate_prompt_tokens(long_chat()) < 40_000
+
+
+@pytest.mark.benchmark
+def test_estimate_benchmark():
+    payload = long_chat()
+    best = min(_timed(estimate_prompt_tokens, payload) for _ in range(20))
+    # Meant to stay well under a millisecond
+    print(f"32k-token prompt: estimated in {best * 1e6:.0f} us")
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def test_tpm_refuses_a_prompt_that_does_not_fit(tmp_path):
+    limiter = RateLimiter()
+    limiter.configure(RateLimitConfigModel(state_path=str(tmp_path / "rl"), slots=8))
+    key = key_id_for("gw_alice")
+
+    assert limiter.check(key, rpm=None, tpm=1000, tokens=5000) is None
+    limiter.charge(key, 600)
+    # 600 of 1000 used: 300 more fits, 500 does not
+    assert limiter.check(key, rpm=None, tpm=1000, tokens=300) is None
+    wait = limiter.check(key, rpm=None, tpm=1000, tokens=500)
+    assert 5 < wait <= 6
+
+
+@pytest.mark.asyncio
+async def test_auth_exposes_the_estimate():
+    gateway_keys = {
+        "test-key": GatewayKeyModel(owner="alice", providers=["openai"], models=["*"])
+    }
+    app = FastAPI()
+
+    @app.post("/auth/{provider}")
+    async def auth_route(provider: str, request: Request):
+        await authenticate_and_authorize(
+            request, provider, AuthIndex(gateway_keys, {"openai": ["*"]})
+        )
+        return {"estimate": request_prompt_tokens(request)}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post(
+            "/auth/openai",
+            headers={"authorization": "Bearer test-key"},
+            json={
+                "model": "gpt-4",
+                "messages": [{"role": "user", "content": "a" * 40}],
+            },
+        )
+    assert resp.json() == {"estimate": 10 + MESSAGE_OVERHEAD + REPLY_PRIMING}
+
+
+@pytest.mark.asyncio
+async def test_stream_without_usage_event_records_the_estimate(monkeypatch):
+    chunks = [
+        b'data: {"choices":[{"delta":{"content":"hi"}}]}\n\n',
+        b"data: [DONE]\n\n",
+    ]
+    usage = FakeUsageSink()
+    monkeypatch.setattr(
+        proxy_module,
+        "UPSTREAM_POOL",
+        FakePool(FakeSession(FakeResponse(headers=SSE_HEADERS, chunks=chunks))),
+    )
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+
+    request = SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer gateway-key"},
+        query_params={},
+        state=SimpleNamespace(
+            owner="alice", model="m", stream=True, prompt_tokens_estimate=120
+        ),
+        path_params={"provider": "openai"},
+    )
+    response = await forward_request(request, "http://upstream/v1/chat", "k", b"{}")
+    async for _ in response.body_iterator:
+        pass
+
+    record = usage.records[0]
+    assert (record.prompt_tokens, record.total_tokens) == (120, 120)
+    assert record.tokens_estimated
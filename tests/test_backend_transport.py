@@ -0,0 +1,158 @@
+import asyncio
+import json
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("h2")
+pytest.importorskip("httpx")
+
+import h2.config
+import h2.connection
+import h2.events
+
+import backend.proxy as proxy_module
+from backend.config import ProviderConfigModel
+from backend.proxy import forward_request
+from backend.upstream import UpstreamConnectError, UpstreamSessionPool
+from backend.upstream.transport import HTTP2Transport
+
+from fakes import FakeUsageSink
+
+SSE_CHUNKS = [
+    b'data: {"choices":[{"delta":{"content":"hi"}}]}\n\n',
+    b'data: {"choices":[],"usage":{"prompt_tokens":3,"completion_tokens":2,"total_tokens":5}}\n\n',
+    b"data: [DONE]\n\n",
+]
+
+
+class H2StandIn(asyncio.Protocol):
+    """Cleartext HTTP/2 (prior knowledge) server that streams SSE chunks back."""
+
+    def __init__(self, server):
+        self.server = server
+        self.conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        self.requests = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        for event in self.conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                self.requests[event.stream_id] = [dict(event.headers), b""]
+            elif isinstance(event, h2.events.DataReceived):
+                self.requests[event.stream_id][1] += event.data
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+            elif isinstance(event, h2.events.StreamEnded):
+                asyncio.ensure_future(self.respond(event.stream_id))
+        self.transport.write(self.conn.data_to_send())
+
+    async def respond(self, stream_id):
+        headers, body = self.requests.pop(stream_id)
+        self.server.seen.append((headers[":path"], headers.get("authorization"), body))
+        self.conn.send_headers(
+            stream_id, [(":status", "200"), ("content-type", "text/event-stream")]
+        )
+        for chunk in SSE_CHUNKS:
+            self.conn.send_data(stream_id, chunk)
+            self.transport.write(self.conn.data_to_send())
+            await asyncio.sleep(0.01)
+        self.conn.end_stream(stream_id)
+        self.transport.write(self.conn.data_to_send())
+
+
+@pytest.fixture
+async def h2_server():
+    server = SimpleNamespace(connections=0, seen=[])
+    loop = asyncio.get_running_loop()
+    srv = await loop.create_server(lambda: H2StandIn(server), "127.0.0.1", 0)
+    server.port = srv.sockets[0].getsockname()[1]
+    yield server
+    srv.close()
+
+
+def h2_provider(port):
+    return ProviderConfigModel(
+        base_url=f"http://127.0.0.1:{port}",
+        api_key="provider-key",
+        allowed_models=["*"],
+        transport="http2",
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams_share_one_connection(h2_server):
+    transport = HTTP2Transport(h2_provider(h2_server.port))
+
+    async def call(i):
+        resp = await transport.request(
+            "POST",
+            f"http://127.0.0.1:{h2_server.port}/v1/chat/{i}",
+            headers={"authorization": "Bearer k"},
+            data=b'{"n": %d}' % i,
+        )
+        assert resp.status == 200
+        assert resp.headers["content-type"] == "text/event-stream"
+        return b"".join([chunk async for chunk in resp.content.iter_any()])
+
+    bodies = await asyncio.gather(*(call(i) for i in range(8)))
+    await transport.close()
+
+    assert all(body == b"".join(SSE_CHUNKS) for body in bodies)
+    assert h2_server.connections == 1
+    assert sorted(path for path, _, _ in h2_server.seen) == sorted(
+        f"/v1/chat/{i}" for i in range(8)
+    )
+
+
+@pytest.mark.asyncio
+async def test_forward_request_streams_over_http2(monkeypatch, h2_server):
+    pool = UpstreamSessionPool()
+    await pool.sync({"h2": h2_provider(h2_server.port)})
+    usage = FakeUsageSink()
+    monkeypatch.setattr(proxy_module, "UPSTREAM_POOL", pool)
+    monkeypatch.setattr(proxy_module, "USAGE_SINK", usage)
+
+    request = SimpleNamespace(
+        method="POST",
+        headers={"Authorization": "Bearer gateway-key"},
+        query_params={},
+        state=SimpleNamespace(owner="alice", model="m", stream=True),
+        path_params={"provider": "h2"},
+    )
+    body = json.dumps({"model": "m", "stream": True}).encode()
+    response = await forward_request(
+        request, f"http://127.0.0.1:{h2_server.port}/v1/chat", "provider-key", body
+    )
+    streamed = b"".join([chunk async for chunk in response.body_iterator])
+    await pool.close()
+
+    assert streamed == b"".join(SSE_CHUNKS)
+    assert h2_server.seen == [("/v1/chat", "Bearer provider-key", body)]
+    record = usage.records[0]
+    assert (record.prompt_tokens, record.completion_tokens, record.total_tokens) == (
+        3,
+        2,
+        5,
+    )
+
+
+@pytest.mark.asyncio
+async def test_http2_connect_failure_is_a_connect_error():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead_port = s.getsockname()[1]
+
+    transport = HTTP2Transport(h2_provider(dead_port))
+    with pytest.raises(UpstreamConnectError):
+        await transport.request("GET", f"http://127.0.0.1:{dead_port}/")
+    await transport.close()
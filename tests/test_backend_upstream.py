@@ -0,0 +1,57 @@
+import pytest
+
+from backend.config import ProviderConfigModel
+from backend.upstream import UpstreamSessionPool
+
+
+def provider(base_url="http://example.com", **kwargs):
+    return ProviderConfigModel(
+        base_url=base_url, api_key="k", allowed_models=["*"], **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_sync_rebuilds_only_changed_pools():
+    pools = UpstreamSessionPool()
+    rebuilt = await pools.sync({"openai": provider(), "anthropic": provider()})
+    assert sorted(rebuilt) == ["anthropic", "openai"]
+    openai_transport = pools.pools["openai"].transport
+    anthropic_transport = pools.pools["anthropic"].transport
+
+    rebuilt = await pools.sync(
+        {"openai": provider(), "anthropic": provider(max_connections=5)}
+    )
+
+    assert rebuilt == ["anthropic"]
+    assert pools.pools["openai"].transport is openai_transport
+    assert pools.pools["anthropic"].transport is not anthropic_transport
+    await pools.close()
+    assert anthropic_transport.closed
+
+
+@pytest.mark.asyncio
+async def test_retired_pool_closes_after_last_release():
+    pools = UpstreamSessionPool()
+    await pools.sync({"openai": provider()})
+
+    leased = pools.acquire("openai")
+    await pools.sync({"openai": provider(base_url="http://other.example.com")})
+    assert leased.retired
+    assert not leased.transport.closed
+
+    pools.release(leased)
+    await pools.close()
+    assert leased.transport.closed
+
+
+@pytest.mark.asyncio
+async def test_acquire_unknown_provider_creates_default_pool():
+    pools = UpstreamSessionPool()
+    pool = pools.acquire("late")
+    assert pool.fingerprint is None
+    assert pools.stats() == {"late": {"active": 1, "tuned": False}}
+
+    pools.release(pool)
+    rebuilt = await pools.sync({"late": provider()})
+    assert rebuilt == ["late"]
+    await pools.close()
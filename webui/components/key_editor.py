@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 import streamlit as st
 
 from core.config_io import load_config, save_config
+from utils.key_hashing import hash_gateway_key
 
 
 def key_editor():
@@ -116,7 +117,7 @@ def key_editor():
             k = keys[selected]
             key = selected
             st.text_input(
-                "Gateway key",
+                "Gateway key (stored hash)",
                 selected,
                 disabled=True,
                 key=f"gateway_key_{selected}",
@@ -218,6 +219,27 @@ def key_editor():
             )
         has_missing_refs = bool(missing_providers or missing_models)
 
+        limits = keys.get(selected, {}) if selected != "<new>" else {}
+        col_rpm, col_tpm = st.columns(2)
+        with col_rpm:
+            rpm = st.number_input(
+                "Requests / minute",
+                min_value=0,
+                value=int(limits.get("rpm") or 0),
+                step=1,
+                help="0 = unlimited.",
+                key=f"rpm_{selected}",
+            )
+        with col_tpm:
+            tpm = st.number_input(
+                "Tokens / minute",
+                min_value=0,
+                value=int(limits.get("tpm") or 0),
+                step=1000,
+                help="0 = unlimited. Charged from recorded usage.",
+                key=f"tpm_{selected}",
+            )
+
         col_save, col_delete = st.columns(2)
         with col_save:
             save = st.button(
@@ -263,11 +285,18 @@ def key_editor():
             if missing_models:
                 errors.append("Remove missing models before saving.")
 
+            if selected == "<new>" and not errors:
+                try:
+                    key = hash_gateway_key(key, keys)
+                except ValueError as e:
+                    errors.append(str(e))
+
             if errors:
                 for err in errors:
                     st.error(err)
             else:
                 keys[key] = {
+                    **keys.get(key, {}),
                     "owner": owner,
                     "providers": allowed_providers,
                     "models": allowed_models,
@@ -276,9 +305,14 @@ def key_editor():
                         if expires_at
                         else None
                     ),
+                    "rpm": int(rpm) or None,
+                    "tpm": int(tpm) or None,
                 }
                 save_config(cfg)
-                st.success("Key saved")
+                if selected == "<new>":
+                    st.success("Key saved. Only its hash is stored: hand it out now.")
+                else:
+                    st.success("Key saved")
 
         if delete and selected != "<new>":
             if not confirm_delete:
@@ -49,11 +49,11 @@ def provider_editor():
                     selected,
                     disabled=True,
                 )
-                base_url = st.text_input("Base URL", p["base_url"])
+                base_url = st.text_input("Base URL", p.get("base_url") or "")
                 env_key = st.text_input(
                     "API key",
-                    p["api_key"],
-                    help="API key.",
+                    p.get("api_key") or "",
+                    help="API key. Leave empty when the provider uses an api_keys pool.",
                 )
                 models = st.text_area(
                     "Allowed models",
@@ -88,7 +88,7 @@ def provider_editor():
                 base_url.startswith("http://") or base_url.startswith("https://")
             ):
                 errors.append("Base URL must start with http:// or https://.")
-            if not env_key:
+            if not env_key and not providers.get(name, {}).get("api_keys"):
                 errors.append("Env API key name is required.")
 
             if errors:
@@ -96,8 +96,10 @@ def provider_editor():
                     st.error(err)
             else:
                 providers[name] = {
+                    # keep tuning fields the form does not edit
+                    **providers.get(name, {}),
                     "base_url": base_url,
-                    "api_key": env_key,
+                    "api_key": env_key or None,
                     "allowed_models": allowed_models,
                 }
                 save_config(cfg)
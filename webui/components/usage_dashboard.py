@@ -15,7 +15,7 @@ def usage_dashboard():
     con = duckdb.connect()
     try:
         df = con.execute(
-            "SELECT * FROM read_parquet(?)",
+            "SELECT * FROM read_parquet(?, union_by_name = true)",
             [str(PARQUET_DIR / "*.parquet")],
         ).df()
     except Exception as exc:
@@ -100,5 +100,34 @@ def usage_dashboard():
     df_ts = df.set_index("ts").resample("1h").size()
     st.line_chart(df_ts)
 
+    timing_columns = ["ttft_ms", "gap_p95_ms", "tokens_per_second"]
+    if all(c in df.columns for c in timing_columns):
+        streamed = df.dropna(subset=["ttft_ms"]).copy()
+        if not streamed.empty:
+            st.subheader("Streaming latency")
+            for column in timing_columns + ["ttfb_ms", "gap_mean_ms", "gap_max_ms"]:
+                if column in streamed.columns:
+                    streamed[column] = pd.to_numeric(streamed[column], errors="coerce")
+            by_model = (
+                streamed.groupby(["provider", "model"])
+                .agg(
+                    requests=("ttft_ms", "size"),
+                    ttft_p50_ms=("ttft_ms", "median"),
+                    ttft_p95_ms=("ttft_ms", lambda s: s.quantile(0.95)),
+                    gap_p95_ms=("gap_p95_ms", "median"),
+                    tokens_per_second=("tokens_per_second", "median"),
+                )
+                .reset_index()
+            )
+            by_model["target"] = by_model["provider"] + "/" + by_model["model"]
+            col1, col2, col3 = st.columns(3)
+            col1.caption("Median TTFT (ms)")
+            col1.bar_chart(by_model.set_index("target")["ttft_p50_ms"])
+            col2.caption("Inter-chunk gap p95 (ms)")
+            col2.bar_chart(by_model.set_index("target")["gap_p95_ms"])
+            col3.caption("Output tokens/sec")
+            col3.bar_chart(by_model.set_index("target")["tokens_per_second"])
+            st.dataframe(by_model.drop(columns="target"))
+
     st.subheader("Raw events")
     st.dataframe(df.sort_values("ts", ascending=False))
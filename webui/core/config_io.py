@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import yaml
 from .paths import CONFIG_PATH
 
@@ -10,4 +13,19 @@ def load_config():
 
 
 def save_config(cfg):
-    CONFIG_PATH.write_text(yaml.safe_dump(cfg, sort_keys=False))
+    # Written to a temp file next to config.yaml and renamed over it, so the
+    # gateway never reads a half-written config
+    fd, tmp = tempfile.mkstemp(
+        dir=CONFIG_PATH.parent, prefix=f".{CONFIG_PATH.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            yaml.safe_dump(cfg, f, sort_keys=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if CONFIG_PATH.exists():
+            os.chmod(tmp, CONFIG_PATH.stat().st_mode & 0o777)
+        os.replace(tmp, CONFIG_PATH)
+    except BaseException:
+        os.unlink(tmp)
+        raise
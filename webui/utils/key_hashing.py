@@ -0,0 +1,6 @@
+from backend.config.key_hashing import hash_gateway_key as _hash, shared_salt
+
+
+def hash_gateway_key(key: str, existing_names) -> str:
+    # Every entry of a config uses one salt: reuse theirs
+    return _hash(key, shared_salt(existing_names))